@@ -13,6 +13,10 @@ from amo_grid_step.amo_grid import AMOGrid  # noqa F401
 from amo_grid_step.amo_grid_parameters import AMOGridParameters  # noqa F401
 from amo_grid_step.amo_grid_step import AMOGridStep  # noqa F401
 from amo_grid_step.tk_amo_grid import TkAMOGrid  # noqa F401
+from amo_grid_step.grid_file import GridFile, load_grid  # noqa F401
+from amo_grid_step.symmetry import SymmetryReduction  # noqa F401
+from amo_grid_step.symmetry import load_reduction  # noqa F401
+from amo_grid_step.transform import SphericalHarmonicTransform  # noqa F401
 
 properties = {
     "Central grid size": {
@@ -39,5 +43,94 @@ properties = {
         "description": "Percent error for integral over Gaussian",
         "dimensionality": "scalar",
         "type": "float"
+    },
+    "Sphere error estimate": {
+        "description": "Estimated percent error for integral over sphere",
+        "dimensionality": "scalar",
+        "type": "float"
+    },
+    "Yukawa error estimate": {
+        "description": "Estimated percent error for integral of Yukawa "
+                       "function",
+        "dimensionality": "scalar",
+        "type": "float"
+    },
+    "Gaussian error estimate": {
+        "description": "Estimated percent error for integral over Gaussian",
+        "dimensionality": "scalar",
+        "type": "float"
+    },
+    "Point group": {
+        "description": "Point group used to reduce the grids",
+        "dimensionality": "scalar",
+        "type": "string"
+    },
+    "Unique grid points": {
+        "description": "Number of symmetry-unique points in all the grids",
+        "dimensionality": "scalar",
+        "type": "integer"
+    },
+    "Pruned grid points": {
+        "description": "Number of points with negligible partition weight "
+                       "dropped from all the grids",
+        "dimensionality": "scalar",
+        "type": "integer"
+    },
+    "amo_grid peak memory": {
+        "description": "Peak resident memory of amo_grid",
+        "dimensionality": "scalar",
+        "type": "float",
+        "units": "MiB"
+    },
+    "amo_grid user time": {
+        "description": "User CPU time used by amo_grid",
+        "dimensionality": "scalar",
+        "type": "float",
+        "units": "s"
+    },
+    "amo_grid system time": {
+        "description": "System CPU time used by amo_grid",
+        "dimensionality": "scalar",
+        "type": "float",
+        "units": "s"
+    },
+    "amo_grid wall time": {
+        "description": "Wall-clock time that amo_grid ran",
+        "dimensionality": "scalar",
+        "type": "float",
+        "units": "s"
+    },
+    "Input time": {
+        "description": "Time to write the input for amo_grid",
+        "dimensionality": "scalar",
+        "type": "float",
+        "units": "s"
+    },
+    "Execution time": {
+        "description": (
+            "Time to start and run amo_grid, including reading its output, "
+            "or to build the grids"
+        ),
+        "dimensionality": "scalar",
+        "type": "float",
+        "units": "s"
+    },
+    "Cache time": {
+        "description": "Time to look up and store results in the cache",
+        "dimensionality": "scalar",
+        "type": "float",
+        "units": "s"
+    },
+    "Analysis time": {
+        "description": "Time to read and analyze the output",
+        "dimensionality": "scalar",
+        "type": "float",
+        "units": "s"
+    },
+    "Total time": {
+        "description": "Total time for the step",
+        "dimensionality": "scalar",
+        "type": "float",
+        "units": "s"
     }
 }
@@ -10,15 +10,25 @@ will do in the initial summary of the job.
 directory, and is used for all normal output from this step.
 """
 
+import asyncio
+import io
 import json
 import logging
 import molssi_workflow
 from molssi_workflow import ureg, Q_, data    # noqa F401
 import molssi_util.printing as printing
 from molssi_util.printing import FormattedText as __
+import numpy as np
 import os.path
 
 import amo_grid_step
+from amo_grid_step import (
+    async_exec, autotune, estimate, grid, grid_file, nested, partition,
+    quadrature, sweep, symmetry, timing
+)
+from amo_grid_step.cache import ResultCache, executable_version
+from amo_grid_step.elements import templates as element_templates
+from amo_grid_step.output import parse_output
 
 logger = logging.getLogger(__name__)
 job = printing.getPrinter()
@@ -45,6 +55,8 @@ class AMOGrid(molssi_workflow.Node):
             extension=extension)
 
         self.parameters = amo_grid_step.AMOGridParameters()
+        self.timer = timing.Timer()
+        self.child_usage = timing.ChildUsage()
 
     def description_text(self, P):
         """Create the text description of what this step will do.
@@ -122,30 +134,355 @@ class AMOGrid(molssi_workflow.Node):
             '{atomic grid radial quadrature} quadrature with '
         )
         text += ('{} points extending to {} from the atom.'.format(n, r))
+        if P['atomic grid element scaling'] == 'Bragg-Slater':
+            text += (
+                ' These are the settings for carbon; the grids for other '
+                'elements are scaled by their Bragg-Slater radii.'
+            )
+
+        text += self.cost_text(P)
+
+        if P['sweep'].strip() != '':
+            text += (
+                '\n\nEvery combination of the parameter values {sweep} '
+                'will be run, and the results collected in a table.'
+            )
+
+        for prefix, name in (
+            ('central grid', 'the central grid'),
+            ('atomic grid', 'the atomic grids')
+        ):
+            pruning = P[prefix + ' angular pruning']
+            if pruning == 'SG-1':
+                text += (
+                    '\n\nThe angular rules of {} will be pruned near the '
+                    'atoms and far out, as in the SG-1 grid.'
+                ).format(name)
+            elif pruning == 'table':
+                text += (
+                    '\n\nShells of {0} out to {{{1} pruning radii}} of the '
+                    'outer limit will use angular rules for l-max '
+                    '{{{1} pruning lmax}}.'
+                ).format(name, prefix)
+
+        if P['autotune'] == 'yes':
+            text += (
+                '\n\nThe central grid will first be tuned to the smallest '
+                'that meets the target test errors.'
+            )
+
+        if P['grid engine'] == 'in-process NumPy':
+            text += (
+                '\n\nThe grids will be built in this process using NumPy '
+                'rather than by running amo_grid.'
+            )
+            if P['use symmetry'] == 'yes':
+                text += (
+                    ' Only the points that are unique under the point group '
+                    'of the structure will be built.'
+                )
+            if P['partition weights'] != 'none':
+                text += (
+                    ' The weights will include {partition weights} '
+                    'partition weights, and the tests will integrate over '
+                    'all of the grids.'
+                )
+                if P['pruning threshold'] > 0:
+                    text += (
+                        ' Points with partition weights below '
+                        '{pruning threshold} will be dropped.'
+                    )
+            if P['error estimate'] == 'nested':
+                text += (
+                    ' The errors of the tests will be estimated from the '
+                    'radial rule nested in that of the central grid.'
+                )
+        elif P['execution'] == 'asynchronous':
+            text += (
+                '\n\namo_grid will be run asynchronously, reporting its '
+                'progress as it runs'
+            )
+            if P['timeout'] > 0:
+                text += ', with a time limit of {timeout} s.'
+            else:
+                text += '.'
                  
         return text
 
+    def cost_text(self, P):
+        """Describe the estimated cost of the grids, if it can be known"""
+        try:
+            if data.structure is None:
+                cost = estimate.estimate(P, 1)
+                return (
+                    '\n\nThe central grid will have {} points and each '
+                    'atomic grid {} points.'.format(
+                        cost['central points'], cost['atomic points']
+                    )
+                )
+            else:
+                cost = self.estimate(P)
+        except (KeyError, TypeError, ValueError):
+            # Typically parameters given by variables not yet known
+            return ''
+
+        return (
+            '\n\nThe central grid will have {} points and the {} atomic '
+            'grids {} points, for a total of {} points taking {} and '
+            'about {:.2g} s to generate.'.format(
+                cost['central points'],
+                len(data.structure['atoms']['elements']),
+                cost['all atomic points'],
+                cost['total points'],
+                estimate.format_bytes(cost['memory']),
+                cost['time']
+            )
+        )
+
+    def estimate(self, P=None):
+        """Estimate the points, memory and time needed for the grids"""
+        if P is None:
+            P = self.parameters.current_values_to_dict(
+                context=molssi_workflow.workflow_variables._data
+            )
+        if data.structure is None:
+            return estimate.estimate(P, 0)
+        elements = data.structure['atoms']['elements']
+        return estimate.estimate(P, len(elements), elements=elements)
+
+    def check_parameters(self, P):
+        """Warn about options the engine can't use, returning P without them.
+
+        P itself is not changed; a copy is returned if anything is reset.
+        """
+        if (
+            P['use symmetry'] == 'yes' and
+            P['grid engine'] != 'in-process NumPy'
+        ):
+            logger.warning(
+                'Only the in-process grid engine can use symmetry, so '
+                'amo_grid will build the full grids.'
+            )
+        if (
+            P['partition weights'] != 'none' and
+            P['grid engine'] != 'in-process NumPy'
+        ):
+            logger.warning(
+                'Only the in-process grid engine can add partition weights, '
+                'so amo_grid will write the plain weights.'
+            )
+        for prefix in ('central grid', 'atomic grid'):
+            key = prefix + ' angular pruning'
+            if P[key] == 'none':
+                continue
+            if P['grid engine'] != 'in-process NumPy':
+                logger.warning(
+                    'Only the in-process grid engine can prune the angular '
+                    'rules, so the {}s will use the full rule.'.format(prefix)
+                )
+            elif P['use symmetry'] == 'yes':
+                logger.warning(
+                    'The symmetry reduction does not prune the angular '
+                    'rules, so the {}s will use the full rule.'.format(prefix)
+                )
+            else:
+                continue
+            P = dict(P)
+            P[key] = 'none'
+        if P['pruning threshold'] > 0 and (
+            P['partition weights'] == 'none' or P['use symmetry'] == 'yes'
+        ):
+            logger.warning(
+                'Points are only pruned with partition weights and without '
+                'symmetry, so none will be pruned.'
+            )
+        if P['error estimate'] != 'none':
+            if P['grid engine'] != 'in-process NumPy':
+                logger.warning(
+                    'Only the in-process grid engine can estimate the errors '
+                    'of the tests, so there will be no estimates.'
+                )
+                P = dict(P)
+                P['error estimate'] = 'none'
+            elif P['partition weights'] != 'none':
+                logger.warning(
+                    'With partition weights the tests integrate over all of '
+                    'the grids, but the errors are estimated for the central '
+                    'grid alone, so there will be no estimates.'
+                )
+                P = dict(P)
+                P['error estimate'] = 'none'
+        return P
+
+    def check_budget(self, P):
+        """Make sure that the grids are within the limits on their cost"""
+        cost = self.estimate(P)
+        estimate.check_budget(
+            cost,
+            max_points=P['maximum points'],
+            max_memory=P['maximum memory'],
+            max_time=P['maximum time']
+        )
+        return cost
+
     def run(self):
         """Run a AMO Grid step.
         """
 
         next_node = super().run(printer=printer)
 
-        input = self.get_input()
-        printer.important(input)
+        job = self.dispatch()
+        if job is not None:
+            P, cache, key = job
+            # amo_grid reads input.in in the step's directory, and running it
+            # includes collecting the output, so that is timed as the
+            # execution.
+            with self.timer.phase('execution'), self.child_usage.measure():
+                if P['execution'] == 'asynchronous':
+                    result = async_exec.run_coroutine(
+                        self.execute_async(timeout=self.timeout(P))
+                    )
+                else:
+                    result = async_exec.run(
+                        ['amo_grid', 'input.in'], self.directory,
+                        return_files=['output.dat']
+                    )
+            self.finish(result, cache, key)
+
+        return next_node
+
+    async def run_async(self, timeout=None):
+        """Run the step without blocking, for use from an event loop.
+
+        This is the asynchronous counterpart of run(), so that a workflow
+        can overlap this step with other independent work by awaiting it.
+        Everything but amo_grid itself, such as a sweep or the in-process
+        engine, runs in a worker thread. The step's directory must already
+        exist, as it does after Node.run(). timeout overrides the step's
+        'timeout' parameter, and cancelling the coroutine kills amo_grid.
+        """
+        loop = asyncio.get_running_loop()
+        job = await loop.run_in_executor(None, self.dispatch)
+        if job is not None:
+            P, cache, key = job
+            if timeout is None:
+                timeout = self.timeout(P)
+            with self.timer.phase('execution'), self.child_usage.measure():
+                result = await self.execute_async(timeout=timeout)
+            self.finish(result, cache, key)
+
+    def dispatch(self):
+        """The part of a run shared by run() and run_async().
+
+        This runs a sweep, the autotuning and the in-process engine, or
+        writes the input for amo_grid and restores any cached results.
+        Returns None if that is all, or the parameters, cache and key for
+        running amo_grid and then finish().
+        """
+        self.timer = timing.Timer()
+        self.child_usage = timing.ChildUsage()
+
+        P = self.parameters.current_values_to_dict(
+            context=molssi_workflow.workflow_variables._data
+        )
+        if P['sweep'].strip() != '':
+            self.run_sweep(P)
+            return None
+
+        if P['autotune'] == 'yes':
+            P = self.autotune(P)
+
+        P = self.check_parameters(P)
+        self.check_budget(P)
+
+        if P['grid engine'] == 'in-process NumPy':
+            self.run_in_process(P)
+            return None
+
+        with self.timer.phase('input'):
+            _, cache, key = self.prepare_input(P)
+        with self.timer.phase('cache'):
+            hit = cache is not None and cache.restore(key, self.directory)
+        if hit:
+            printer.normal(
+                'Reusing the cached results of an identical run '
+                '({} hits, {} misses).'.format(
+                    cache.stats['hits'], cache.stats['misses']
+                )
+            )
+            self.analyze()
+            return None
+        return P, cache, key
+
+    def finish(self, result, cache=None, key=None):
+        """Save and analyze the results of running amo_grid"""
+        with self.timer.phase('cache'):
+            self.save_result(result, cache, key)
+        self.analyze()
+
+    @staticmethod
+    def timeout(P):
+        """The time limit for amo_grid in seconds, or None"""
+        return P['timeout'] if P['timeout'] > 0 else None
+
+    async def execute_async(self, timeout=None):
+        """Run amo_grid as an async subprocess, reporting its progress"""
+        progress = async_exec.Progress(report=printer.normal)
+        return await async_exec.execute(
+            ['amo_grid', 'input.in'],
+            self.directory,
+            return_files=['output.dat'],
+            progress=progress,
+            timeout=timeout
+        )
 
+    def prepare_input(self, P, n_preview=40):
+        """Write the input for amo_grid and look for cached results.
+
+        The input is streamed to input.in and only its first n_preview lines
+        are printed. Returns the name of the file, the cache (None if not
+        caching) and the key for the input in the cache.
+        """
         filename = os.path.join(self.directory, 'input.in')
         with open(filename, 'w') as fd:
-            fd.write(input)
+            self.write_input(fd, P=P)
+        printer.important(self.input_preview(filename, n_preview))
 
-        files = {'input.in': input}
-        local = molssi_workflow.ExecLocal()
-        return_files = ['output.dat']
-        result = local.run(
-            cmd=['amo_grid', 'input.in'],  # nopep8
-            files=files,
-            return_files=return_files)
+        # Reuse the results of an identical earlier run if we can
+        cache = None
+        key = None
+        if P['cache results'] == 'yes':
+            cache = ResultCache(
+                directory=P['cache directory'],
+                max_size=P['cache size limit']
+            )
+            key = cache.file_key(filename, executable_version('amo_grid'))
+        return filename, cache, key
 
+    @staticmethod
+    def input_preview(filename, n_lines=40):
+        """The first n_lines of the input file, noting how many more"""
+        lines = []
+        n_more = 0
+        with open(filename, 'r') as fd:
+            for line in fd:
+                if len(lines) < n_lines:
+                    lines.append(line.rstrip('\n'))
+                else:
+                    n_more += 1
+        if n_more > 0:
+            lines.append('... and {} more lines in {}'.format(
+                n_more, os.path.basename(filename)
+            ))
+        return '\n'.join(lines)
+
+    def save_result(self, result, cache=None, key=None):
+        """Record the results of amo_grid and cache them if there is a cache.
+
+        amo_grid runs in the step's directory, so the files it returns are
+        already there and are not written again. Only a file it failed to
+        write is replaced by a note of the error.
+        """
         # Figure out what happened
         if result['stderr'] != '':
             logger.warning('stderr:\n' + result['stderr'])
@@ -154,20 +491,425 @@ class AMOGrid(molssi_workflow.Node):
                 fd.write(result['stderr'])
 
         for filename in result['files']:
-            with open(os.path.join(self.directory, filename), mode='w') as fd:
-                if result[filename]['data'] is not None:
-                    fd.write(result[filename]['data'])
-                else:
+            if result[filename]['data'] is None:
+                path = os.path.join(self.directory, filename)
+                with open(path, mode='w') as fd:
                     fd.write(result[filename]['exception'])
 
-        # Analyze the results
-        self.analyze()
+        if cache is not None and result['stderr'] == '':
+            returned = {}
+            for filename in result['files']:
+                if result[filename]['data'] is None:
+                    break
+                returned[filename] = result[filename]['data']
+            else:
+                cache.store(key, returned)
 
-        return next_node
+    def run_in_process(self, P):
+        """Build the grids with the NumPy engine rather than amo_grid.
+
+        The grids are written to the binary file grid.bin, which
+        amo_grid_step.load_grid() can read, and left in self.grids as a
+        dictionary of memory-mapped (points, weights) keyed by 'center',
+        'atom_1', ... Without the file, self.grids holds grid.ProductGrid
+        objects, which generate the points only when asked, unless the
+        partition weights make explicit (points, weights) necessary.
+        """
+        if data.structure is None:
+            logger.error('AMOGrid run_in_process(): there is no structure!')
+            raise RuntimeError(
+                'AMOGrid run_in_process(): there is no structure!'
+            )
+
+        coordinates = data.structure['atoms']['coordinates']
+        elements = data.structure['atoms']['elements']
+
+        results = self.build_in_process(P, coordinates, elements)
+        results.update(self.timer.results())
+        self.print_and_store(results)
+
+    def build_in_process(self, P, coordinates, elements):
+        """Build the grids for the structure and run the tests.
+
+        This is the work of run_in_process(), also done by each in-process
+        run of a sweep. Returns the dictionary of results.
+        """
+        # The estimates only need the radial rule, so any problem with the
+        # parameters shows up before the grids are built.
+        if P['error estimate'] == 'nested':
+            estimates = nested.test_estimates(P)
+        else:
+            estimates = {}
+
+        if P['use symmetry'] == 'yes':
+            with self.timer.phase('execution'):
+                results = self.run_symmetric(P, coordinates, elements)
+            results.update(estimates)
+            return results
+
+        if P['partition weights'] != 'none':
+            cells = partition.for_grids(
+                P, coordinates, P['partition weights'], elements
+            )
+        else:
+            cells = None
+        threshold = P['pruning threshold']
+
+        with self.timer.phase('execution'):
+            if P['write grid file'] == 'yes':
+                # Stream the grids to the file block by block, so that memory
+                # use is bounded by the block size, then map them back in.
+                filename = os.path.join(self.directory, 'grid.bin')
+                with grid_file.GridWriter(filename) as writer:
+                    tests = grid.blocked_integration_tests(
+                        self._write_grids(
+                            writer, grid.iter_grids(
+                                P, coordinates,
+                                block_size=P['grid block size'],
+                                elements=elements
+                            ),
+                            cells, threshold
+                        )
+                    )
+                self.grids = {}
+                grids = grid_file.load_grid(filename)
+                for name in grids:
+                    self.grids[name] = (
+                        grids.points(name), grids.weights(name)
+                    )
+                sizes = [
+                    grids.n_points('center'),
+                    grids.n_points('atom_1') if 'atom_1' in grids else 0
+                ]
+            elif cells is not None:
+                # The partition weights don't factorize, so the grids are
+                # made explicit
+                product = grid.product_grids(P, coordinates, elements)
+                self.grids = {}
+                for owner, (name, pg) in enumerate(product.items()):
+                    self.grids[name], = cells.weighted_blocks(
+                        [pg.explicit()], owner, threshold
+                    )
+                tests = grid.blocked_integration_tests(self.grids.values())
+                sizes = [
+                    len(self.grids[name][1]) if name in self.grids else 0
+                    for name in ('center', 'atom_1')
+                ]
+            else:
+                self.grids = grid.product_grids(P, coordinates, elements)
+                tests = grid.product_integration_tests(self.grids['center'])
+                sizes = [
+                    len(self.grids[name]) if name in self.grids else 0
+                    for name in ('center', 'atom_1')
+                ]
+
+        results = {
+            'Central grid size': sizes[0],
+            'Atomic grid size': sizes[1],
+        }
+        if cells is not None and threshold > 0:
+            results['Pruned grid points'] = int(sum(cells.pruned.values()))
+            self.print_pruning(cells, len(coordinates))
+        results.update(tests)
+        results.update(estimates)
+        return results
+
+    def print_pruning(self, cells, n_atoms):
+        """Print the number of points pruned from each grid"""
+        printer.normal('\nPoints pruned from each grid:')
+        for owner in range(n_atoms + 1):
+            name = 'center' if owner == 0 else 'atom_{}'.format(owner)
+            printer.normal(
+                '{:>20s}: {}'.format(name, cells.pruned.get(owner, 0))
+            )
+
+    @staticmethod
+    def owner(name):
+        """The partition center of the grid 'center', 'atom_1', ..."""
+        return 0 if name == 'center' else int(name.split('_')[1])
+
+    def _write_grids(self, writer, grids, cells=None, threshold=0.0):
+        """Write the grids, yielding the blocks to integrate for the tests.
+
+        grids yields (name, center, blocks) as grid.iter_grids() does. The
+        blocks yielded are those of the central grid or, with the partition
+        weights cells, of all the grids, since only then do they add up to
+        integrals over all space.
+        """
+        for name, center, blocks in grids:
+            writer.begin_block(name, center)
+            if cells is not None:
+                blocks = cells.weighted_blocks(
+                    blocks, self.owner(name), threshold
+                )
+            if name == 'center' or cells is not None:
+                yield from writer.write_blocks(blocks)
+            else:
+                for points, weights in blocks:
+                    writer.write(points, weights)
+
+    def run_symmetric(self, P, coordinates, elements):
+        """Build only the symmetry-unique points of the grids.
+
+        self.symmetry is the SymmetryReduction for expanding them and
+        self.grids holds the unique points: grid.ProductGrids of the unique
+        angular points, or the explicit points and weights with partition
+        weights. With 'write grid file' the unique grids are streamed to
+        grid.bin block by block, like the full grids, and the maps go to
+        symmetry.npz.
+        """
+        reduction = symmetry.reduce_grids(
+            P, coordinates, elements, tolerance=P['symmetry tolerance']
+        )
+        self.symmetry = reduction
+        block_size = P['grid block size']
+
+        # The partition weights have the symmetry of the structure, so they
+        # can be applied to the unique points
+        if P['partition weights'] != 'none':
+            cells = partition.for_grids(
+                P, coordinates, P['partition weights'], elements
+            )
+        else:
+            cells = None
+
+        if P['write grid file'] == 'yes':
+            filename = os.path.join(self.directory, 'grid.bin')
+            with grid_file.GridWriter(filename) as writer:
+                tests = grid.blocked_integration_tests(
+                    self._write_grids(
+                        writer, (
+                            (name, reduced.center, reduced.blocks(block_size))
+                            for name, reduced in reduction.grids.items()
+                        ),
+                        cells
+                    )
+                )
+            grids = grid_file.load_grid(filename)
+            for name in grids:
+                reduction.grids[name] = (
+                    grids.points(name), grids.weights(name)
+                )
+            reduction.save(os.path.join(self.directory, 'symmetry.npz'))
+        elif cells is not None:
+            for name, reduced in reduction.grids.items():
+                points, weights = zip(*cells.weighted_blocks(
+                    reduced.blocks(block_size), self.owner(name)
+                ))
+                reduction.grids[name] = (
+                    np.concatenate(points), np.concatenate(weights)
+                )
+            tests = grid.blocked_integration_tests(reduction.grids.values())
+        else:
+            tests = grid.product_integration_tests(reduction.grids['center'])
+        self.grids = reduction.grids
+
+        printer.important(
+            'The point group is {}, so the grids have {} unique points '
+            'of {}.'.format(
+                reduction.group, reduction.n_points(),
+                reduction.n_full_points()
+            )
+        )
+
+        results = {
+            'Central grid size': reduction.n_full_points('center'),
+            'Atomic grid size': (
+                reduction.n_full_points('atom_1')
+                if 'atom_1' in reduction.blocks else 0
+            ),
+            'Point group': reduction.group,
+            'Unique grid points': reduction.n_points(),
+        }
+        results.update(tests)
+        return results
+
+    def print_and_store(self, results):
+        """Print the results and store any that were requested"""
+        for key, value in results.items():
+            printer.important('{:>20s}: {}'.format(key, value))
+
+        # Put any requested results into variables or tables
+        self.store_results(
+            data=results,
+            properties=amo_grid_step.properties,
+            results=self.parameters['results'].value,
+            create_tables=self.parameters['create tables'].get()
+        )
+
+    def print_timings(self, data):
+        """Print the time taken by each phase of the step"""
+        printer.normal('\nTimings (s):')
+        for key in list(timing.phases.values()) + ['Total time']:
+            printer.normal('{:>20s}: {:.4f}'.format(key, data[key]))
+        if 'amo_grid user time' in data:
+            printer.normal(
+                '\namo_grid ran in the step directory, so no files were '
+                'staged;\nthe execution time includes starting it and '
+                'reading its output.'
+            )
+            printer.normal(
+                'amo_grid used {:.2f} s user and {:.2f} s system CPU '
+                'time.'.format(
+                    data['amo_grid user time'], data['amo_grid system time']
+                )
+            )
+        if 'amo_grid peak memory' in data:
+            printer.normal(
+                'amo_grid used at most {:.1f} MiB of memory.'.format(
+                    data['amo_grid peak memory']
+                )
+            )
+
+    def sweep(self, values, max_workers=None):
+        """Run every combination of the parameter values concurrently.
+
+        values is a dictionary of parameter names and lists of values. Each
+        combination is run in its own subdirectory, sweep_0001, ..., using a
+        pool of up to max_workers processes. Returns a list of
+        (combination, results) with the results being the dictionary of
+        grid sizes and test errors.
+        """
+        if data.structure is None:
+            logger.error('AMOGrid sweep(): there is no structure!')
+            raise RuntimeError('AMOGrid sweep(): there is no structure!')
+
+        P = self.parameters.current_values_to_dict(
+            context=molssi_workflow.workflow_variables._data
+        )
+        coordinates = data.structure['atoms']['coordinates']
+        elements = data.structure['atoms']['elements']
+
+        jobs = []
+        todo = sweep.combinations(values)
+        for i, combination in enumerate(todo, start=1):
+            Pi = self.check_parameters({**P, **combination})
+            self.check_budget(Pi)
+            directory = os.path.join(self.directory, 'sweep_{:04d}'.format(i))
+            os.makedirs(directory, exist_ok=True)
+            if Pi['grid engine'] == 'in-process NumPy':
+                jobs.append((
+                    sweep.run_in_process,
+                    (directory, Pi, coordinates, elements)
+                ))
+            else:
+                filename = os.path.join(directory, 'input.in')
+                with open(filename, 'w') as fd:
+                    self.write_input(fd, P=Pi)
+                jobs.append((sweep.run_executable, (directory,)))
+
+        return list(zip(todo, sweep.run_jobs(jobs, max_workers)))
+
+    def autotune(self, P):
+        """Find the cheapest central grid meeting the target test errors.
+
+        Returns the parameters P with the tuned central grid. With the
+        amo_grid executable each grid tried is run in its own subdirectory,
+        autotune_0001, ...
+        """
+        targets = {
+            'Sphere test': P['target Sphere error'],
+            'Yukawa test': P['target Yukawa error'],
+            'Gaussian test': P['target Gaussian error'],
+        }
+
+        if P['grid engine'] == 'in-process NumPy':
+            evaluate = None
+        else:
+            count = [0]
+
+            def evaluate(Pi):
+                count[0] += 1
+                directory = os.path.join(
+                    self.directory, 'autotune_{:04d}'.format(count[0])
+                )
+                os.makedirs(directory, exist_ok=True)
+                with open(os.path.join(directory, 'input.in'), 'w') as fd:
+                    self.write_input(fd, P=Pi)
+                return sweep.run_executable(directory)
+
+        # The central grid gets what the atomic grids leave of the budget
+        max_points = P['maximum points']
+        if max_points > 0:
+            atomic = self.estimate(P)['all atomic points']
+            max_points = max(max_points - atomic, 1)
+
+        tuner = autotune.AutoTuner(
+            P, targets, evaluate=evaluate,
+            max_evaluations=P['autotune evaluations'], max_points=max_points
+        )
+        P, errors, n_points = tuner.run()
+
+        printer.normal(
+            'Tuned the central grid, trying {} grids:\n'.format(
+                len(tuner.evaluated)
+            )
+        )
+        printer.normal(tuner.table())
+        printer.normal(
+            '\nUsing {} points with region n-points {}, outer limits {}'
+            .format(
+                n_points, P['central grid region n-points'],
+                ', '.join(
+                    '{:.4g}'.format(r)
+                    for r in P['central grid region outer limit']
+                )
+            )
+        )
+        if P['central grid angular quadrature'] == 'Lebedev':
+            printer.normal(
+                'and Lebedev rule {}.'.format(P['central grid Lebedev rule'])
+            )
+        else:
+            printer.normal(
+                'and {} x {} theta and phi points.'.format(
+                    P['central grid theta n-points'],
+                    P['central grid phi n-points']
+                )
+            )
+        return P
+
+    def run_sweep(self, P):
+        """Run the sweep given in the parameters and report the results"""
+        values = sweep.parse_sweep(P['sweep'])
+        max_workers = P['sweep workers']
+        if max_workers <= 0:
+            max_workers = None
+
+        rows = self.sweep(values, max_workers=max_workers)
+
+        printer.important(sweep.format_table(values.keys(), rows))
+        sweep.write_csv(
+            os.path.join(self.directory, 'sweep.csv'), values.keys(), rows
+        )
 
-    def get_input(self):
+        # Put any requested results into variables or tables, one row for
+        # each combination
+        for combination, results in rows:
+            if len(results) == 0:
+                continue
+            self.store_results(
+                data={**combination, **results},
+                properties=amo_grid_step.properties,
+                results=self.parameters['results'].value,
+                create_tables=self.parameters['create tables'].get()
+            )
+
+    def get_input(self, P=None):
         """Returns the input for the grid program
         """
+        fd = io.StringIO()
+        self.write_input(fd, P=P)
+        return fd.getvalue()
+
+    def write_input(self, fd, P=None, chunk_size=1000):
+        """Write the input for the grid program to the file-like object fd.
+
+        The parameters are taken from the dictionary P if given, otherwise
+        from the current values of the step's parameters. The blocks for the
+        atoms are written chunk_size atoms at a time, so the whole input is
+        never held in memory.
+        """
         if data.structure is None:
             logger.error('AMOGrid get_input(): there is no structure!')
             raise RuntimeError('AMOGrid get_input(): there is no structure!')
@@ -175,9 +917,18 @@ class AMOGrid(molssi_workflow.Node):
         atoms = data.structure['atoms']
         n_atoms = len(atoms['elements'])
 
-        P = self.parameters.current_values_to_dict(
-            context=molssi_workflow.workflow_variables._data
-        )
+        if P is None:
+            P = self.parameters.current_values_to_dict(
+                context=molssi_workflow.workflow_variables._data
+            )
+        P = grid.resolve_angular(P)
+        for prefix in ('central grid', 'atomic grid'):
+            method = P[prefix + ' radial quadrature']
+            if method in quadrature.mapped_radial or method == 'Fejer':
+                raise ValueError(
+                    "amo_grid has no '{}' radial quadrature for the {}; use "
+                    "the in-process grid engine.".format(method, prefix)
+                )
 
         lines = []
         lines.append('[DEFAULTS]')
@@ -237,98 +988,109 @@ class AMOGrid(molssi_workflow.Node):
         # And the grids for the atoms
         lines.append('')
         lines.append('## Atom-centered grids ##')
+        fd.write('\n'.join(lines))
 
-        # Center the atoms on 0
-        cx = 0.0
-        cy = 0.0
-        cz = 0.0
-        for x, y, z in atoms['coordinates']:
-            cx += x
-            cy += y
-            cz += z
-        cx /= n_atoms
-        cy /= n_atoms
-        cz /= n_atoms
-
-        i = 0
-        for element, xyz in zip(atoms['elements'], atoms['coordinates']):
-            i += 1
-            x, y, z = xyz
-            lines.append('')
-            lines.append('## atom {}: {} ##'.format(i, element))
-            lines.append('[atom_{}]'.format(i))
-            lines.append('{:>21s} = {}, {}, {}'
-                         .format('atom_center', x-cx, y-cy, z-cz))
-            lines.append(
-                '{:>21s} = {}'
-                .format('r_type_quadrature',
-                        P['atomic grid radial quadrature'].lower())
-            )
-
-            # regions
-            npoints = P['atomic grid region n-points']
-            limits = P['atomic grid region outer limit']
-            if not isinstance(npoints, list):
-                npoints = [npoints]
-            if not isinstance(limits, list):
-                limits = [limits]
-            lines.append('{:>21s} = {}'.format('region_num', len(npoints)))
-            lines.append('{:>21s} = {}'.format('r_origin_fixed', 0))
-            lines.append('{:>21s} = {}'.format('r_endpt_fixed', 1))
-            line = '{:>21s} = {}'.format('r_intervals', '0.0')
-            for r in limits:
-                line += ', {}'.format(r)
-            lines.append(line)
-            line = '{:>21s} = {}'.format('r_num_shell_pts', int(npoints[0]))
-            for n in npoints[1:]:
-                line += ', {}'.format(int(n))
-            lines.append(line)
-
-            lines.append('')
-            lines.append('{:>21s} = {}'.format('lmax', P['atomic grid lmax']))
-            lines.append('{:>21s} = {}'.format(
-                'angular_quad_type', P['atomic grid angular quadrature']))
-            # if P['atomic grid angular quadrature'] == 'Lebedev':
-            if P['central grid angular quadrature'] == 'Lebedev':
-                lines.append('{:>21s} = {}'.format(
-                    'lebedev_rule', P['atomic grid Lebedev rule']))
-            else:
-                lines.append('{:>21s} = {}'.format(
-                    'phi_type_quadrature', P['atomic grid phi quadrature']))
-                lines.append('{:>21s} = {}'.format(
-                    'phi_quadrature_size', P['atomic grid phi n-points']))
-                lines.append('{:>21s} = {}'.format(
-                    'theta_type_quadrature',
-                    P['atomic grid theta quadrature']).lower()
+        # Everything after the center of each atom is the same for all atoms
+        # of an element, so create it once per element.
+        elements = atoms['elements']
+        templates = {
+            element: self.atom_template(Pe)
+            for element, Pe in element_templates(P, elements).items()
+        }
+
+        # Center the atoms on 0. The cumulative sum adds the coordinates in
+        # order, exactly as a Python loop would, so the centered coordinates
+        # are identical to the last bit to those of earlier versions.
+        xyz = np.array(atoms['coordinates'], dtype=float).reshape(-1, 3)
+        center = np.cumsum(xyz, axis=0)[-1] / n_atoms
+        xyz = (xyz - center).tolist()
+
+        for start in range(0, n_atoms, chunk_size):
+            stop = min(start + chunk_size, n_atoms)
+            fd.write(''.join([
+                templates[element].format(i, element, x, y, z)
+                for i, element, (x, y, z) in zip(
+                    range(start + 1, stop + 1),
+                    elements[start:stop],
+                    xyz[start:stop]
                 )
-                lines.append('{:>21s} = {}'.format(
-                    'theta_quadrature_size', P['atomic grid theta n-points']))
+            ]))
 
-        return '\n'.join(lines)
+    def atom_template(self, P):
+        """The block of input for an atom, with the atom as placeholders.
+
+        The template is formatted with the number of the atom, its element
+        and its centered x, y and z coordinates. Literal braces are doubled
+        to survive the formatting.
+        """
+        lines = []
+        lines.append(
+            '{:>21s} = {}'
+            .format('r_type_quadrature',
+                    P['atomic grid radial quadrature'].lower())
+        )
+
+        # regions
+        npoints = P['atomic grid region n-points']
+        limits = P['atomic grid region outer limit']
+        if not isinstance(npoints, list):
+            npoints = [npoints]
+        if not isinstance(limits, list):
+            limits = [limits]
+        lines.append('{:>21s} = {}'.format('region_num', len(npoints)))
+        lines.append('{:>21s} = {}'.format('r_origin_fixed', 0))
+        lines.append('{:>21s} = {}'.format('r_endpt_fixed', 1))
+        line = '{:>21s} = {}'.format('r_intervals', '0.0')
+        for r in limits:
+            line += ', {}'.format(r)
+        lines.append(line)
+        line = '{:>21s} = {}'.format('r_num_shell_pts', int(npoints[0]))
+        for n in npoints[1:]:
+            line += ', {}'.format(int(n))
+        lines.append(line)
+
+        lines.append('')
+        lines.append('{:>21s} = {}'.format('lmax', P['atomic grid lmax']))
+        lines.append('{:>21s} = {}'.format(
+            'angular_quad_type', P['atomic grid angular quadrature']))
+        # if P['atomic grid angular quadrature'] == 'Lebedev':
+        if P['central grid angular quadrature'] == 'Lebedev':
+            lines.append('{:>21s} = {}'.format(
+                'lebedev_rule', P['atomic grid Lebedev rule']))
+        else:
+            lines.append('{:>21s} = {}'.format(
+                'phi_type_quadrature', P['atomic grid phi quadrature']))
+            lines.append('{:>21s} = {}'.format(
+                'phi_quadrature_size', P['atomic grid phi n-points']))
+            lines.append('{:>21s} = {}'.format(
+                'theta_type_quadrature',
+                P['atomic grid theta quadrature']).lower()
+            )
+            lines.append('{:>21s} = {}'.format(
+                'theta_quadrature_size', P['atomic grid theta n-points']))
+        tail = '\n'.join(lines).replace('{', '{{').replace('}', '}}')
+
+        return (
+            '\n\n## atom {0}: {1} ##\n[atom_{0}]\n' +
+            '{:>21s}'.format('atom_center') + ' = {2}, {3}, {4}\n' +
+            tail
+        )
 
     def analyze(self, indent='', **kwargs):
         """Do any analysis needed for this step, and print important results
         to the local step.out file using 'printer'
         """
 
-        filename = 'output.dat'
-        with open(os.path.join(self.directory, filename), mode='r') as fd:
-            lines = fd.read().splitlines()
-
-        data = {}
-        test = 0
-        tests = ('Sphere test', 'Yukawa test', 'Gaussian test')
-        for line in lines:
-            line = line.strip()
-            if 'center grid points:' in line:
-                data['Central grid size'] = int(line.split()[3])
-            if 'number of points per interval:' in line:
-                n_radial = int(line.split()[5])
-            if 'total angular numbers of points:' in line:
-                data['Atomic grid size'] = n_radial * int(line.split()[5])
-            if 'percent diff:' in line:
-                data[tests[test]] = float(line.split()[2])
-                test += 1
+        with self.timer.phase('analysis'):
+            filename = 'output.dat'
+            with open(os.path.join(self.directory, filename), mode='r') as fd:
+                lines = fd.read().splitlines()
+
+            data = parse_output(lines)
+
+        data.update(self.timer.results())
+        data.update(self.child_usage.results())
+        self.print_timings(data)
 
         # Put any requested results into variables or tables
         self.store_results(
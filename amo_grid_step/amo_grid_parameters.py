@@ -32,6 +32,16 @@ class AMOGridParameters(molssi_workflow.Parameters):
     """
 
     parameters = {
+        "grid engine": {
+            "default": "amo_grid executable",
+            "kind": "enumeration",
+            "default_units": "",
+            "enumeration": ("amo_grid executable", "in-process NumPy"),
+            "format_string": "s",
+            "description": "Grid engine:",
+            "help_text": ("Whether to run the external amo_grid program or "
+                          "build the grids directly in this process.")
+        },
         "central grid lmax": {
             "default": 40,
             "kind": "integer",
@@ -54,11 +64,12 @@ class AMOGridParameters(molssi_workflow.Parameters):
             "default": 35,
             "kind": "integer",
             "default_units": "",
-            "enumeration": ("default",),
+            "enumeration": ("auto",),
             "format_string": "d",
             "description": "Lebedev rule to use:",
             "help_text": ("The number of the Lebedev rule to use in the "
-                          "angular grid.")
+                          "angular grid, or 'auto' for the smallest exact "
+                          "for the l-max.")
         },
         "central grid phi quadrature": {
             "default": "trapezoidal",
@@ -74,11 +85,12 @@ class AMOGridParameters(molssi_workflow.Parameters):
             "default": 3,
             "kind": "integer",
             "default_units": "",
-            "enumeration": ("default",),
+            "enumeration": ("auto",),
             "format_string": "d",
             "description": "Number of points in phi:",
             "help_text": ("The number of points to use in the phi part of the "
-                          "angular grid.")
+                          "angular grid, or 'auto' for the smallest exact "
+                          "for the l-max.")
         },
         "central grid theta quadrature": {
             "default": "Legendre",
@@ -94,20 +106,23 @@ class AMOGridParameters(molssi_workflow.Parameters):
             "default": 50,
             "kind": "integer",
             "default_units": "",
-            "enumeration": ("default",),
+            "enumeration": ("auto",),
             "format_string": "d",
             "description": "Number of points in theta:",
             "help_text": ("The number of points to use in the theta part of "
-                          "the angular grid.")
+                          "the angular grid, or 'auto' for the smallest "
+                          "exact for the l-max.")
         },
         "central grid radial quadrature": {
             "default": "Legendre",
             "kind": "enumeration",
             "default_units": "",
-            "enumeration": ("Legendre", "Gauss"),
+            "enumeration": ("Legendre", "Gauss", "Fejer"),
             "format_string": "s",
             "description": "Radial quadrature:",
-            "help_text": ("The quadrature method for the radial grid.")
+            "help_text": ("The quadrature method for the radial grid. "
+                          "Fejer's rule nests, and only the in-process "
+                          "engine can use it.")
         },
         "central grid region n-points": {
             "default": [100, 50],
@@ -129,6 +144,39 @@ class AMOGridParameters(molssi_workflow.Parameters):
             "help_text": ("The outer edge of this region of the radial "
                           "grid.")
         },
+        "central grid angular pruning": {
+            "default": "none",
+            "kind": "enumeration",
+            "default_units": "",
+            "enumeration": ("none", "table"),
+            "format_string": "s",
+            "description": "Angular pruning:",
+            "help_text": ("Whether to use smaller angular rules for some "
+                          "radial shells. 'table' uses the pruning "
+                          "radii and l-max below. The angular settings above "
+                          "are the largest used. Only the in-process engine "
+                          "can do this.")
+        },
+        "central grid pruning radii": {
+            "default": [0.05, 0.2],
+            "kind": "list",
+            "default_units": "",
+            "enumeration": tuple(),
+            "format_string": "",
+            "description": "Pruning radii",
+            "help_text": ("The outer edges of the angular pruning zones, as "
+                          "fractions of the outer limit of the grid.")
+        },
+        "central grid pruning lmax": {
+            "default": [10, 20, 40],
+            "kind": "list",
+            "default_units": "",
+            "enumeration": tuple(),
+            "format_string": "",
+            "description": "Pruning l-max",
+            "help_text": ("The l-max in each angular pruning zone, and last "
+                          "beyond the last pruning radius.")
+        },
         "atomic grid lmax": {
             "default": 3,
             "kind": "integer",
@@ -151,11 +199,12 @@ class AMOGridParameters(molssi_workflow.Parameters):
             "default": 17,
             "kind": "integer",
             "default_units": "",
-            "enumeration": ("default",),
+            "enumeration": ("auto",),
             "format_string": "d",
             "description": "Lebedev rule to use:",
             "help_text": ("The number of the Lebedev rule to use in the "
-                          "angular grid.")
+                          "angular grid, or 'auto' for the smallest exact "
+                          "for the l-max.")
         },
         "atomic grid phi quadrature": {
             "default": "trapezoidal",
@@ -171,11 +220,12 @@ class AMOGridParameters(molssi_workflow.Parameters):
             "default": 3,
             "kind": "integer",
             "default_units": "",
-            "enumeration": ("default",),
+            "enumeration": ("auto",),
             "format_string": "d",
             "description": "Number of points in phi:",
             "help_text": ("The number of points to use in the phi part of the "
-                          "angular grid.")
+                          "angular grid, or 'auto' for the smallest exact "
+                          "for the l-max.")
         },
         "atomic grid theta quadrature": {
             "default": "Legendre",
@@ -191,20 +241,38 @@ class AMOGridParameters(molssi_workflow.Parameters):
             "default": 10,
             "kind": "integer",
             "default_units": "",
-            "enumeration": ("default",),
+            "enumeration": ("auto",),
             "format_string": "d",
             "description": "Number of points in theta:",
             "help_text": ("The number of points to use in the theta part of "
-                          "the angular grid.")
+                          "the angular grid, or 'auto' for the smallest "
+                          "exact for the l-max.")
         },
         "atomic grid radial quadrature": {
             "default": "Legendre",
             "kind": "enumeration",
             "default_units": "",
-            "enumeration": ("Legendre", "Gauss"),
+            "enumeration": ("Legendre", "Gauss", "Fejer", "Becke",
+                            "Mura-Knowles", "Treutler-Ahlrichs"),
             "format_string": "s",
             "description": "Radial quadrature:",
-            "help_text": ("The quadrature method for the radial grid.")
+            "help_text": ("The quadrature method for the radial grid. The "
+                          "Becke, Mura-Knowles and Treutler-Ahlrichs "
+                          "mappings crowd the points of the innermost "
+                          "region towards the nucleus, with Fejer's rule "
+                          "in any other regions. These and Fejer's rule "
+                          "nest, and only the in-process engine can use "
+                          "them.")
+        },
+        "atomic grid radial scale": {
+            "default": "auto",
+            "kind": "float",
+            "default_units": "Å",
+            "enumeration": ("auto",),
+            "format_string": ".3f",
+            "description": "Radial scale:",
+            "help_text": ("The length scale of a mapped radial quadrature, "
+                          "or 'auto' for the usual value for the element.")
         },
         "atomic grid region n-points": {
             "default": [20],
@@ -226,6 +294,302 @@ class AMOGridParameters(molssi_workflow.Parameters):
             "help_text": ("The outer edge of this region of the radial "
                           "grid.")
         },
+        "atomic grid angular pruning": {
+            "default": "none",
+            "kind": "enumeration",
+            "default_units": "",
+            "enumeration": ("none", "SG-1", "table"),
+            "format_string": "s",
+            "description": "Angular pruning:",
+            "help_text": ("Whether to use smaller angular rules for some "
+                          "radial shells. 'SG-1' uses the zones of the SG-1 "
+                          "grid, scaled by the Bragg-Slater radius of the "
+                          "element. 'table' uses the pruning radii and l-max "
+                          "below. The angular settings above are the largest "
+                          "used. Only the in-process engine can do this.")
+        },
+        "atomic grid pruning radii": {
+            "default": [0.1, 0.3],
+            "kind": "list",
+            "default_units": "",
+            "enumeration": tuple(),
+            "format_string": "",
+            "description": "Pruning radii",
+            "help_text": ("The outer edges of the angular pruning zones, as "
+                          "fractions of the outer limit of the grid.")
+        },
+        "atomic grid pruning lmax": {
+            "default": [1, 2, 3],
+            "kind": "list",
+            "default_units": "",
+            "enumeration": tuple(),
+            "format_string": "",
+            "description": "Pruning l-max",
+            "help_text": ("The l-max in each angular pruning zone, and last "
+                          "beyond the last pruning radius.")
+        },
+        "atomic grid element scaling": {
+            "default": "none",
+            "kind": "enumeration",
+            "default_units": "",
+            "enumeration": ("none", "Bragg-Slater"),
+            "format_string": "s",
+            "description": "Adjust for each element:",
+            "help_text": ("Whether to use the same grid on every atom, or to "
+                          "treat the parameters as those for carbon and scale "
+                          "the grid for each element by its Bragg-Slater "
+                          "radius and row of the periodic table.")
+        },
+        "element grid settings": {
+            "default": {},
+            "kind": "dictionary",
+            "default_units": "",
+            "enumeration": tuple(),
+            "format_string": "",
+            "description": "Settings for elements",
+            "help_text": ("Atomic grid parameters for specific elements, "
+                          "e.g. {'H': {'region n-points': [15]}}, using the "
+                          "names of the atomic grid parameters without "
+                          "'atomic grid'.")
+        },
+        "write grid file": {
+            "default": "yes",
+            "kind": "boolean",
+            "default_units": "",
+            "enumeration": ('yes', 'no'),
+            "format_string": "",
+            "description": "Write grid file:",
+            "help_text": ("Whether the in-process engine writes the points "
+                          "and weights to the binary file grid.bin.")
+        },
+        "grid block size": {
+            "default": 100000,
+            "kind": "integer",
+            "default_units": "",
+            "enumeration": tuple(),
+            "format_string": "d",
+            "description": "Points per block:",
+            "help_text": ("The in-process engine generates the grids in "
+                          "blocks of at most this many points, which bounds "
+                          "the memory it needs.")
+        },
+        "use symmetry": {
+            "default": "no",
+            "kind": "boolean",
+            "default_units": "",
+            "enumeration": ("yes", "no"),
+            "format_string": "s",
+            "description": "Use symmetry:",
+            "help_text": ("Build only the symmetry-unique points of the "
+                          "grids, using the point group of the structure. "
+                          "Only the in-process engine can do this.")
+        },
+        "symmetry tolerance": {
+            "default": 1.0e-04,
+            "kind": "float",
+            "default_units": "",
+            "enumeration": tuple(),
+            "format_string": ".1e",
+            "description": "Symmetry tolerance:",
+            "help_text": ("How far atoms may be from the symmetric positions "
+                          "and still count as equivalent.")
+        },
+        "partition weights": {
+            "default": "none",
+            "kind": "enumeration",
+            "default_units": "",
+            "enumeration": ("none", "Becke", "Stratmann"),
+            "format_string": "s",
+            "description": "Partition weights:",
+            "help_text": ("Multiply the weights of the overlapping central "
+                          "and atomic grids by Becke's or Stratmann's fuzzy "
+                          "cell weights, so that integrals over all of the "
+                          "grids count each region once. Only the in-process "
+                          "engine can do this.")
+        },
+        "pruning threshold": {
+            "default": 0.0,
+            "kind": "float",
+            "default_units": "",
+            "enumeration": tuple(),
+            "format_string": ".1e",
+            "description": "Pruning threshold:",
+            "help_text": ("Drop the points whose partition weight is below "
+                          "this, since they contribute next to nothing. "
+                          "Zero keeps every point. This needs partition "
+                          "weights.")
+        },
+        "error estimate": {
+            "default": "none",
+            "kind": "enumeration",
+            "default_units": "",
+            "enumeration": ("none", "nested"),
+            "format_string": "s",
+            "description": "Error estimate:",
+            "help_text": ("Estimate the errors of the tests from the radial "
+                          "rule nested in that of the central grid, which "
+                          "needs a Fejer, Becke, Mura-Knowles or "
+                          "Treutler-Ahlrichs radial quadrature with an odd "
+                          "number of points in each region. Only the "
+                          "in-process engine can do this.")
+        },
+        "maximum points": {
+            "default": 0,
+            "kind": "integer",
+            "default_units": "",
+            "enumeration": tuple(),
+            "format_string": "d",
+            "description": "Maximum points:",
+            "help_text": ("Stop before building grids with more points than "
+                          "this in total. 0 means no limit.")
+        },
+        "maximum memory": {
+            "default": 0,
+            "kind": "integer",
+            "default_units": "",
+            "enumeration": tuple(),
+            "format_string": "d",
+            "description": "Maximum memory (MB):",
+            "help_text": ("Stop before building grids whose points and "
+                          "weights need more memory than this. 0 means no "
+                          "limit.")
+        },
+        "maximum time": {
+            "default": 0.0,
+            "kind": "float",
+            "default_units": "",
+            "enumeration": tuple(),
+            "format_string": ".1f",
+            "description": "Maximum time (s):",
+            "help_text": ("Stop before building grids estimated to take "
+                          "longer than this. 0 means no limit.")
+        },
+        "execution": {
+            "default": "blocking",
+            "kind": "enumeration",
+            "default_units": "",
+            "enumeration": ("blocking", "asynchronous"),
+            "format_string": "s",
+            "description": "Run amo_grid:",
+            "help_text": ("Whether to wait for amo_grid to finish, or run it "
+                          "asynchronously, reporting its progress as it "
+                          "runs.")
+        },
+        "timeout": {
+            "default": 0.0,
+            "kind": "float",
+            "default_units": "",
+            "enumeration": tuple(),
+            "format_string": ".1f",
+            "description": "Time limit (s):",
+            "help_text": ("The wall-clock limit for running amo_grid "
+                          "asynchronously, in seconds. 0 means no limit.")
+        },
+        "sweep": {
+            "default": "",
+            "kind": "string",
+            "default_units": "",
+            "enumeration": tuple(),
+            "format_string": "s",
+            "description": "Parameter sweep:",
+            "help_text": ("Parameters to sweep, as 'parameter = values' "
+                          "separated by semicolons, where the values are a "
+                          "list such as '17, 23, 29' or a range such as "
+                          "'range(20, 61, 10)'. Every combination is run. "
+                          "Leave empty for a single run.")
+        },
+        "sweep workers": {
+            "default": 0,
+            "kind": "integer",
+            "default_units": "",
+            "enumeration": tuple(),
+            "format_string": "d",
+            "description": "Parallel sweep runs:",
+            "help_text": ("The number of sweep runs to do at the same time. "
+                          "0 uses all the cores on the machine.")
+        },
+        "autotune": {
+            "default": "no",
+            "kind": "boolean",
+            "default_units": "",
+            "enumeration": ("yes", "no"),
+            "format_string": "s",
+            "description": "Tune the central grid:",
+            "help_text": ("Search for the smallest central grid whose test "
+                          "errors are within the targets, starting from "
+                          "the central grid given, and use it.")
+        },
+        "target Sphere error": {
+            "default": 1.0,
+            "kind": "float",
+            "default_units": "",
+            "enumeration": tuple(),
+            "format_string": ".3g",
+            "description": "Target Sphere test error (%):",
+            "help_text": ("The largest acceptable error in the Sphere test, "
+                          "in percent. 0 ignores the test.")
+        },
+        "target Yukawa error": {
+            "default": 1.0e-06,
+            "kind": "float",
+            "default_units": "",
+            "enumeration": tuple(),
+            "format_string": ".3g",
+            "description": "Target Yukawa test error (%):",
+            "help_text": ("The largest acceptable error in the Yukawa test, "
+                          "in percent. 0 ignores the test.")
+        },
+        "target Gaussian error": {
+            "default": 1.0e-06,
+            "kind": "float",
+            "default_units": "",
+            "enumeration": tuple(),
+            "format_string": ".3g",
+            "description": "Target Gaussian test error (%):",
+            "help_text": ("The largest acceptable error in the Gaussian "
+                          "test, in percent. 0 ignores the test.")
+        },
+        "autotune evaluations": {
+            "default": 100,
+            "kind": "integer",
+            "default_units": "",
+            "enumeration": tuple(),
+            "format_string": "d",
+            "description": "Maximum grids to try:",
+            "help_text": ("The most grids the tuning will evaluate before "
+                          "settling for the best found.")
+        },
+        "cache results": {
+            "default": "no",
+            "kind": "boolean",
+            "default_units": "",
+            "enumeration": ('yes', 'no'),
+            "format_string": "",
+            "description": "Cache results:",
+            "help_text": ("Whether to reuse the results of identical earlier "
+                          "runs of amo_grid, keeping them in the cache "
+                          "directory below.")
+        },
+        "cache directory": {
+            "default": "~/.amo_grid_step/cache",
+            "kind": "string",
+            "default_units": "",
+            "enumeration": tuple(),
+            "format_string": "s",
+            "description": "Cache directory:",
+            "help_text": ("The directory holding the cached results.")
+        },
+        "cache size limit": {
+            "default": 1000,
+            "kind": "integer",
+            "default_units": "",
+            "enumeration": tuple(),
+            "format_string": "d",
+            "description": "Cache size limit (MB):",
+            "help_text": ("The maximum size of the cache in MB. The least "
+                          "recently used results are removed to stay under "
+                          "this limit.")
+        },
         "results": {
             "default": {},
             "kind": "dictionary",
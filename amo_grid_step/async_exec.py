@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+"""Running amo_grid as an asynchronous subprocess with live progress.
+
+execute() is a coroutine that starts the program, follows its standard
+output and the output.dat file while it runs, and reports progress through a
+callback. run_coroutine() runs it from ordinary code, even when an event
+loop is already running, and run() is the blocking counterpart without the
+progress. Both run the program in a directory that already holds its input,
+and return a dictionary in the same form as ExecLocal.run() so that the
+rest of the step does not care how the program was run.
+
+Unlike ExecLocal, which is given the input in memory and hands back the
+output to be written out, the program runs directly in the step's
+directory: the input is streamed there beforehand and the output stays
+where the program wrote it.
+"""
+
+import asyncio
+import concurrent.futures
+import logging
+import os.path
+import subprocess
+
+logger = logging.getLogger(__name__)
+
+
+class Progress(object):
+    """Follow the output of amo_grid and report what it has done.
+
+    The same lines may arrive from both standard output and output.dat, so
+    each milestone is reported only once.
+    """
+
+    def __init__(self, report=None):
+        """Keyword arguments:
+            report: a function called with a line of text for each step.
+        """
+        self.report = report if report is not None else logger.info
+        self.central_done = False
+        self.atomic_done = False
+        self.n_tests = 0
+        self.counts = {}
+        self.n_radial = {}
+
+    def line(self, line, source='stdout'):
+        """Process a line of output, reporting any new milestone"""
+        line = line.strip()
+        if 'center grid points:' in line:
+            if not self.central_done:
+                self.central_done = True
+                self.report(
+                    'Central grid generated: {} points'
+                    .format(line.split()[3])
+                )
+        elif 'number of points per interval:' in line:
+            self.n_radial[source] = int(line.split()[5])
+        elif 'total angular numbers of points:' in line:
+            if not self.atomic_done and source in self.n_radial:
+                self.atomic_done = True
+                n = self.n_radial[source] * int(line.split()[5])
+                self.report('Atomic grid generated: {} points'.format(n))
+        elif 'percent diff:' in line:
+            self.counts[source] = self.counts.get(source, 0) + 1
+            if self.counts[source] > self.n_tests:
+                self.n_tests = self.counts[source]
+                self.report(
+                    'Test {} of 3 completed: {} percent error'
+                    .format(self.n_tests, line.split()[2])
+                )
+
+
+async def _read_lines(stream, lines, progress):
+    """Collect the lines from the stream, passing each to progress"""
+    while True:
+        line = await stream.readline()
+        if not line:
+            break
+        text = line.decode(errors='replace')
+        lines.append(text)
+        if progress is not None:
+            progress.line(text)
+
+
+async def tail(filename, progress, interval=0.5):
+    """Pass new complete lines of the file to progress until cancelled"""
+    position = 0
+    buffer = ''
+    while True:
+        if os.path.exists(filename):
+            with open(filename, 'r') as fd:
+                fd.seek(position)
+                buffer += fd.read()
+                position = fd.tell()
+            *lines, buffer = buffer.split('\n')
+            for line in lines:
+                progress.line(line, source=filename)
+        await asyncio.sleep(interval)
+
+
+async def execute(
+    cmd, directory, return_files=(), progress=None, timeout=None,
+    interval=0.5
+):
+    """Run cmd in directory, reporting progress, and return the results.
+
+    Keyword arguments:
+        return_files: the files to read back from the directory.
+        progress: a Progress object following the output.
+        timeout: the wall-clock limit in seconds, or None.
+        interval: how often to look at the output files, in seconds.
+
+    If the timeout is reached the program is killed and RuntimeError raised.
+    If the coroutine is cancelled the program is killed as well.
+    """
+    if progress is None:
+        progress = Progress()
+
+    # Don't follow output left over from an earlier run
+    for filename in return_files:
+        path = os.path.join(directory, filename)
+        if os.path.exists(path):
+            os.remove(path)
+
+    process = await asyncio.create_subprocess_exec(
+        *cmd,
+        cwd=directory,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+
+    stdout = []
+    stderr = []
+    watchers = [
+        asyncio.ensure_future(tail(
+            os.path.join(directory, filename), progress, interval
+        ))
+        for filename in return_files
+    ]
+    try:
+        await asyncio.wait_for(
+            asyncio.gather(
+                _read_lines(process.stdout, stdout, progress),
+                _read_lines(process.stderr, stderr, None),
+                process.wait()
+            ),
+            timeout
+        )
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+        raise RuntimeError(
+            '{} did not finish within {} seconds'.format(cmd[0], timeout)
+        )
+    except asyncio.CancelledError:
+        process.kill()
+        await process.wait()
+        raise
+    finally:
+        for watcher in watchers:
+            watcher.cancel()
+        await asyncio.gather(*watchers, return_exceptions=True)
+
+    result = _result(
+        directory, process.returncode, ''.join(stdout), ''.join(stderr),
+        return_files
+    )
+    # Catch anything written since the files were last looked at
+    for filename in return_files:
+        text = result[filename]['data']
+        if text is not None:
+            path = os.path.join(directory, filename)
+            for line in text.splitlines():
+                progress.line(line, source=path + ':final')
+    return result
+
+
+def run_coroutine(coroutine):
+    """Run a coroutine to completion from ordinary, blocking code.
+
+    asyncio.run() can't be used while an event loop is running in this
+    thread, as in Jupyter or an asynchronous workflow driver, so then the
+    coroutine runs in a new event loop in a worker thread.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    with concurrent.futures.ThreadPoolExecutor(1) as pool:
+        return pool.submit(asyncio.run, coroutine).result()
+
+
+def run(cmd, directory, return_files=(), timeout=None):
+    """Run cmd in directory, waiting for it, and return the results.
+
+    The input is read by the program from the directory, so it is never held
+    in memory here. If the timeout, in seconds, is reached the program is
+    killed and RuntimeError raised.
+    """
+    for filename in return_files:
+        path = os.path.join(directory, filename)
+        if os.path.exists(path):
+            os.remove(path)
+
+    try:
+        process = subprocess.run(
+            cmd, cwd=directory, stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE, universal_newlines=True, timeout=timeout
+        )
+    except subprocess.TimeoutExpired:
+        raise RuntimeError(
+            '{} did not finish within {} seconds'.format(cmd[0], timeout)
+        )
+    return _result(
+        directory, process.returncode, process.stdout, process.stderr,
+        return_files
+    )
+
+
+def _result(directory, returncode, stdout, stderr, return_files):
+    """The results in the form ExecLocal.run() returns them"""
+    result = {
+        'returncode': returncode,
+        'stdout': stdout,
+        'stderr': stderr,
+        'files': list(return_files),
+    }
+    for filename in return_files:
+        path = os.path.join(directory, filename)
+        try:
+            with open(path, 'r') as fd:
+                text = fd.read()
+        except Exception as e:
+            result[filename] = {'data': None, 'exception': str(e)}
+        else:
+            result[filename] = {'data': text, 'exception': None}
+    return result
@@ -0,0 +1,299 @@
+# -*- coding: utf-8 -*-
+"""Automatic tuning of the central grid to meet target test errors.
+
+The tuner searches the number of points in each radial region, a common
+scale factor for the region outer limits and the angular quadrature for the
+cheapest central grid whose Sphere, Yukawa and Gaussian test errors are
+within the targets. It starts from small grids and repeatedly takes the step
+that reduces the errors most for the points it adds, stopping as soon as the
+targets are met, and then tries to give back anything not needed.
+
+Every configuration is evaluated at most once. The in-process evaluator also
+caches the integrals over each radial region, so configurations that share
+regions share that work. The test functions are spherically symmetric, so
+with that evaluator the angular quadrature cannot improve the errors and
+stays at the smallest that is exact for the l-max.
+"""
+
+import logging
+import math
+
+import numpy as np
+
+from amo_grid_step import estimate, grid, quadrature
+from amo_grid_step.utils import as_list
+
+logger = logging.getLogger(__name__)
+
+test_names = ('Sphere test', 'Yukawa test', 'Gaussian test')
+
+# Multipliers for the number of points in a region and scale factors for the
+# outer limits that the search considers.
+n_points_factors = (0.25, 0.35, 0.5, 0.7, 1.0, 1.4, 2.0, 2.8, 4.0)
+limit_factors = (0.5, 0.75, 1.0, 1.5, 2.0)
+
+
+class RadialEvaluator(object):
+    """Evaluate the test errors of the central grid in process.
+
+    The integrals over each radial region are cached, keyed by the number of
+    points, the ends of the region and the quadrature.
+    """
+
+    def __init__(self):
+        self.regions = {}
+        self.n_evaluations = 0
+        self.n_region_hits = 0
+
+    def region(self, n, r0, r1, method, scale=None):
+        key = (n, r0, r1, method, scale)
+        if key in self.regions:
+            self.n_region_hits += 1
+            return self.regions[key]
+
+        (r, w), = quadrature.radial_regions([n], [r1 - r0], method, scale)
+        r = r0 + r
+        w = w * r * r
+        sums = np.array([np.dot(w, f(r)) for _, f, _ in grid.tests])
+        self.regions[key] = sums
+        return sums
+
+    def __call__(self, P):
+        self.n_evaluations += 1
+        method = P['central grid radial quadrature']
+        scale = grid.radial_scale(P, 'central grid')
+        totals = np.zeros(len(grid.tests))
+        r0 = 0.0
+        for n, r1 in zip(
+            as_list(P['central grid region n-points']),
+            as_list(P['central grid region outer limit'])
+        ):
+            totals += self.region(int(n), r0, float(r1), method, scale)
+            r0 = float(r1)
+        # The angular weights always sum to 4*pi
+        totals *= 4 * np.pi
+
+        return {
+            name: float(100 * (total - exact) / exact)
+            for total, (name, _, exact) in zip(totals, grid.tests)
+        }
+
+
+class Dimension(object):
+    """One parameter, or group of parameters, that the search varies"""
+
+    def __init__(self, name, values, start, apply):
+        self.name = name
+        self.values = values
+        self.start = start
+        self.apply = apply
+
+
+def _ladder(n0, lowest=2):
+    return sorted(set(
+        max(lowest, int(round(n0 * f))) for f in n_points_factors
+    ))
+
+
+def dimensions(P):
+    """The dimensions of the search for the parameter values P"""
+    P = grid.resolve_angular(P)
+    result = []
+
+    n_points = as_list(P['central grid region n-points'])
+    for i, n0 in enumerate(n_points):
+        def apply(P, value, i=i):
+            tmp = list(as_list(P['central grid region n-points']))
+            tmp[i] = value
+            P['central grid region n-points'] = tmp
+        result.append(Dimension(
+            'central grid region n-points[{}]'.format(i),
+            _ladder(int(n0)), 0, apply
+        ))
+
+    limits = [float(r) for r in as_list(P['central grid region outer limit'])]
+
+    def apply(P, value, limits=limits):
+        P['central grid region outer limit'] = [value * r for r in limits]
+    result.append(Dimension(
+        'central grid region outer limit scale', list(limit_factors),
+        limit_factors.index(1.0), apply
+    ))
+
+    lmax = int(P['central grid lmax'])
+    if P['central grid angular quadrature'] == 'Lebedev':
+        minimum = quadrature.minimal_lebedev_rule(lmax)
+        rules = sorted(n for n in quadrature.lebedev_n_points if n >= minimum)
+
+        def apply(P, value):
+            P['central grid Lebedev rule'] = value
+        result.append(
+            Dimension('central grid Lebedev rule', rules, 0, apply)
+        )
+    else:
+        n_theta, n_phi = quadrature.minimal_product(lmax)
+        for key, n in (
+            ('central grid theta n-points', n_theta),
+            ('central grid phi n-points', n_phi)
+        ):
+            def apply(P, value, key=key):
+                P[key] = value
+            values = sorted(set(
+                int(round(n * f)) for f in (1.0, 1.25, 1.5, 2.0, 2.5, 3.0)
+            ))
+            result.append(Dimension(key, values, 0, apply))
+    return result
+
+
+class AutoTuner(object):
+    """Search for the cheapest central grid meeting the target errors"""
+
+    def __init__(
+        self, P, targets, evaluate=None, max_evaluations=100, lookahead=3,
+        max_points=0
+    ):
+        """Set up the search.
+
+        Keyword arguments:
+            P: the dictionary of parameter values to start from.
+            targets: the largest acceptable absolute percent error for each
+                test, by name. Tests that are missing or 0 are ignored.
+            evaluate: a function of the parameter values returning the test
+                errors. Defaults to the in-process RadialEvaluator.
+            max_evaluations: stop after evaluating this many grids.
+            lookahead: how many steps along a dimension to look when the
+                next step does not help.
+            max_points: the most points the central grid may have, or 0 for
+                no limit.
+        """
+        self.P = dict(P)
+        self.targets = {
+            name: abs(value) for name, value in targets.items() if value
+        }
+        self.evaluate = evaluate if evaluate is not None else RadialEvaluator()
+        self.max_evaluations = max_evaluations
+        self.lookahead = lookahead
+        self.max_points = max_points
+        self.dimensions = dimensions(P)
+        self.evaluated = {}
+
+    def parameters(self, config):
+        """The parameter values for a configuration"""
+        P = dict(self.P)
+        for dimension, index in zip(self.dimensions, config):
+            dimension.apply(P, dimension.values[index])
+        return P
+
+    def cost(self, config):
+        """The number of points in the central grid for a configuration"""
+        return estimate.central_n_points(
+            grid.resolve_angular(self.parameters(config))
+        )
+
+    def over_budget(self, config):
+        """Whether a configuration has more points than allowed"""
+        return self.max_points > 0 and self.cost(config) > self.max_points
+
+    def errors(self, config):
+        """The test errors for a configuration, evaluated at most once"""
+        if config not in self.evaluated:
+            self.evaluated[config] = self.evaluate(self.parameters(config))
+        return self.evaluated[config]
+
+    def badness(self, errors):
+        """How far the errors are from the targets, 0 when all are met"""
+        total = 0.0
+        for name, target in self.targets.items():
+            error = abs(errors.get(name, math.inf))
+            if error > target:
+                total += math.log10(error / target)
+        return total
+
+    def run(self):
+        """Run the search, returning (parameters, errors, points).
+
+        If no grid meets the targets within max_evaluations and the budget,
+        the best one found is returned.
+        """
+        config = tuple(d.start for d in self.dimensions)
+        if self.over_budget(config):
+            logger.warning(
+                'The smallest grid the autotuning considers has {} points, '
+                'more than the limit of {}.'.format(
+                    self.cost(config), self.max_points
+                )
+            )
+        badness = self.badness(self.errors(config))
+
+        # Grow the grid, taking the most cost-effective step each time
+        while badness > 0 and len(self.evaluated) < self.max_evaluations:
+            cost = self.cost(config)
+            best = None
+            # Look up to 'lookahead' steps along each dimension, since the
+            # errors do not always fall smoothly, e.g. for the sphere.
+            for step in range(1, self.lookahead + 1):
+                for i, dimension in enumerate(self.dimensions):
+                    if config[i] + step >= len(dimension.values):
+                        continue
+                    trial = config[:i] + (config[i] + step,) + config[i + 1:]
+                    if self.over_budget(trial):
+                        continue
+                    gain = badness - self.badness(self.errors(trial))
+                    if gain <= 0:
+                        continue
+                    score = gain / max(self.cost(trial) - cost, 1)
+                    if best is None or score > best[0]:
+                        best = (score, trial)
+                if best is not None:
+                    break
+            if best is None:
+                break
+            config = best[1]
+            badness = self.badness(self.errors(config))
+
+        if badness > 0:
+            logger.warning(
+                'The autotuning did not meet the target errors after '
+                'evaluating {} grids within the budget.'
+                .format(len(self.evaluated))
+            )
+        else:
+            # Give back anything that isn't needed
+            improved = True
+            while improved:
+                improved = False
+                for i in range(len(self.dimensions)):
+                    if config[i] == 0:
+                        continue
+                    trial = config[:i] + (config[i] - 1,) + config[i + 1:]
+                    if (
+                        self.cost(trial) <= self.cost(config) and
+                        self.badness(self.errors(trial)) == 0
+                    ):
+                        config = trial
+                        improved = True
+
+        return (
+            grid.resolve_angular(self.parameters(config)),
+            self.errors(config),
+            self.cost(config)
+        )
+
+    def table(self):
+        """A text table of the grids evaluated, cheapest first"""
+        lines = []
+        header = '{:>12s}'.format('Points') + ''.join(
+            '{:>15s}'.format(name) for name in test_names
+        )
+        lines.append(header)
+        lines.append('-' * len(header))
+        rows = sorted(
+            (self.cost(config), config) for config in self.evaluated
+        )
+        for cost, config in rows:
+            errors = self.evaluated[config]
+            lines.append('{:12d}'.format(cost) + ''.join(
+                '{:15.3e}'.format(errors.get(name, math.nan))
+                for name in test_names
+            ))
+        return '\n'.join(lines)
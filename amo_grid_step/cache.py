@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""Persistent on-disk cache of the results of amo_grid.
+
+The results are keyed on a hash of the input for amo_grid and the version of
+the engine that produced them. Each entry is a directory holding the files
+that the run returned, so a hit simply copies them back into the working
+directory of the step. The least recently used entries are removed when the
+total size of the cache grows past its limit.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import os.path
+import shutil
+
+logger = logging.getLogger(__name__)
+
+
+def executable_version(executable='amo_grid'):
+    """A string identifying the installed executable.
+
+    There is no reliable way to ask amo_grid for its version, so use the
+    path, size and modification time of the executable, which change when
+    it is rebuilt or replaced.
+    """
+    path = shutil.which(executable)
+    if path is None:
+        return executable + ':unknown'
+    stat = os.stat(path)
+    return '{}:{}:{}'.format(path, stat.st_size, int(stat.st_mtime))
+
+
+class ResultCache(object):
+    """A size-limited, least-recently-used cache of output files"""
+
+    def __init__(self, directory='~/.amo_grid_step/cache', max_size=1000):
+        """Open or create the cache in the given directory.
+
+        Keyword arguments:
+            directory: where to keep the cache.
+            max_size: the size limit of the cache in MB.
+        """
+        self.directory = os.path.expanduser(directory)
+        self.max_size = int(max_size * 1024 * 1024)
+        os.makedirs(self.directory, exist_ok=True)
+
+        self._stats_file = os.path.join(self.directory, 'stats.json')
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+        if os.path.exists(self._stats_file):
+            try:
+                with open(self._stats_file, 'r') as fd:
+                    self.stats.update(json.load(fd))
+            except (OSError, ValueError):
+                logger.warning(
+                    'Could not read the cache statistics in {}'
+                    .format(self._stats_file)
+                )
+
+    @staticmethod
+    def key(input, version):
+        """The key for the given input text and engine version"""
+        sha = hashlib.sha256()
+        sha.update(version.encode('utf-8'))
+        sha.update(b'\0')
+        sha.update(input.encode('utf-8'))
+        return sha.hexdigest()
+
+    @staticmethod
+    def file_key(filename, version, chunk_size=1 << 20):
+        """The key for the input in a file, the same as key() for its text.
+
+        The file is read in chunks so that it is never all in memory.
+        """
+        sha = hashlib.sha256()
+        sha.update(version.encode('utf-8'))
+        sha.update(b'\0')
+        with open(filename, 'rb') as fd:
+            for chunk in iter(lambda: fd.read(chunk_size), b''):
+                sha.update(chunk)
+        return sha.hexdigest()
+
+    def _entry(self, key):
+        return os.path.join(self.directory, key)
+
+    def _save_stats(self):
+        tmp = self._stats_file + '.tmp'
+        with open(tmp, 'w') as fd:
+            json.dump(self.stats, fd)
+        os.replace(tmp, self._stats_file)
+
+    def restore(self, key, directory):
+        """Copy the files for key into directory, returning True on a hit"""
+        entry = self._entry(key)
+        if not os.path.isdir(entry):
+            self.stats['misses'] += 1
+            self._save_stats()
+            return False
+
+        for filename in os.listdir(entry):
+            shutil.copyfile(
+                os.path.join(entry, filename),
+                os.path.join(directory, filename)
+            )
+        # Mark the entry as recently used
+        os.utime(entry)
+
+        self.stats['hits'] += 1
+        self._save_stats()
+        return True
+
+    def store(self, key, files):
+        """Save the files, a dictionary of name: contents, under key"""
+        entry = self._entry(key)
+        tmp = entry + '.tmp'
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        for filename, contents in files.items():
+            mode = 'wb' if isinstance(contents, bytes) else 'w'
+            with open(os.path.join(tmp, filename), mode) as fd:
+                fd.write(contents)
+        shutil.rmtree(entry, ignore_errors=True)
+        os.replace(tmp, entry)
+
+        self.evict()
+
+    def entries(self):
+        """The entries as (last used, size, key), oldest first"""
+        result = []
+        for key in os.listdir(self.directory):
+            entry = self._entry(key)
+            if not os.path.isdir(entry) or key.endswith('.tmp'):
+                continue
+            size = 0
+            for filename in os.listdir(entry):
+                size += os.path.getsize(os.path.join(entry, filename))
+            result.append((os.path.getmtime(entry), size, key))
+        return sorted(result)
+
+    def size(self):
+        """The total size of the cache in bytes"""
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self):
+        """Remove the least recently used entries until under the limit"""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        n_evicted = 0
+        for _, size, key in entries:
+            if total <= self.max_size:
+                break
+            shutil.rmtree(self._entry(key), ignore_errors=True)
+            total -= size
+            n_evicted += 1
+        if n_evicted > 0:
+            self.stats['evictions'] += n_evicted
+            self._save_stats()
+        return n_evicted
+
+    def clear(self):
+        """Remove all the entries, keeping the statistics"""
+        for _, _, key in self.entries():
+            shutil.rmtree(self._entry(key), ignore_errors=True)
+
+    def __repr__(self):
+        return '{}({!r}, hits={hits}, misses={misses})'.format(
+            self.__class__.__name__, self.directory, **self.stats
+        )
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""Per-element settings for the atomic grids.
+
+By default every atom gets the same grid. With Bragg-Slater scaling, the
+atomic grid parameters are taken as those for carbon and adjusted for each
+element: the region outer limits scale with the Bragg-Slater radius, the
+number of radial points with the row of the periodic table, and hydrogen and
+helium use a smaller angular quadrature. Any of this can be overridden for
+an element with a dictionary such as
+
+    {'H': {'region n-points': [15], 'Lebedev rule': 11}}
+
+whose keys are the names of the atomic grid parameters without the leading
+'atomic grid'.
+"""
+
+import logging
+import math
+
+from amo_grid_step import quadrature
+from amo_grid_step.utils import as_list
+
+logger = logging.getLogger(__name__)
+
+# Bragg-Slater radii in Angstrom, from J. C. Slater, J. Chem. Phys. 41, 3199
+# (1964), with 0.35 for hydrogen following A. D. Becke, J. Chem. Phys. 88,
+# 2547 (1988). Slater gave no values for the noble gases, so those are
+# estimates.
+bragg_slater_radii = {
+    'H': 0.35, 'He': 0.35,
+    'Li': 1.45, 'Be': 1.05, 'B': 0.85, 'C': 0.70, 'N': 0.65, 'O': 0.60,
+    'F': 0.50, 'Ne': 0.45,
+    'Na': 1.80, 'Mg': 1.50, 'Al': 1.25, 'Si': 1.10, 'P': 1.00, 'S': 1.00,
+    'Cl': 1.00, 'Ar': 0.95,
+    'K': 2.20, 'Ca': 1.80, 'Sc': 1.60, 'Ti': 1.40, 'V': 1.35, 'Cr': 1.40,
+    'Mn': 1.40, 'Fe': 1.40, 'Co': 1.35, 'Ni': 1.35, 'Cu': 1.35, 'Zn': 1.35,
+    'Ga': 1.30, 'Ge': 1.25, 'As': 1.15, 'Se': 1.15, 'Br': 1.15, 'Kr': 1.10,
+    'Rb': 2.35, 'Sr': 2.00, 'Y': 1.80, 'Zr': 1.55, 'Nb': 1.45, 'Mo': 1.45,
+    'Tc': 1.35, 'Ru': 1.30, 'Rh': 1.35, 'Pd': 1.40, 'Ag': 1.60, 'Cd': 1.55,
+    'In': 1.55, 'Sn': 1.45, 'Sb': 1.45, 'Te': 1.40, 'I': 1.40, 'Xe': 1.30,
+}
+
+# The element whose grid the atomic grid parameters describe
+reference = 'C'
+
+# The Bohr radius in Angstrom
+bohr = 0.529177210903
+
+# The elements of groups 1 and 2, apart from hydrogen and helium
+_alkali_alkaline = ('Li', 'Be', 'Na', 'Mg', 'K', 'Ca', 'Rb', 'Sr')
+
+# The xi of Treutler and Ahlrichs, J. Chem. Phys. 102, 346 (1995), in bohr
+treutler_xi = {
+    'H': 0.8, 'He': 0.9,
+    'Li': 1.8, 'Be': 1.4, 'B': 1.3, 'C': 1.1, 'N': 0.9, 'O': 0.9, 'F': 0.9,
+    'Ne': 0.9,
+    'Na': 1.4, 'Mg': 1.3, 'Al': 1.3, 'Si': 1.2, 'P': 1.1, 'S': 1.0,
+    'Cl': 1.0, 'Ar': 1.0,
+    'K': 1.5, 'Ca': 1.4, 'Sc': 1.3, 'Ti': 1.2, 'V': 1.2, 'Cr': 1.2,
+    'Mn': 1.2, 'Fe': 1.2, 'Co': 1.2, 'Ni': 1.1, 'Cu': 1.1, 'Zn': 1.1,
+    'Ga': 1.1, 'Ge': 1.0, 'As': 0.9, 'Se': 0.9, 'Br': 0.9, 'Kr': 0.9,
+}
+
+# The last atomic number in each row of the periodic table
+_row_ends = (2, 10, 18, 36, 54, 86, 118)
+_symbols = list(bragg_slater_radii)
+
+# Scale factors for the number of radial points by row
+row_scale = {1: 0.75, 2: 1.0, 3: 1.25}
+
+
+def row(element):
+    """The row of the periodic table for the element"""
+    Z = _symbols.index(element) + 1
+    for i, end in enumerate(_row_ends, start=1):
+        if Z <= end:
+            return i
+
+
+def radial_scale(method, element=None):
+    """The usual length scale in Angstrom of a mapped radial quadrature.
+
+    Becke used half the Bragg-Slater radius, or all of it for hydrogen, and
+    Mura and Knowles 5 bohr, or 7 for the alkali and alkaline earth metals.
+    Elements without values, or None, are treated as the reference element.
+    """
+    if element not in bragg_slater_radii:
+        element = reference
+    if method == 'Becke':
+        radius = bragg_slater_radii[element]
+        return radius if element == 'H' else 0.5 * radius
+    elif method == 'Mura-Knowles':
+        return (7.0 if element in _alkali_alkaline else 5.0) * bohr
+    elif method == 'Treutler-Ahlrichs':
+        return treutler_xi.get(element, 1.0) * bohr
+    raise ValueError(
+        "The '{}' radial quadrature has no length scale".format(method)
+    )
+
+
+def _scaled_rule(rule, factor):
+    """The largest Lebedev rule no bigger than factor times the rule"""
+    smaller = [n for n in quadrature.lebedev_n_points if n <= factor * rule]
+    if len(smaller) == 0:
+        return min(quadrature.lebedev_n_points)
+    return max(smaller)
+
+
+def atomic_parameters(P, element, scaling='none', overrides=None):
+    """The atomic grid parameters for an element.
+
+    Returns a copy of the dictionary of parameter values P with the atomic
+    grid parameters adjusted for the element, by Bragg-Slater scaling if
+    scaling is 'Bragg-Slater', and then by any overrides for the element.
+    """
+    P = dict(P)
+    if scaling == 'Bragg-Slater':
+        if element not in bragg_slater_radii:
+            logger.warning(
+                'There is no Bragg-Slater radius for {}, so its atomic grid '
+                'is not scaled.'.format(element)
+            )
+        else:
+            ratio = bragg_slater_radii[element] / bragg_slater_radii[reference]
+            P['atomic grid region outer limit'] = [
+                ratio * float(r)
+                for r in as_list(P['atomic grid region outer limit'])
+            ]
+            factor = row_scale.get(row(element), row_scale[3])
+            P['atomic grid region n-points'] = [
+                max(1, int(math.ceil(factor * int(n))))
+                for n in as_list(P['atomic grid region n-points'])
+            ]
+            if row(element) == 1:
+                if P['atomic grid Lebedev rule'] != 'auto':
+                    P['atomic grid Lebedev rule'] = _scaled_rule(
+                        int(P['atomic grid Lebedev rule']), 0.75
+                    )
+                if P['atomic grid theta n-points'] != 'auto':
+                    P['atomic grid theta n-points'] = int(math.ceil(
+                        0.75 * int(P['atomic grid theta n-points'])
+                    ))
+
+    if overrides is not None and element in overrides:
+        for key, value in overrides[element].items():
+            name = 'atomic grid ' + key
+            if name not in P:
+                raise ValueError(
+                    "'{}' for {} is not an atomic grid parameter"
+                    .format(key, element)
+                )
+            P[name] = value
+    return P
+
+
+def templates(P, elements):
+    """The atomic grid parameters for each distinct element"""
+    scaling = P.get('atomic grid element scaling', 'none')
+    overrides = P.get('element grid settings', None)
+    result = {}
+    for element in elements:
+        if element not in result:
+            result[element] = atomic_parameters(
+                P, element, scaling, overrides
+            )
+    return result
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""Estimates of the cost of building the grids, before building them.
+
+The numbers of points are exact, following directly from the radial and
+angular quadratures. The memory is what the points and weights take as
+float64, and the time uses rough throughputs measured for the two engines,
+which can be overridden.
+"""
+
+import logging
+
+from amo_grid_step import grid, quadrature
+from amo_grid_step.elements import templates
+
+logger = logging.getLogger(__name__)
+
+# Bytes per point: x, y, z and the weight as float64
+bytes_per_point = 32
+
+# Rough throughputs in points per second, and the overhead of starting the
+# amo_grid program, in seconds.
+rates = {
+    'amo_grid executable': 2.0e+06,
+    'in-process NumPy': 2.0e+07,
+}
+startup = {
+    'amo_grid executable': 0.2,
+    'in-process NumPy': 0.0,
+}
+
+
+def angular_n_points(method, lebedev_rule=None, n_theta=None, n_phi=None):
+    """The number of points in an angular quadrature"""
+    if method == 'Lebedev':
+        rule = int(lebedev_rule)
+        if rule not in quadrature.lebedev_n_points:
+            raise ValueError('There is no Lebedev rule {}'.format(rule))
+        return quadrature.lebedev_n_points[rule]
+    return int(n_theta) * int(n_phi)
+
+
+def grid_n_points(P, prefix, element=None):
+    """The number of points in the central or an atomic grid.
+
+    prefix is 'central grid' or 'atomic grid', and any angular pruning is
+    included.
+    """
+    n = 0
+    for regions, settings in grid.shell_zones(P, prefix, element):
+        n += sum(len(r) for r, _ in regions) * angular_n_points(
+            settings['angular quadrature'],
+            lebedev_rule=settings['Lebedev rule'],
+            n_theta=settings['theta n-points'],
+            n_phi=settings['phi n-points']
+        )
+    return n
+
+
+def central_n_points(P):
+    """The number of points in the central grid"""
+    return grid_n_points(P, 'central grid')
+
+
+def atomic_n_points(P, element=None):
+    """The number of points in the grid on each atom, or one element"""
+    return grid_n_points(P, 'atomic grid', element)
+
+
+def estimate(P, n_atoms, engine=None, rate=None, elements=None):
+    """Estimate the points, memory and time to build the grids.
+
+    Returns a dictionary with the number of points in the central grid, in
+    the atomic grid for the parameters as given, in all the atomic grids and
+    in total, the memory in bytes for all the points and weights, and the
+    time in seconds. If the elements of the atoms are given, the atomic grids
+    are adjusted for each element.
+    """
+    P = grid.resolve_angular(P)
+    if engine is None:
+        engine = P['grid engine']
+    if rate is None:
+        rate = rates.get(engine, rates['amo_grid executable'])
+
+    n_central = central_n_points(P)
+    n_atomic = atomic_n_points(P)
+    if elements is None:
+        n_atomic_total = n_atoms * n_atomic
+    else:
+        counts = {
+            element: atomic_n_points(grid.resolve_angular(Pe), element)
+            for element, Pe in templates(P, elements).items()
+        }
+        n_atomic_total = sum(counts[element] for element in elements)
+    total = n_central + n_atomic_total
+    return {
+        'central points': n_central,
+        'atomic points': n_atomic,
+        'all atomic points': n_atomic_total,
+        'total points': total,
+        'memory': total * bytes_per_point,
+        'time': startup.get(engine, 0.0) + total / rate,
+    }
+
+
+def format_bytes(n):
+    """A readable size, e.g. '1.5 GB'"""
+    for unit in ('B', 'kB', 'MB', 'GB', 'TB'):
+        if n < 1024 or unit == 'TB':
+            break
+        n /= 1024
+    return '{:.3g} {}'.format(n, unit)
+
+
+def check_budget(cost, max_points=0, max_memory=0, max_time=0):
+    """Raise RuntimeError if the cost is over any of the limits.
+
+    The limits are in points, MB and seconds, with 0 meaning no limit.
+    """
+    problems = []
+    if max_points > 0 and cost['total points'] > max_points:
+        problems.append(
+            '{} points is more than the limit of {}'
+            .format(cost['total points'], max_points)
+        )
+    if max_memory > 0 and cost['memory'] > max_memory * 1024 * 1024:
+        problems.append(
+            '{} of memory is more than the limit of {} MB'
+            .format(format_bytes(cost['memory']), max_memory)
+        )
+    if max_time > 0 and cost['time'] > max_time:
+        problems.append(
+            '{:.3g} s is more than the limit of {} s'
+            .format(cost['time'], max_time)
+        )
+    if len(problems) > 0:
+        raise RuntimeError(
+            'The grids are over budget: ' + '; '.join(problems) + '.'
+        )
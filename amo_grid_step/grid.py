@@ -0,0 +1,655 @@
+# -*- coding: utf-8 -*-
+"""In-process NumPy engine for the AMO grids.
+
+This builds the same central and atom-centered grids that the amo_grid
+program describes in its input, but directly as arrays of points and weights
+so that no external process, file staging or parsing of output is needed.
+
+The grids are returned in a dictionary keyed by the names of the sections in
+the input for amo_grid, i.e. 'center', 'atom_1', 'atom_2', ... Each entry
+is a tuple (points, weights) with points an (n, 3) array.
+"""
+
+import logging
+import numpy as np
+
+from amo_grid_step import quadrature
+from amo_grid_step.elements import (
+    bragg_slater_radii, reference, row, templates
+)
+from amo_grid_step.elements import radial_scale as element_radial_scale
+from amo_grid_step.utils import as_list
+
+logger = logging.getLogger(__name__)
+
+# SG-1 [P. M. W. Gill, B. G. Johnson and J. A. Pople, Chem. Phys. Lett. 209,
+# 506 (1993)]: the outer edges of its first four regions in Bragg-Slater
+# radii for each row of the periodic table, and the degree of the Lebedev
+# rule in each of the five regions, 6, 38, 86, 194 and 86 points, as a
+# fraction of the largest, 23.
+sg1_radii = {
+    1: (0.25, 0.5, 1.0, 4.5),
+    2: (0.1667, 0.5, 0.9, 3.5),
+    3: (0.1, 0.4, 0.8, 2.5),
+}
+sg1_lmax = (3 / 23, 9 / 23, 15 / 23, 1.0, 15 / 23)
+
+
+def spherical_grid(center, r, wr, xyz, wa):
+    """The product of radial shells and an angular rule about a center.
+
+    The points are ordered shell by shell, with the angular points varying
+    fastest.
+    """
+    points = r[:, np.newaxis, np.newaxis] * xyz[np.newaxis, :, :]
+    points = points.reshape(-1, 3) + np.asarray(center, dtype=float)
+    weights = np.outer(wr * r * r, wa).ravel()
+    return points, weights
+
+
+def resolve_angular(P):
+    """Replace 'auto' angular quadrature sizes by the smallest exact ones.
+
+    Returns a copy of the dictionary of parameter values P in which any
+    Lebedev rule or theta or phi n-points given as 'auto' is the smallest
+    that integrates spherical harmonics exactly up to 2*lmax for the central
+    or atomic grid.
+    """
+    P = dict(P)
+    for grid in ('central grid', 'atomic grid'):
+        keys = [
+            grid + ' ' + key
+            for key in ('Lebedev rule', 'theta n-points', 'phi n-points')
+        ]
+        if not any(P.get(key) == 'auto' for key in keys):
+            continue
+        lmax = int(P[grid + ' lmax'])
+        n_theta, n_phi = quadrature.minimal_product(lmax)
+        values = (quadrature.minimal_lebedev_rule(lmax), n_theta, n_phi)
+        for key, value in zip(keys, values):
+            if P.get(key) == 'auto':
+                P[key] = value
+    return P
+
+
+def radial_scale(P, prefix, element=None):
+    """The length scale for a mapped radial quadrature, or None.
+
+    prefix is 'central grid' or 'atomic grid'. A radial scale of 'auto'
+    uses the usual value for the element. The mappings crowd the points
+    towards a nucleus, so they are only for the atomic grids.
+    """
+    method = P[prefix + ' radial quadrature']
+    if method not in quadrature.mapped_radial:
+        return None
+    if prefix == 'central grid':
+        raise ValueError(
+            "The '{}' radial quadrature is only for the atomic grids"
+            .format(method)
+        )
+    scale = P.get(prefix + ' radial scale', 'auto')
+    if scale == 'auto':
+        return element_radial_scale(method, element)
+    return float(scale)
+
+
+def radial_regions(P, prefix, element=None):
+    """The radial regions of the central or an atomic grid"""
+    return quadrature.radial_regions(
+        as_list(P[prefix + ' region n-points']),
+        as_list(P[prefix + ' region outer limit']),
+        P[prefix + ' radial quadrature'],
+        radial_scale(P, prefix, element)
+    )
+
+
+def central_rules(P):
+    """The radial regions and angular rule of the central grid"""
+    P = resolve_angular(P)
+    regions = radial_regions(P, 'central grid')
+    xyz, wa = quadrature.angular_quadrature(
+        P['central grid angular quadrature'],
+        lebedev_rule=P['central grid Lebedev rule'],
+        n_theta=P['central grid theta n-points'],
+        n_phi=P['central grid phi n-points']
+    )
+    return regions, xyz, wa
+
+
+def atomic_rules(P, element=None):
+    """The radial regions and angular rule of the grid on each atom"""
+    P = resolve_angular(P)
+    regions = radial_regions(P, 'atomic grid', element)
+    xyz, wa = quadrature.angular_quadrature(
+        P['atomic grid angular quadrature'],
+        lebedev_rule=P['atomic grid Lebedev rule'],
+        n_theta=P['atomic grid theta n-points'],
+        n_phi=P['atomic grid phi n-points']
+    )
+    return regions, xyz, wa
+
+
+def _concatenate(regions):
+    r = np.concatenate([r for r, _ in regions])
+    w = np.concatenate([w for _, w in regions])
+    return r, w
+
+
+def angular_zones(P, prefix, element=None):
+    """The radii and l-max of the angular pruning zones of a grid.
+
+    prefix is 'central grid' or 'atomic grid'. Returns (radii, lmax), where
+    shells inside radii[i] use an angular rule for lmax[i] and the shells
+    beyond the last radius the last lmax, or None if the grid is not pruned.
+    'SG-1' places the zones in units of the Bragg-Slater radius of the
+    element, at distances depending on its row of the periodic table, and
+    scales the l-max of the grid; 'table' takes the radii, as
+    fractions of the outer limit of the grid, and the l-max from the
+    parameters. No zone uses more than the l-max of the grid.
+    """
+    method = P.get(prefix + ' angular pruning', 'none')
+    if method == 'none':
+        return None
+    lmax = int(P[prefix + ' lmax'])
+    if method == 'SG-1':
+        if prefix != 'atomic grid':
+            raise ValueError('SG-1 pruning is only for the atomic grids')
+        if element not in bragg_slater_radii:
+            element = reference
+        R = bragg_slater_radii[element]
+        # SG-1 stops at argon, so heavier elements use its third row
+        radii = [R * x for x in sg1_radii.get(row(element), sg1_radii[3])]
+        lmaxes = [max(1, int(round(f * lmax))) for f in sg1_lmax]
+    elif method == 'table':
+        outer = max(
+            float(r) for r in as_list(P[prefix + ' region outer limit'])
+        )
+        radii = [
+            outer * float(x) for x in as_list(P[prefix + ' pruning radii'])
+        ]
+        lmaxes = [int(n) for n in as_list(P[prefix + ' pruning lmax'])]
+        if len(lmaxes) != len(radii) + 1:
+            raise ValueError(
+                'The angular pruning for the {} needs one more l-max than '
+                'radii, not {} and {}'.format(prefix, len(lmaxes), len(radii))
+            )
+        if any(b <= a for a, b in zip(radii, radii[1:])):
+            raise ValueError(
+                'The angular pruning radii for the {} must increase'
+                .format(prefix)
+            )
+    else:
+        raise ValueError("Unknown angular pruning '{}'".format(method))
+    return radii, [min(n, lmax) for n in lmaxes]
+
+
+def zone_angular(P, prefix, lmax=None):
+    """The angular quadrature settings for shells pruned to lmax.
+
+    Returns a dictionary of the angular quadrature, Lebedev rule and theta
+    and phi n-points, which are those of the grid if lmax is None or not
+    smaller than the l-max of the grid, and otherwise the smallest exact for
+    lmax but no larger than those of the grid.
+    """
+    settings = {
+        key: P[prefix + ' ' + key]
+        for key in (
+            'angular quadrature', 'Lebedev rule', 'theta n-points',
+            'phi n-points'
+        )
+    }
+    if lmax is None or lmax >= int(P[prefix + ' lmax']):
+        return settings
+    if settings['angular quadrature'] == 'Lebedev':
+        settings['Lebedev rule'] = min(
+            int(settings['Lebedev rule']),
+            quadrature.minimal_lebedev_rule(lmax)
+        )
+    else:
+        n_theta, n_phi = quadrature.minimal_product(lmax)
+        settings['theta n-points'] = min(
+            int(settings['theta n-points']), n_theta
+        )
+        settings['phi n-points'] = min(int(settings['phi n-points']), n_phi)
+    return settings
+
+
+def shell_zones(P, prefix, element=None):
+    """Split the radial shells of a grid by their angular rule.
+
+    Returns a list of (regions, settings) in order of increasing radius,
+    with regions the (r, wr) of the shells using the angular quadrature
+    settings from zone_angular(). Adjacent zones with the same rule are
+    merged, so without angular pruning there is a single entry.
+    """
+    P = resolve_angular(P)
+    regions = radial_regions(P, prefix, element)
+    zones = angular_zones(P, prefix, element)
+    if zones is None:
+        return [(regions, zone_angular(P, prefix))]
+
+    result = []
+    radii, lmaxes = zones
+    lower = 0.0
+    for upper, lmax in zip(radii + [np.inf], lmaxes):
+        shells = []
+        for r, wr in regions:
+            inside = (r >= lower) & (r < upper)
+            if np.any(inside):
+                shells.append((r[inside], wr[inside]))
+        lower = upper
+        if len(shells) == 0:
+            continue
+        settings = zone_angular(P, prefix, lmax)
+        if len(result) > 0 and result[-1][1] == settings:
+            result[-1][0].extend(shells)
+        else:
+            result.append((shells, settings))
+    return result
+
+
+def _pieces(zones):
+    """The (regions, xyz, wa) for each of the zones from shell_zones()"""
+    pieces = []
+    for regions, settings in zones:
+        xyz, wa = quadrature.angular_quadrature(
+            settings['angular quadrature'],
+            lebedev_rule=settings['Lebedev rule'],
+            n_theta=settings['theta n-points'],
+            n_phi=settings['phi n-points']
+        )
+        pieces.append((regions, xyz, wa))
+    return pieces
+
+
+def _product_grid(center, pieces):
+    """A ProductGrid, or a PrunedGrid if the angular rule varies"""
+    if len(pieces) == 1:
+        return ProductGrid(center, *pieces[0])
+    return PrunedGrid(
+        [ProductGrid(center, *piece) for piece in pieces]
+    )
+
+
+def central_grid(P):
+    """The central grid for the dictionary of parameter values P"""
+    return central_product_grid(P).explicit()
+
+
+def atomic_grid(P, center, element=None):
+    """The grid around one atom at center"""
+    return atomic_product_grid(P, center, element).explicit()
+
+
+def iter_spherical_grid(center, regions, xyz, wa, block_size=100000):
+    """Yield the points and weights of a spherical grid in blocks.
+
+    The blocks go region by region and shell by shell, in the same order as
+    spherical_grid(). Each holds whole shells, up to block_size points,
+    unless a single shell is larger than block_size, in which case the shell
+    is split. No block spans two regions, and the memory needed is bounded by
+    the block size rather than the size of the grid.
+    """
+    n_angular = len(wa)
+    if block_size >= n_angular:
+        n_shells = block_size // n_angular
+        for r, wr in regions:
+            for start in range(0, len(r), n_shells):
+                stop = min(start + n_shells, len(r))
+                yield spherical_grid(
+                    center, r[start:stop], wr[start:stop], xyz, wa
+                )
+    else:
+        for r, wr in regions:
+            for i in range(len(r)):
+                for start in range(0, n_angular, block_size):
+                    stop = min(start + block_size, n_angular)
+                    yield spherical_grid(
+                        center, r[i:i + 1], wr[i:i + 1],
+                        xyz[start:stop], wa[start:stop]
+                    )
+
+
+class ProductGrid(object):
+    """A spherical grid kept as its radial and angular rules.
+
+    Only the radial nodes and weights of each region, the angular nodes and
+    weights and the center are stored, so even a large grid takes little
+    memory. The points and weights are generated when asked for, in full or
+    in blocks, and integrals can use the product structure directly: for a
+    function of the distance from the center only the radial rule is
+    needed, and values on the grid are summed shell by shell without the
+    weights ever being formed.
+    """
+
+    def __init__(self, center, regions, xyz, wa):
+        self.center = np.asarray(center, dtype=float)
+        self.regions = regions
+        self.r, self.wr = _concatenate(regions)
+        self.xyz = xyz
+        self.wa = wa
+
+    def __len__(self):
+        return self.n_points
+
+    def __repr__(self):
+        return '{}({} shells x {} angular points about {})'.format(
+            self.__class__.__name__, self.n_radial, self.n_angular,
+            self.center.tolist()
+        )
+
+    @property
+    def n_radial(self):
+        """The number of radial shells"""
+        return len(self.r)
+
+    @property
+    def n_angular(self):
+        """The number of angular points in each shell"""
+        return len(self.wa)
+
+    @property
+    def n_points(self):
+        """The number of points in the grid"""
+        return self.n_radial * self.n_angular
+
+    @property
+    def nbytes(self):
+        """The memory used by the rules, in bytes"""
+        return (
+            self.r.nbytes + self.wr.nbytes + self.xyz.nbytes +
+            self.wa.nbytes + self.center.nbytes
+        )
+
+    @property
+    def shell_weights(self):
+        """The radial weights including the r**2 of the volume element"""
+        return self.wr * self.r * self.r
+
+    def points(self):
+        """The (n, 3) array of all the points"""
+        return self.explicit()[0]
+
+    def weights(self):
+        """The weights of all the points"""
+        return np.outer(self.shell_weights, self.wa).ravel()
+
+    def explicit(self):
+        """The points and weights, as spherical_grid() would give them"""
+        return spherical_grid(self.center, self.r, self.wr, self.xyz, self.wa)
+
+    def blocks(self, block_size=100000):
+        """Yield the points and weights in blocks; see iter_spherical_grid"""
+        return iter_spherical_grid(
+            self.center, self.regions, self.xyz, self.wa, block_size
+        )
+
+    def integrate(self, function, block_size=100000):
+        """The integral of a function of the points, block by block"""
+        return integrate(self.blocks(block_size), function)
+
+    def integrate_radial(self, function):
+        """The integral of a function of the distance from the center"""
+        return float(
+            np.dot(self.shell_weights, function(self.r)) * self.wa.sum()
+        )
+
+    def integrate_separable(self, radial, angular):
+        """The integral of radial(r) * angular(xyz) about the center.
+
+        radial is a function of the distance from the center and angular a
+        function of the (n, 3) unit vectors.
+        """
+        return float(
+            np.dot(self.shell_weights, radial(self.r)) *
+            np.dot(self.wa, angular(self.xyz))
+        )
+
+    def integrate_values(self, values):
+        """The integral of values given at every point, in grid order"""
+        values = np.asarray(values).reshape(self.n_radial, self.n_angular)
+        return float(np.dot(self.shell_weights, values.dot(self.wa)))
+
+
+class PrunedGrid(object):
+    """A spherical grid whose angular rule depends on the radius.
+
+    It is made of ProductGrids about the same center, one for each range of
+    shells with its own angular rule, in order of increasing radius, and
+    has the same methods as a ProductGrid apart from those needing a single
+    angular rule.
+    """
+
+    def __init__(self, pieces):
+        self.pieces = list(pieces)
+        self.center = self.pieces[0].center
+
+    def __len__(self):
+        return self.n_points
+
+    def __repr__(self):
+        return '{}({} shells x {} angular points about {})'.format(
+            self.__class__.__name__, self.n_radial,
+            '/'.join(str(piece.n_angular) for piece in self.pieces),
+            self.center.tolist()
+        )
+
+    @property
+    def n_radial(self):
+        """The number of radial shells"""
+        return sum(piece.n_radial for piece in self.pieces)
+
+    @property
+    def n_points(self):
+        """The number of points in the grid"""
+        return sum(piece.n_points for piece in self.pieces)
+
+    @property
+    def nbytes(self):
+        """The memory used by the rules, in bytes"""
+        return sum(piece.nbytes for piece in self.pieces)
+
+    def points(self):
+        """The (n, 3) array of all the points"""
+        return self.explicit()[0]
+
+    def weights(self):
+        """The weights of all the points"""
+        return np.concatenate([piece.weights() for piece in self.pieces])
+
+    def explicit(self):
+        """The points and weights, shell by shell"""
+        points, weights = zip(*(piece.explicit() for piece in self.pieces))
+        return np.concatenate(points), np.concatenate(weights)
+
+    def blocks(self, block_size=100000):
+        """Yield the points and weights in blocks; see iter_spherical_grid"""
+        for piece in self.pieces:
+            yield from piece.blocks(block_size)
+
+    def integrate(self, function, block_size=100000):
+        """The integral of a function of the points, block by block"""
+        return integrate(self.blocks(block_size), function)
+
+    def integrate_radial(self, function):
+        """The integral of a function of the distance from the center"""
+        return sum(piece.integrate_radial(function) for piece in self.pieces)
+
+    def integrate_separable(self, radial, angular):
+        """The integral of radial(r) * angular(xyz) about the center"""
+        return sum(
+            piece.integrate_separable(radial, angular)
+            for piece in self.pieces
+        )
+
+    def integrate_values(self, values):
+        """The integral of values given at every point, in grid order"""
+        values = np.asarray(values)
+        total = 0.0
+        start = 0
+        for piece in self.pieces:
+            stop = start + piece.n_points
+            total += piece.integrate_values(values[start:stop])
+            start = stop
+        return total
+
+
+def central_product_grid(P):
+    """The central grid as a ProductGrid, or PrunedGrid if it is pruned"""
+    return _product_grid(
+        (0.0, 0.0, 0.0), _pieces(shell_zones(P, 'central grid'))
+    )
+
+
+def atomic_product_grid(P, center, element=None):
+    """The grid on one atom as a ProductGrid or PrunedGrid"""
+    return _product_grid(
+        center, _pieces(shell_zones(P, 'atomic grid', element))
+    )
+
+
+def product_grids(P, coordinates, elements=None):
+    """The central and atomic grids as a dictionary of ProductGrids.
+
+    The grids for atoms of the same element share their rules, so the
+    memory needed grows only with the number of atoms and elements. Grids
+    with angular pruning are PrunedGrids.
+    """
+    grids = {'center': central_product_grid(P)}
+    pieces = _atomic_pieces_by_element(P, elements, len(coordinates))
+    for i, center in enumerate(centered_coordinates(coordinates), start=1):
+        grids['atom_{}'.format(i)] = _product_grid(center, pieces[i - 1])
+    return grids
+
+
+def iter_central_grid(P, block_size=100000):
+    """Yield the central grid in blocks of at most block_size points"""
+    return central_product_grid(P).blocks(block_size)
+
+
+def iter_grids(P, coordinates, block_size=100000, elements=None):
+    """Yield (name, center, blocks) for the central grid and each atom.
+
+    blocks is an iterator over the (points, weights) of the sub-grid in
+    blocks of at most block_size points, so that the grids can be written or
+    integrated without ever being held in memory in full. If the elements
+    are given, each element may have its own atomic grid; see the elements
+    module.
+    """
+    for name, product_grid in product_grids(P, coordinates, elements).items():
+        yield name, product_grid.center, product_grid.blocks(block_size)
+
+
+def _atomic_pieces_by_element(P, elements, n_atoms):
+    """The atomic quadratures for each atom, built once per element"""
+    if elements is None:
+        return [_pieces(shell_zones(P, 'atomic grid'))] * n_atoms
+    by_element = {
+        element: _pieces(shell_zones(Pe, 'atomic grid', element))
+        for element, Pe in templates(P, elements).items()
+    }
+    return [by_element[element] for element in elements]
+
+
+def centered_coordinates(coordinates):
+    """Shift the coordinates so that their centroid is at the origin"""
+    xyz = np.asarray(coordinates, dtype=float).reshape(-1, 3)
+    if len(xyz) == 0:
+        return xyz
+    return xyz - xyz.mean(axis=0)
+
+
+def build_grids(P, coordinates, elements=None):
+    """Build the central grid and the grid on each atom.
+
+    The coordinates are centered on the origin, as in the input for amo_grid.
+    If the elements are given, each element may have its own atomic grid.
+    """
+    grids = {'center': central_grid(P)}
+
+    # The atomic grids for an element differ only by their origin, so build
+    # one template for each element and shift it
+    if elements is None:
+        elements = ['*'] * len(coordinates)
+        template = {'*': atomic_grid(P, (0.0, 0.0, 0.0))}
+    else:
+        template = {
+            element: atomic_grid(Pe, (0.0, 0.0, 0.0), element)
+            for element, Pe in templates(P, elements).items()
+        }
+    for i, (element, xyz) in enumerate(
+        zip(elements, centered_coordinates(coordinates)), start=1
+    ):
+        points, weights = template[element]
+        grids['atom_{}'.format(i)] = (points + xyz, weights)
+    return grids
+
+
+def _sphere(r):
+    return np.where(r <= 1.0, 1.0, 0.0)
+
+
+def _yukawa(r):
+    return np.exp(-r) / r
+
+
+def _gaussian(r):
+    return np.exp(-r * r)
+
+
+# The test functions, centered at the origin, and their exact integrals
+tests = (
+    ('Sphere test', _sphere, 4 * np.pi / 3),
+    ('Yukawa test', _yukawa, 4 * np.pi),
+    ('Gaussian test', _gaussian, np.pi**1.5),
+)
+
+
+def integrate(blocks, function):
+    """Integrate a function of the points over the blocks of a grid"""
+    total = 0.0
+    for points, weights in blocks:
+        total += np.dot(weights, function(points))
+    return float(total)
+
+
+def integration_tests(points, weights):
+    """Percent errors integrating test functions centered at the origin.
+
+    The tests are the volume of the unit sphere, the Yukawa function
+    exp(-r)/r and the Gaussian exp(-r**2), which integrate to 4*pi/3, 4*pi
+    and pi**1.5 respectively.
+    """
+    return blocked_integration_tests([(points, weights)])
+
+
+def product_integration_tests(product_grid):
+    """The integration tests using the product structure of a grid.
+
+    The test functions depend only on the distance from the origin, so for
+    a grid centered there only the radial rule is needed.
+    """
+    if np.any(product_grid.center != 0.0):
+        raise ValueError(
+            'The factorized integration tests need a grid centered at the '
+            'origin'
+        )
+    results = {}
+    for name, function, exact in tests:
+        total = product_grid.integrate_radial(function)
+        results[name] = float(100 * (total - exact) / exact)
+    return results
+
+
+def blocked_integration_tests(blocks):
+    """The integration tests accumulated over blocks of a grid"""
+    totals = np.zeros(len(tests))
+    for points, weights in blocks:
+        r = np.sqrt(np.einsum('ij,ij->i', points, points))
+        for i, (_, function, _) in enumerate(tests):
+            totals[i] += np.dot(weights, function(r))
+
+    results = {}
+    for total, (name, _, exact) in zip(totals, tests):
+        results[name] = float(100 * (total - exact) / exact)
+    return results
@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""A compact binary file format for the grid points and weights.
+
+The file starts with a fixed preamble:
+
+    8 bytes   magic number, b'AMOGRID\\0'
+    uint32    version of the format
+    uint32    unused, zero
+    uint64    offset of the index
+    uint64    length of the index in bytes
+
+followed by the blocks of data, one per sub-grid, and finally the index.
+Each block is an (n, 4) array of little-endian float64 holding x, y, z and
+the weight of each point, starting on a 64-byte boundary. The index is JSON
+giving the name, offset, number of points and center of each block, in the
+order written, e.g. 'center', 'atom_1', 'atom_2', ...
+
+Putting the index at the end lets the blocks be written as they are
+generated, without knowing their sizes in advance. Reading uses memory
+mapping, so only the parts of a grid that are used are read from disk.
+"""
+
+import json
+import logging
+import struct
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'AMOGRID\0'
+VERSION = 1
+_preamble = struct.Struct('<8sIIQQ')
+_alignment = 64
+dtype = np.dtype('<f8')
+
+
+class GridWriter(object):
+    """Write sub-grids to a binary grid file, block by block"""
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.blocks = []
+        self._current = None
+        self._fd = open(filename, 'wb')
+        self._fd.write(_preamble.pack(MAGIC, VERSION, 0, 0, 0))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _align(self):
+        position = self._fd.tell()
+        padding = -position % _alignment
+        if padding > 0:
+            self._fd.write(b'\0' * padding)
+        return position + padding
+
+    def begin_block(self, name, center=(0.0, 0.0, 0.0)):
+        """Start a new sub-grid"""
+        if self._current is not None:
+            self.end_block()
+        self._current = {
+            'name': name,
+            'offset': self._align(),
+            'n_points': 0,
+            'center': [float(x) for x in center],
+        }
+
+    def write(self, points, weights):
+        """Append points and weights to the current sub-grid"""
+        if self._current is None:
+            raise RuntimeError('GridWriter.write(): no block has been begun')
+        data = np.empty((len(weights), 4), dtype=dtype)
+        data[:, 0:3] = points
+        data[:, 3] = weights
+        self._fd.write(data.tobytes())
+        self._current['n_points'] += len(weights)
+
+    def write_blocks(self, blocks):
+        """Write each (points, weights) block as it passes through.
+
+        This is a generator, so the blocks can be written and used for
+        something else, such as integrating, in a single pass.
+        """
+        for points, weights in blocks:
+            self.write(points, weights)
+            yield points, weights
+
+    def end_block(self):
+        """Finish the current sub-grid"""
+        if self._current is not None:
+            self.blocks.append(self._current)
+            self._current = None
+
+    def add_block(self, name, points, weights, center=(0.0, 0.0, 0.0)):
+        """Write a complete sub-grid"""
+        self.begin_block(name, center)
+        self.write(points, weights)
+        self.end_block()
+
+    def close(self):
+        """Write the index and close the file"""
+        if self._fd is None:
+            return
+        self.end_block()
+        index = json.dumps({
+            'dtype': dtype.str,
+            'columns': ['x', 'y', 'z', 'w'],
+            'blocks': self.blocks,
+        }).encode('utf-8')
+        offset = self._align()
+        self._fd.write(index)
+        self._fd.seek(0)
+        self._fd.write(_preamble.pack(MAGIC, VERSION, 0, offset, len(index)))
+        self._fd.close()
+        self._fd = None
+
+
+def write_grids(filename, grids, centers=None):
+    """Write a dictionary of name: (points, weights) to a grid file"""
+    with GridWriter(filename) as writer:
+        for name, (points, weights) in grids.items():
+            if centers is not None and name in centers:
+                center = centers[name]
+            else:
+                center = (0.0, 0.0, 0.0)
+            writer.add_block(name, points, weights, center)
+
+
+class GridFile(object):
+    """A binary grid file, memory-mapped block by block.
+
+    grid_file['atom_3'] is an (n, 4) read-only array of x, y, z and weight
+    that is only read from disk as it is used.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename, 'rb') as fd:
+            preamble = fd.read(_preamble.size)
+            if len(preamble) != _preamble.size:
+                raise ValueError(
+                    "'{}' is too short to be a grid file".format(filename)
+                )
+            magic, version, _, offset, length = _preamble.unpack(preamble)
+            if magic != MAGIC:
+                raise ValueError(
+                    "'{}' is not a grid file".format(filename)
+                )
+            if version > VERSION:
+                raise ValueError(
+                    "'{}' is version {} of the grid format, newer than this "
+                    "code can read".format(filename, version)
+                )
+            fd.seek(offset)
+            self.index = json.loads(fd.read(length).decode('utf-8'))
+        self.blocks = {block['name']: block for block in self.index['blocks']}
+        self._maps = {}
+
+    def __len__(self):
+        return len(self.blocks)
+
+    def __iter__(self):
+        return iter(self.blocks)
+
+    def __contains__(self, name):
+        return name in self.blocks
+
+    def keys(self):
+        return self.blocks.keys()
+
+    def __getitem__(self, name):
+        if name not in self._maps:
+            block = self.blocks[name]
+            if block['n_points'] == 0:
+                self._maps[name] = np.empty((0, 4), dtype=dtype)
+            else:
+                self._maps[name] = np.memmap(
+                    self.filename, dtype=self.index['dtype'], mode='r',
+                    offset=block['offset'], shape=(block['n_points'], 4)
+                )
+        return self._maps[name]
+
+    def points(self, name):
+        """The (n, 3) coordinates of the points of a sub-grid"""
+        return self[name][:, 0:3]
+
+    def weights(self, name):
+        """The weights of the points of a sub-grid"""
+        return self[name][:, 3]
+
+    def center(self, name):
+        """The center of a sub-grid"""
+        return self.blocks[name]['center']
+
+    def n_points(self, name=None):
+        """The number of points in a sub-grid, or in all of them"""
+        if name is None:
+            return sum(block['n_points'] for block in self.blocks.values())
+        return self.blocks[name]['n_points']
+
+    def __repr__(self):
+        return '{}({!r}, {} blocks, {} points)'.format(
+            self.__class__.__name__, self.filename, len(self), self.n_points()
+        )
+
+
+def load_grid(filename):
+    """Open a binary grid file, memory-mapping the points and weights"""
+    return GridFile(filename)
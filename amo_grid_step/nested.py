@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""Nested grids, each containing the points of the one before.
+
+Fejer's second rule, used directly or on the mapped variable of the
+Becke, Mura-Knowles and Treutler-Ahlrichs mappings, places the points of
+an n-point rule at cos(j pi / (n + 1)), so every other point of the rule
+with 2n + 1 points is a point of the rule with n. With Fejer's rule in
+cos(theta) and the trapezoidal rule in phi, whose points nest when their
+number doubles, the product grids nest as well. As with Gauss-Kronrod
+pairs, the values of a function on a grid then also give its integral over
+the coarser grid nested in it, and the difference between the two estimates
+the error; refining to the next grid only needs the function at the new
+points.
+"""
+
+import logging
+
+import numpy as np
+
+from amo_grid_step import grid, quadrature
+from amo_grid_step.utils import as_list
+
+logger = logging.getLogger(__name__)
+
+# The radial quadratures whose rules nest when n + 1 doubles
+nested_radial = ('Fejer', 'Becke', 'Mura-Knowles', 'Treutler-Ahlrichs')
+
+
+def refined(n, level=1):
+    """The number of points of the rule level steps finer than n points"""
+    return (int(n) + 1) * 2**level - 1
+
+
+def coarsened(n):
+    """The number of points of the rule nested in one with n points"""
+    n = int(n)
+    if n < 3 or n % 2 == 0:
+        raise ValueError(
+            'A rule with a nested rule needs an odd number of points, at '
+            'least 3, not {}'.format(n)
+        )
+    return (n - 1) // 2
+
+
+def embedded(n):
+    """Which of the n points of a rule are the points of the nested rule"""
+    return np.arange(n) % 2 == 1
+
+
+class NestedGrid(object):
+    """A family of product grids about a center, each nested in the next.
+
+    Level 0 has n_points[i] points in radial region i, n_theta points of
+    Fejer's rule in cos(theta) and n_phi trapezoidal points in phi. Each
+    level doubles n + 1 for the radial and theta rules and the number of
+    points in phi.
+    """
+
+    def __init__(self, center, limits, n_points, n_theta, n_phi,
+                 method='Fejer', scale=None):
+        if method not in nested_radial:
+            raise ValueError(
+                "The '{}' radial quadrature does not nest".format(method)
+            )
+        self.center = np.asarray(center, dtype=float)
+        self.limits = [float(r) for r in as_list(limits)]
+        self.n_points = [int(n) for n in as_list(n_points)]
+        self.n_theta = int(n_theta)
+        self.n_phi = int(n_phi)
+        self.method = method
+        self.scale = scale
+
+    def sizes(self, level):
+        """The radial, theta and phi sizes at a level"""
+        return (
+            [refined(n, level) for n in self.n_points],
+            refined(self.n_theta, level),
+            self.n_phi * 2**level
+        )
+
+    def grid(self, level):
+        """The grid.ProductGrid at a level"""
+        n_points, n_theta, n_phi = self.sizes(level)
+        regions = quadrature.radial_regions(
+            n_points, self.limits, self.method, self.scale
+        )
+        xyz, wa = quadrature.product_angular(n_theta, n_phi, 'Fejer')
+        return grid.ProductGrid(self.center, regions, xyz, wa)
+
+    def embedded(self, level):
+        """Which points of the grid at a level are those of the level before.
+
+        They are in the same order as in the coarser grid.
+        """
+        n_points, n_theta, n_phi = self.sizes(level)
+        radial = np.concatenate([embedded(n) for n in n_points])
+        angular = np.outer(embedded(n_theta), np.arange(n_phi) % 2 == 0)
+        return np.outer(radial, angular.ravel()).ravel()
+
+    def integral(self, function):
+        """A NestedIntegral of a function of the (n, 3) points"""
+        return NestedIntegral(self, function)
+
+    def integrate(self, function, level=1):
+        """The integral over the grid at a level and its estimated error"""
+        result = self.integral(function)
+        while result.level < level:
+            result.refine()
+        return result.value, result.error
+
+
+class NestedIntegral(object):
+    """The integral of a function over the grids of a NestedGrid.
+
+    The function is evaluated on the grid at level 0, and each refine()
+    moves to the next level, evaluating it only at the new points. value is
+    the integral over the finest grid so far and error its difference from
+    the integral over the grid before, or None at level 0.
+    """
+
+    def __init__(self, family, function):
+        self.family = family
+        self.function = function
+        self.level = 0
+        product = family.grid(0)
+        self.values = np.asarray(function(product.points()), dtype=float)
+        self.n_evaluations = len(self.values)
+        self.results = [product.integrate_values(self.values)]
+
+    @property
+    def value(self):
+        return self.results[-1]
+
+    @property
+    def error(self):
+        if len(self.results) < 2:
+            return None
+        return abs(self.results[-1] - self.results[-2])
+
+    def refine(self):
+        """Move to the next level, returning the value and error"""
+        level = self.level + 1
+        product = self.family.grid(level)
+        old = self.family.embedded(level)
+        new = ~old
+        values = np.empty(product.n_points)
+        values[old] = self.values
+        values[new] = self.function(product.points()[new])
+        self.n_evaluations += int(np.count_nonzero(new))
+        self.values = values
+        self.level = level
+        self.results.append(product.integrate_values(values))
+        return self.value, self.error
+
+
+def test_estimates(P, prefix='central grid'):
+    """Estimated percent errors of the integration tests.
+
+    The radial rule of the grid, which must nest, is compared with the rule
+    nested in it, reusing the values of the test functions at the points of
+    the grid. This estimates the error of the quadrature, not that from
+    cutting the integrals off at the outer limit. The keys are 'Sphere error
+    estimate', etc.
+    """
+    method = P[prefix + ' radial quadrature']
+    if method not in nested_radial:
+        raise ValueError(
+            "Errors can't be estimated with the '{}' radial quadrature; it "
+            'needs to be one of {}'.format(method, ', '.join(nested_radial))
+        )
+    n_points = as_list(P[prefix + ' region n-points'])
+    limits = as_list(P[prefix + ' region outer limit'])
+    fine = grid.radial_regions(P, prefix)
+    coarse = quadrature.radial_regions(
+        [coarsened(n) for n in n_points], limits, method,
+        grid.radial_scale(P, prefix)
+    )
+    r = np.concatenate([ri for ri, _ in fine])
+    w = np.concatenate([wi for _, wi in fine]) * r * r
+    old = np.concatenate([embedded(len(ri)) for ri, _ in fine])
+    wc = np.concatenate([wi for _, wi in coarse]) * r[old] * r[old]
+
+    results = {}
+    for name, function, _ in grid.tests:
+        f = function(r)
+        value = np.dot(w, f)
+        estimate = abs(value - np.dot(wc, f[old]))
+        key = name.replace(' test', ' error estimate')
+        results[key] = float(100 * estimate / abs(value))
+    return results
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+"""Reading the output of the amo_grid program"""
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def parse_output(lines):
+    """Extract the grid sizes and test errors from the lines of output.dat"""
+    data = {}
+    test = 0
+    tests = ('Sphere test', 'Yukawa test', 'Gaussian test')
+    for line in lines:
+        line = line.strip()
+        if 'center grid points:' in line:
+            data['Central grid size'] = int(line.split()[3])
+        if 'number of points per interval:' in line:
+            n_radial = int(line.split()[5])
+        if 'total angular numbers of points:' in line:
+            data['Atomic grid size'] = n_radial * int(line.split()[5])
+        if 'percent diff:' in line:
+            data[tests[test]] = float(line.split()[2])
+            test += 1
+    return data
@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""Fuzzy-cell partitioning of the overlapping grids.
+
+The central grid and the atomic grids overlap, so integrating over all of
+them counts the overlap more than once. Becke's partition of unity fixes
+this: each point of the grid about center A gets the extra weight
+
+    w_A(r) = P_A(r) / sum_B P_B(r),    P_B(r) = prod_{C != B} s(mu_BC(r))
+
+with mu_BC = (|r - B| - |r - C|) / |B - C| and s a smooth step, either
+Becke's iterated polynomial [A. D. Becke, J. Chem. Phys. 88, 2547 (1988)]
+or the sharper one of Stratmann, Scuseria and Frisch [Chem. Phys. Lett.
+257, 213 (1996)]. A center only takes part where its grid reaches, so far
+from the molecule the central grid has all the weight. mu_BC is undefined
+for centers at the same place, such as an atom at the center of the
+molecule, so of two such centers the later one, the atom's grid rather than
+the central grid, takes all of the weight where both reach.
+
+Only centers near a point matter, so they are found with a cell list: the
+atoms are binned into cubic cells at least as large as the reach of their
+grids, and a point only looks at the atoms in its own and the neighboring
+cells. Points are processed a cell at a time with NumPy, so the cost grows
+roughly linearly with the number of atoms.
+"""
+
+import logging
+
+import numpy as np
+
+from amo_grid_step import grid
+from amo_grid_step.elements import templates
+from amo_grid_step.utils import as_list
+
+logger = logging.getLogger(__name__)
+
+# The parameter of the Stratmann step function
+stratmann_a = 0.64
+
+# Centers closer than this are treated as being at the same place
+coincident_tolerance = 1.0e-8
+
+
+def becke_step(mu):
+    """Becke's step function s(mu), from 1 at mu = -1 to 0 at mu = 1"""
+    p = mu
+    for _ in range(3):
+        p = 1.5 * p - 0.5 * p**3
+    return 0.5 * (1 - p)
+
+
+def stratmann_step(mu, a=stratmann_a):
+    """The Stratmann-Scuseria-Frisch step, exactly 1 or 0 for |mu| >= a"""
+    x = np.clip(mu / a, -1.0, 1.0)
+    x2 = x * x
+    z = x * (35 + x2 * (-35 + x2 * (21 - 5 * x2))) / 16
+    return 0.5 * (1 - z)
+
+
+steps = {
+    'Becke': becke_step,
+    'Stratmann': stratmann_step,
+}
+
+
+class Partition(object):
+    """Partition weights for grids about a set of centers"""
+
+    def __init__(self, centers, reach, method='Becke', cell_size=None,
+                 chunk_size=4000000):
+        """Set up the cell list for the centers.
+
+        Keyword arguments:
+            centers: the (m, 3) coordinates of the centers.
+            reach: the outer radius of the grid about each center.
+            method: 'Becke' or 'Stratmann'.
+            cell_size: the edge of the cells, by default the largest reach.
+                Centers reaching further than this, typically just the
+                central grid, are considered for every point.
+            chunk_size: roughly the most numbers in the arrays of step
+                function values, which bounds the memory used.
+        """
+        if method not in steps:
+            raise ValueError(
+                "Unknown partitioning method '{}'".format(method)
+            )
+        self.centers = np.asarray(centers, dtype=float).reshape(-1, 3)
+        self.reach = np.asarray(reach, dtype=float)
+        self.method = method
+        self.step = steps[method]
+        if cell_size is None:
+            cell_size = self.reach.max()
+        self.cell_size = float(cell_size)
+        self.chunk_size = chunk_size
+        self.pruned = {}
+
+        # Centers that reach beyond the neighboring cells are always used
+        large = self.reach > self.cell_size
+        self.always = np.flatnonzero(large)
+        binned = np.flatnonzero(~large)
+
+        self.origin = self.centers.min(axis=0)
+        self.cells = {}
+        keys = self._cell_keys(self.centers[binned])
+        for key, i in zip(map(tuple, keys), binned):
+            self.cells.setdefault(key, []).append(i)
+
+    def _cell_keys(self, xyz):
+        return np.floor((xyz - self.origin) / self.cell_size).astype(np.int64)
+
+    def neighbors(self, key):
+        """The centers that may reach points in the cell key"""
+        found = [self.always]
+        x, y, z = key
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for dz in (-1, 0, 1):
+                    cell = self.cells.get((x + dx, y + dy, z + dz))
+                    if cell is not None:
+                        found.append(cell)
+        return np.unique(np.concatenate(found).astype(np.int64))
+
+    def _weights(self, points, owner, candidates):
+        """The partition weights of the points among the candidates"""
+        xyz = self.centers[candidates]
+        d = np.linalg.norm(
+            points[:, np.newaxis, :] - xyz[np.newaxis, :, :], axis=2
+        )
+        # Only the centers whose grids reach a point share it
+        inside = d <= self.reach[candidates]
+        used = np.flatnonzero(inside.any(axis=0) | (candidates == owner))
+        xyz = xyz[used]
+        d = d[:, used]
+        inside = inside[:, used]
+        index = candidates[used]
+        i = np.flatnonzero(index == owner)[0]
+
+        R = np.linalg.norm(
+            xyz[:, np.newaxis, :] - xyz[np.newaxis, :, :], axis=2
+        )
+        np.fill_diagonal(R, 1.0)
+        # Of two coincident centers the later one has the whole cell
+        coincident = np.nonzero(R < coincident_tolerance)
+        later = index[coincident[1]] > index[coincident[0]]
+        R[coincident] = 1.0
+        k = len(used)
+        result = np.empty(len(points))
+        n = max(1, self.chunk_size // (k * k))
+        for start in range(0, len(points), n):
+            stop = min(start + n, len(points))
+            dc = d[start:stop]
+            mu = (dc[:, :, np.newaxis] - dc[:, np.newaxis, :]) / R
+            s = self.step(mu)
+            s[:, np.arange(k), np.arange(k)] = 1.0
+            s[:, coincident[0], coincident[1]] = np.where(later, 0.0, 1.0)
+            # Centers that don't reach the point don't cut the others' cells
+            s = np.where(inside[start:stop, np.newaxis, :], s, 1.0)
+            P = s.prod(axis=2) * inside[start:stop]
+            total = P.sum(axis=1)
+            result[start:stop] = np.divide(
+                P[:, i], total, out=np.zeros(stop - start),
+                where=total > 0
+            )
+        return result
+
+    def weights(self, points, owner):
+        """The partition weights for points of the grid about center owner"""
+        points = np.asarray(points, dtype=float).reshape(-1, 3)
+        result = np.empty(len(points))
+        keys = self._cell_keys(points)
+        unique, inverse = np.unique(keys, axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+        order = np.argsort(inverse, kind='stable')
+        bounds = np.searchsorted(inverse[order], np.arange(len(unique) + 1))
+        for c, key in enumerate(unique):
+            index = order[bounds[c]:bounds[c + 1]]
+            candidates = self.neighbors(tuple(key))
+            if owner not in candidates:
+                candidates = np.union1d(candidates, [owner])
+            result[index] = self._weights(points[index], owner, candidates)
+        return result
+
+    def weighted_blocks(self, blocks, owner, threshold=0.0):
+        """Multiply the weights of each (points, weights) block.
+
+        Points whose partition weight is below threshold contribute next to
+        nothing, so they are dropped and counted in self.pruned[owner].
+        """
+        for points, weights in blocks:
+            w = self.weights(points, owner)
+            if threshold > 0.0:
+                keep = w >= threshold
+                n = len(w) - np.count_nonzero(keep)
+                if n > 0:
+                    self.pruned[owner] = self.pruned.get(owner, 0) + n
+                    points, weights, w = points[keep], weights[keep], w[keep]
+            yield points, weights * w
+
+
+def for_grids(P, coordinates, method='Becke', elements=None):
+    """The Partition for the central grid and the atomic grids.
+
+    Center 0 is the central grid at the origin and center i atom i, with
+    the coordinates centered as for the grids.
+    """
+    xyz = grid.centered_coordinates(coordinates)
+    if elements is None:
+        Ps = {'*': P}
+        elements = ['*'] * len(xyz)
+    else:
+        Ps = templates(P, elements)
+    outer = {
+        element: float(max(as_list(Pe['atomic grid region outer limit'])))
+        for element, Pe in Ps.items()
+    }
+    reach = [float(max(as_list(P['central grid region outer limit'])))]
+    reach += [outer[element] for element in elements]
+    centers = np.concatenate([np.zeros((1, 3)), xyz])
+    return Partition(
+        centers, reach, method=method,
+        cell_size=max(outer.values(), default=None)
+    )
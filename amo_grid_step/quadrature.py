@@ -0,0 +1,386 @@
+# -*- coding: utf-8 -*-
+"""One-dimensional and angular quadratures for the in-process grid engine.
+
+The radial quadratures work on a series of regions, [0, r1], [r1, r2], ...
+exactly like the 'r_intervals' and 'r_num_shell_pts' of the input for the
+amo_grid program. Besides Gauss-Legendre and Gauss-Radau points in each
+region, the mapped quadratures of Becke, Mura and Knowles, and Treutler and
+Ahlrichs crowd the points of the innermost region towards the nucleus,
+where functions about an atom vary fastest. Those mappings are for
+[0, infinity), so here only the part of the mapped variable that falls
+inside the region is used. The angular quadratures return unit vectors and
+weights that sum to 4*pi.
+"""
+
+import functools
+import logging
+import os
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# The number of points in each Lebedev rule. Rule n integrates spherical
+# harmonics exactly up to degree 2n + 1.
+lebedev_n_points = {
+    1: 6, 2: 14, 3: 26, 4: 38, 5: 50, 6: 74, 7: 86, 8: 110, 9: 146,
+    10: 170, 11: 194, 12: 230, 13: 266, 14: 302, 15: 350, 17: 434,
+    20: 590, 23: 770, 26: 974, 29: 1202, 32: 1454, 35: 1730, 38: 2030,
+    41: 2354, 44: 2702, 47: 3074, 50: 3470, 53: 3890, 56: 4334, 59: 4802,
+    62: 5294, 65: 5810,
+}
+
+# The Lebedev rules are shipped as a table of the generators of their
+# octahedral orbits, records of (rule, x, y, z, weight) ordered by rule with
+# the weights normalized to 1 over the sphere. tools/make_lebedev_table.py
+# writes it.
+lebedev_table_path = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'data', 'lebedev.npy'
+)
+lebedev_dtype = np.dtype([
+    ('rule', '<i4'), ('x', '<f8'), ('y', '<f8'), ('z', '<f8'),
+    ('weight', '<f8'),
+])
+
+
+def _gauss_legendre(n):
+    return np.polynomial.legendre.leggauss(n)
+
+
+def _gauss_radau(n):
+    if n == 1:
+        return np.array([1.0]), np.array([2.0])
+
+    # The Radau points with x = -1 fixed are -1 plus the roots of
+    # (P_{n-1} + P_n) / (1 + x). Find them and reflect.
+    c = np.zeros(n + 1)
+    c[n - 1] = 1.0
+    c[n] = 1.0
+    x = np.sort(np.polynomial.legendre.legroots(c).real)
+    x[0] = -1.0
+    p = np.zeros(n)
+    p[n - 1] = 1.0
+    pn1 = np.polynomial.legendre.legval(x, p)
+    w = (1 - x) / (n * n * pn1 * pn1)
+    w[0] = 2.0 / (n * n)
+    return -x[::-1], w[::-1]
+
+
+def _trapezoidal(n):
+    phi = 2 * np.pi * np.arange(n) / n
+    w = np.full(n, 2 * np.pi / n)
+    return phi, w
+
+
+def _gauss_chebyshev(n):
+    t = np.pi * np.arange(n, 0, -1) / (n + 1)
+    return np.cos(t), np.pi / (n + 1) * np.sin(t)
+
+
+def _fejer(n):
+    t = np.pi * np.arange(n, 0, -1) / (n + 1)
+    k = 2 * np.arange(1, (n + 1) // 2 + 1) - 1
+    s = (np.sin(np.outer(t, k)) / k).sum(axis=1)
+    return np.cos(t), 4 / (n + 1) * np.sin(t) * s
+
+
+one_dimensional_rules = {
+    'Legendre': _gauss_legendre,
+    'Radau': _gauss_radau,
+    'trapezoidal': _trapezoidal,
+    'Chebyshev': _gauss_chebyshev,
+    'Fejer': _fejer,
+}
+
+
+@functools.lru_cache(maxsize=256)
+def one_dimensional(rule, n):
+    """The nodes and weights of a one-dimensional rule with n points.
+
+    The same few sizes are needed for every region, atom and theta grid, so
+    the rules are kept in a bounded cache shared by the whole process. The
+    arrays are read-only; one_dimensional.cache_info() gives the hits and
+    misses.
+    """
+    if rule not in one_dimensional_rules:
+        raise ValueError(
+            "Unknown one-dimensional quadrature '{}'".format(rule)
+        )
+    x, w = one_dimensional_rules[rule](n)
+    x = np.array(x, dtype=float)
+    w = np.array(w, dtype=float)
+    x.flags.writeable = False
+    w.flags.writeable = False
+    return x, w
+
+
+def gauss_legendre(n):
+    """Gauss-Legendre nodes and weights on [-1, 1]"""
+    return one_dimensional('Legendre', int(n))
+
+
+def gauss_radau(n):
+    """Gauss-Radau nodes and weights on [-1, 1] including the point x = 1"""
+    return one_dimensional('Radau', int(n))
+
+
+def trapezoidal(n):
+    """Trapezoidal rule for the periodic interval [0, 2*pi)"""
+    return one_dimensional('trapezoidal', int(n))
+
+
+def gauss_chebyshev(n):
+    """Gauss-Chebyshev points of the second kind on [-1, 1], weights for dx"""
+    return one_dimensional('Chebyshev', int(n))
+
+
+def fejer(n):
+    """Fejer's second rule on [-1, 1], weights for dx.
+
+    The points are those of gauss_chebyshev(), and every other point of the
+    rule with 2n + 1 points is a point of the rule with n, so the rules
+    nest.
+    """
+    return one_dimensional('Fejer', int(n))
+
+
+def _fejer_between(n, a, b):
+    """Fejer's second rule on [a, b], weights for dx"""
+    x, wx = fejer(n)
+    half = 0.5 * (b - a)
+    return a + half * (x + 1), half * wx
+
+
+def becke_radial(n, R, alpha):
+    """Becke's mapping r = alpha (1 + x) / (1 - x), for r up to R.
+
+    [A. D. Becke, J. Chem. Phys. 88, 2547 (1988)] Fejer's rule is used on
+    the part of x in [-1, 1) that maps to [0, R], so dr/dx is that of the
+    published mapping and stays finite at R.
+    """
+    x, wx = _fejer_between(n, -1.0, (R - alpha) / (R + alpha))
+    r = alpha * (1 + x) / (1 - x)
+    dr = 2 * alpha / (1 - x)**2
+    return r, wx * dr
+
+
+def mura_knowles_radial(n, R, alpha):
+    """The Mura-Knowles mapping r = -alpha ln(1 - q**3), for r up to R.
+
+    [M. E. Mura and P. J. Knowles, J. Chem. Phys. 104, 9848 (1996)] Fejer's
+    rule is used on the part of q in [0, 1) that maps to [0, R], rather than
+    equally spaced points over all of it.
+    """
+    q, wq = _fejer_between(n, 0.0, np.cbrt(-np.expm1(-R / alpha)))
+    r = -alpha * np.log1p(-q**3)
+    dr = 3 * alpha * q * q / (1 - q**3)
+    return r, wq * dr
+
+
+def _treutler_ahlrichs(x, alpha):
+    """r and dr/dx of the Treutler-Ahlrichs M4 mapping"""
+    log = np.log(2 / (1 - x))
+    r = alpha / np.log(2) * (1 + x)**0.6 * log
+    dr = alpha / np.log(2) * (
+        0.6 * (1 + x)**-0.4 * log + (1 + x)**0.6 / (1 - x)
+    )
+    return r, dr
+
+
+def treutler_ahlrichs_radial(n, R, alpha):
+    """The Treutler-Ahlrichs M4 mapping, for r up to R.
+
+    [O. Treutler and R. Ahlrichs, J. Chem. Phys. 102, 346 (1995)]
+    r = alpha / ln 2 (1 + x)**0.6 ln(2 / (1 - x)), with Fejer's rule on the
+    part of x in [-1, 1) that maps to [0, R], found by bisection.
+    """
+    lower, upper = -1.0, 1.0
+    for _ in range(64):
+        middle = 0.5 * (lower + upper)
+        if _treutler_ahlrichs(middle, alpha)[0] < R:
+            lower = middle
+        else:
+            upper = middle
+    x, wx = _fejer_between(n, -1.0, lower)
+    r, dr = _treutler_ahlrichs(x, alpha)
+    return r, wx * dr
+
+
+# The mapped radial quadratures, which need a length scale
+mapped_radial = {
+    'Becke': becke_radial,
+    'Mura-Knowles': mura_knowles_radial,
+    'Treutler-Ahlrichs': treutler_ahlrichs_radial,
+}
+
+
+def radial_regions(n_points, limits, method='Legendre', scale=None):
+    """Nodes and weights for each region of a radial quadrature.
+
+    The regions are [0, limits[0]], [limits[0], limits[1]], ... with
+    n_points[i] points in region i. 'Legendre' places Gauss-Legendre points
+    in each region, while 'Gauss' uses Gauss-Radau points that include the
+    outer edge of each region and 'Fejer' Fejer's second rule, which nests
+    when n + 1 doubles. 'Becke', 'Mura-Knowles' and
+    'Treutler-Ahlrichs' crowd the points of the innermost region towards
+    the nucleus with the length scale given, and use Fejer's rule in the
+    other regions, so these rules nest too. The weights are for dr; the
+    r**2 of the volume element is not included. Returns a list of (r, w),
+    one per region.
+    """
+    if len(n_points) != len(limits):
+        raise ValueError(
+            'The radial grid has {} regions but {} outer limits'
+            .format(len(n_points), len(limits))
+        )
+    if method in mapped_radial:
+        if scale is None:
+            raise ValueError(
+                "The '{}' radial quadrature needs a length scale"
+                .format(method)
+            )
+        mapping = mapped_radial[method]
+        regions = []
+        r0 = 0.0
+        for n, r1 in zip(n_points, limits):
+            if not regions:
+                regions.append(mapping(int(n), float(r1), float(scale)))
+            else:
+                regions.append(_fejer_between(int(n), r0, float(r1)))
+            r0 = float(r1)
+        return regions
+    elif method == 'Legendre':
+        rule = gauss_legendre
+    elif method == 'Gauss':
+        rule = gauss_radau
+    elif method == 'Fejer':
+        rule = fejer
+    else:
+        raise ValueError(
+            "Unknown radial quadrature '{}'".format(method)
+        )
+
+    regions = []
+    r0 = 0.0
+    for n, r1 in zip(n_points, limits):
+        x, wx = rule(int(n))
+        half = 0.5 * (float(r1) - r0)
+        regions.append((r0 + half * (x + 1), half * wx))
+        r0 = float(r1)
+    return regions
+
+
+def radial_quadrature(n_points, limits, method='Legendre', scale=None):
+    """Nodes and weights for a multi-region radial quadrature.
+
+    See radial_regions() for the details.
+    """
+    regions = radial_regions(n_points, limits, method, scale)
+    r = np.concatenate([r for r, _ in regions])
+    w = np.concatenate([w for _, w in regions])
+    return r, w
+
+
+def product_angular(n_theta, n_phi, theta='Legendre'):
+    """Gauss-Legendre in cos(theta) times trapezoidal in phi.
+
+    theta may also be 'Fejer' for Fejer's second rule in cos(theta). Returns
+    the unit vectors, with phi varying fastest, and the weights.
+    """
+    ct, wt = one_dimensional(theta, int(n_theta))
+    phi, wp = trapezoidal(int(n_phi))
+    st = np.sqrt(1 - ct * ct)
+    xyz = np.empty((len(ct), len(phi), 3))
+    xyz[:, :, 0] = np.outer(st, np.cos(phi))
+    xyz[:, :, 1] = np.outer(st, np.sin(phi))
+    xyz[:, :, 2] = ct[:, np.newaxis]
+    return xyz.reshape(-1, 3), np.outer(wt, wp).ravel()
+
+
+@functools.lru_cache(maxsize=1)
+def lebedev_table():
+    """The table of Lebedev orbit generators, memory-mapped read-only"""
+    return np.load(lebedev_table_path, mmap_mode='r')
+
+
+def _expand_orbits(x, y, z):
+    """The points of the octahedral orbits of the generators, in order"""
+    generators = np.stack([x, y, z], axis=1)
+    perms = generators[:, np.array([
+        (0, 1, 2), (0, 2, 1), (1, 0, 2), (1, 2, 0), (2, 0, 1), (2, 1, 0)
+    ])]
+    signs = np.array(
+        [(i, j, k) for i in (1, -1) for j in (1, -1) for k in (1, -1)],
+        dtype=float
+    )
+    points = perms[:, :, np.newaxis, :] * signs[np.newaxis, np.newaxis, :, :]
+    points = points.reshape(-1, 3)
+    orbit = np.repeat(np.arange(len(generators)), 48)
+    keys = np.column_stack([orbit, np.round(points, 12) + 0.0])
+    _, index = np.unique(keys, axis=0, return_index=True)
+    index = np.sort(index)
+    return points[index], orbit[index]
+
+
+@functools.lru_cache(maxsize=None)
+def lebedev(rule):
+    """The unit vectors and weights for the given Lebedev rule.
+
+    The rules are expanded from the table of generators the first time they
+    are asked for and kept, so the arrays returned are shared and read-only.
+    """
+    table = lebedev_table()
+    rule = int(rule)
+    start, stop = np.searchsorted(table['rule'], [rule, rule + 1])
+    if start == stop:
+        raise ValueError(
+            'Lebedev rule {} is not available in the in-process grid '
+            'engine'.format(rule)
+        )
+    generators = table[start:stop]
+    points, orbit = _expand_orbits(
+        generators['x'], generators['y'], generators['z']
+    )
+    weights = 4 * np.pi * generators['weight'][orbit]
+    points.flags.writeable = False
+    weights.flags.writeable = False
+    return points, weights
+
+
+def minimal_lebedev_rule(lmax):
+    """The smallest Lebedev rule exact for products of harmonics up to lmax.
+
+    The product of two spherical harmonics of degree up to lmax has degree up
+    to 2*lmax, and rule n is exact to degree 2n + 1.
+    """
+    for rule in sorted(lebedev_n_points):
+        if 2 * rule + 1 >= 2 * lmax:
+            return rule
+    raise ValueError(
+        'There is no Lebedev rule accurate enough for lmax = {}'.format(lmax)
+    )
+
+
+def minimal_product(lmax):
+    """The smallest theta and phi sizes exact up to 2*lmax.
+
+    n Gauss-Legendre points in cos(theta) are exact to degree 2n - 1, and n
+    trapezoidal points in phi are exact for exp(i*m*phi) with |m| < n.
+    """
+    return lmax + 1, 2 * lmax + 1
+
+
+def angular_quadrature(method, lebedev_rule=None, n_theta=None, n_phi=None):
+    """The angular quadrature for 'Lebedev', 'Gauss' or 'mixed'.
+
+    'mixed' means the Gauss-Legendre x trapezoidal product, which is what the
+    input to amo_grid describes for anything other than Lebedev.
+    """
+    if method == 'Lebedev':
+        return lebedev(int(lebedev_rule))
+    elif method in ('Gauss', 'mixed'):
+        return product_angular(n_theta, n_phi)
+    else:
+        raise ValueError(
+            "Unknown angular quadrature '{}'".format(method)
+        )
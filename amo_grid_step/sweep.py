@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""Parameter sweeps for the AMO Grid step.
+
+A sweep is given as a dictionary of parameter names and lists of values,
+or in the step as text like
+
+    central grid lmax = range(20, 61, 10); central grid Lebedev rule = 17, 23
+
+Every combination of the values is run, each in its own subdirectory, using
+a pool of processes.
+"""
+
+import ast
+import concurrent.futures
+import csv
+import itertools
+import json
+import logging
+import os.path
+import re
+
+from amo_grid_step import async_exec
+from amo_grid_step.amo_grid_parameters import AMOGridParameters
+from amo_grid_step.output import parse_output
+
+logger = logging.getLogger(__name__)
+
+columns = (
+    'Central grid size', 'Atomic grid size',
+    'Sphere test', 'Yukawa test', 'Gaussian test'
+)
+
+
+def parse_values(text):
+    """The list of values from text like '1, 2, 3' or 'range(1, 4)'.
+
+    Each value is a Python literal such as 17 or [100, 50], or otherwise
+    taken as a string, so the choices of an enumeration can be given
+    unquoted, as in 'Legendre, Gauss'.
+    """
+    text = text.strip()
+    match = re.fullmatch(r'range\((.*)\)', text)
+    if match is not None:
+        args = [int(x) for x in match.group(1).split(',')]
+        return list(range(*args))
+
+    values = [_parse_value(item) for item in _split(text)]
+    if len(values) == 1 and isinstance(values[0], tuple):
+        return list(values[0])
+    return values
+
+
+def _split(text):
+    """Split text at the commas that are not in brackets or quotes"""
+    items = []
+    depth = 0
+    quote = None
+    start = 0
+    for i, c in enumerate(text):
+        if quote is not None:
+            if c == quote:
+                quote = None
+        elif c in '\'"':
+            quote = c
+        elif c in '([{':
+            depth += 1
+        elif c in ')]}':
+            depth -= 1
+        elif c == ',' and depth == 0:
+            items.append(text[start:i])
+            start = i + 1
+    items.append(text[start:])
+    return [item.strip() for item in items if item.strip() != '']
+
+
+def _parse_value(text):
+    try:
+        return ast.literal_eval(text)
+    except (ValueError, SyntaxError):
+        return text
+
+
+def parse_sweep(text):
+    """The dictionary of parameters and values from the text of a sweep"""
+    result = {}
+    for item in text.split(';'):
+        if item.strip() == '':
+            continue
+        if '=' not in item:
+            raise ValueError(
+                "The sweep '{}' should look like 'parameter = values'"
+                .format(item.strip())
+            )
+        key, values = item.split('=', 1)
+        key = key.strip()
+        if key not in AMOGridParameters.parameters:
+            raise ValueError(
+                "'{}' is not a parameter of the AMO Grid step".format(key)
+            )
+        result[key] = parse_values(values)
+    return result
+
+
+def combinations(values):
+    """All combinations of the values, as a list of dictionaries"""
+    keys = list(values)
+    return [
+        dict(zip(keys, combination))
+        for combination in itertools.product(*[values[k] for k in keys])
+    ]
+
+
+def run_executable(directory):
+    """Run amo_grid on the input.in in directory, returning the results"""
+    result = async_exec.run(
+        ['amo_grid', 'input.in'], directory, return_files=['output.dat']
+    )
+
+    if result['stderr'] != '':
+        with open(os.path.join(directory, 'stderr.txt'), mode='w') as fd:
+            fd.write(result['stderr'])
+
+    for filename in result['files']:
+        with open(os.path.join(directory, filename), mode='w') as fd:
+            if result[filename]['data'] is not None:
+                fd.write(result[filename]['data'])
+            else:
+                fd.write(result[filename]['exception'])
+
+    with open(os.path.join(directory, 'output.dat'), mode='r') as fd:
+        return parse_output(fd.read().splitlines())
+
+
+def run_in_process(directory, P, coordinates, elements=None):
+    """Build the grids with the NumPy engine, returning the results.
+
+    The work is done by a step in the directory, exactly as in a run of the
+    step, so the symmetry, partition weights and pruning are all used.
+    """
+    from amo_grid_step.amo_grid import AMOGrid
+
+    node = AMOGrid()
+    node.directory = directory
+    results = node.build_in_process(P, coordinates, elements)
+
+    with open(os.path.join(directory, 'results.json'), mode='w') as fd:
+        json.dump(results, fd, indent=4)
+    return results
+
+
+def run_jobs(jobs, max_workers=None):
+    """Run the jobs, a list of (function, args), in a process pool.
+
+    The results are returned in the same order as the jobs. A job that fails
+    gives an empty dictionary, and the error is logged.
+    """
+    with concurrent.futures.ProcessPoolExecutor(max_workers) as pool:
+        futures = [pool.submit(function, *args) for function, args in jobs]
+        results = []
+        for future, (function, args) in zip(futures, jobs):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                logger.warning(
+                    'Sweep job in {} failed: {}'.format(args[0], e)
+                )
+                results.append({})
+    return results
+
+
+def format_table(keys, rows):
+    """A text table of the swept values and results"""
+    header = list(keys) + list(columns)
+    table = [header]
+    for combination, results in rows:
+        line = [str(combination[key]) for key in keys]
+        for column in columns:
+            value = results.get(column, '')
+            if isinstance(value, float):
+                value = '{:.6g}'.format(value)
+            line.append(str(value))
+        table.append(line)
+
+    widths = [max(len(line[i]) for line in table) for i in range(len(header))]
+    lines = []
+    for line in table:
+        lines.append('  '.join(
+            '{:>{}s}'.format(text, width) for text, width in zip(line, widths)
+        ))
+    lines.insert(1, '  '.join('-' * width for width in widths))
+    return '\n'.join(lines)
+
+
+def write_csv(filename, keys, rows):
+    """Write the swept values and results to a CSV file"""
+    with open(filename, 'w', newline='') as fd:
+        writer = csv.writer(fd)
+        writer.writerow(list(keys) + list(columns))
+        for combination, results in rows:
+            writer.writerow(
+                [combination[key] for key in keys] +
+                [results.get(column, '') for column in columns]
+            )
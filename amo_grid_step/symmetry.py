@@ -0,0 +1,398 @@
+# -*- coding: utf-8 -*-
+"""Using the symmetry of the structure to reduce the grids.
+
+The point group is found among the subgroups of D2h whose operations are
+reflections of the coordinate axes: the identity, the twofold rotations
+about x, y and z, the inversion and the three coordinate mirror planes.
+These are the groups that quantum chemistry programs commonly use, and the
+structure needs to be oriented with its symmetry elements along the axes.
+
+For a group G only the symmetry-unique points are kept: a wedge of the
+central grid, and for each set of equivalent atoms the grid on the first of
+them, reduced further by the operations that leave that atom in place. Each
+unique point's weight is multiplied by the number of points that are its
+images, so integrals of totally symmetric functions over the reduced grids
+are those over the full grids. The operations only move the angular points
+of a grid, so the unique points are found on the angular rule and every
+radial shell keeps the same ones; the full grids are never built.
+SymmetryReduction keeps the map from every angular point of the full grids
+to its unique point and the operation relating them, so the full grids can
+be recovered.
+"""
+
+import logging
+
+import numpy as np
+
+from amo_grid_step import grid
+from amo_grid_step.elements import templates
+from amo_grid_step.grid_file import GridFile
+
+logger = logging.getLogger(__name__)
+
+# The operations as the signs they apply to x, y and z
+operations = {
+    'E': (1, 1, 1),
+    'C2(z)': (-1, -1, 1),
+    'C2(y)': (-1, 1, -1),
+    'C2(x)': (1, -1, -1),
+    'i': (-1, -1, -1),
+    'sigma(xy)': (1, 1, -1),
+    'sigma(xz)': (1, -1, 1),
+    'sigma(yz)': (-1, 1, 1),
+}
+_by_signs = {signs: name for name, signs in operations.items()}
+
+_dtype = np.dtype([('x', 'f8'), ('y', 'f8'), ('z', 'f8')])
+
+
+def point_group(names):
+    """The name of the group made of the named operations"""
+    names = set(names)
+    rotations = [name for name in names if name.startswith('C2')]
+    if len(names) == 1:
+        return 'C1'
+    elif len(names) == 2:
+        if 'i' in names:
+            return 'Ci'
+        return 'C2' if len(rotations) == 1 else 'Cs'
+    elif len(names) == 4:
+        if 'i' in names:
+            return 'C2h'
+        return 'D2' if len(rotations) == 3 else 'C2v'
+    return 'D2h'
+
+
+def _match(reference, targets, decimals):
+    """The index in reference of each row of targets, or -1 if not there.
+
+    Rows match if they are the same when rounded to the given decimals.
+    Values that differ only by rounding error can round differently if they
+    lie near a rounding boundary, so any that do not match are tried again
+    with everything shifted by half the rounding step.
+    """
+    reference = np.asarray(reference, dtype=float)
+    targets = np.asarray(targets, dtype=float)
+    result = np.full(len(targets), -1)
+    for shift in (0.0, 0.5 * 10.0**-decimals):
+        missing = np.flatnonzero(result < 0)
+        if len(missing) == 0:
+            break
+        ref = _records(reference + shift, decimals)
+        tgt = _records(targets[missing] + shift, decimals)
+        order = np.argsort(ref)
+        ordered = ref[order]
+        position = np.minimum(np.searchsorted(ordered, tgt), len(ref) - 1)
+        result[missing] = np.where(
+            ordered[position] == tgt, order[position], -1
+        )
+    return result
+
+
+def _records(xyz, decimals):
+    """The rows of xyz, rounded, as records that sort lexically"""
+    xyz = np.round(xyz, decimals) + 0.0
+    return np.ascontiguousarray(xyz).view(_dtype).ravel()
+
+
+def find_operations(elements, coordinates, tolerance=1.0e-4):
+    """The operations that map the structure onto itself.
+
+    The coordinates are centered as for the grids. Returns a dictionary of
+    operation name to an array giving the atom that each atom maps to.
+    """
+    xyz = grid.centered_coordinates(coordinates)
+    elements = np.asarray(elements)
+    decimals = max(0, int(np.floor(-np.log10(tolerance))))
+    result = {}
+    for name, signs in operations.items():
+        image = _match(xyz, xyz * signs, decimals)
+        if np.any(image < 0):
+            continue
+        if np.any(elements[image] != elements):
+            continue
+        if np.any(np.abs(xyz[image] - xyz * signs) > tolerance):
+            continue
+        result[name] = image
+    return result
+
+
+def angular_permutations(xyz, names):
+    """For each operation, the index of the image of each angular point.
+
+    The operations only move the angular points, so the images of the
+    points in every radial shell of a grid follow from these. Operations
+    that do not map the angular points onto themselves are left out.
+    """
+    result = {}
+    for name in names:
+        image = _match(xyz, xyz * operations[name], 9)
+        if np.all(image >= 0):
+            result[name] = image
+    return result
+
+
+def _wedge(permutations, names):
+    """The unique angular points under the named operations.
+
+    Returns the indices of the unique points, the number of images of each,
+    and for every point the position of its unique point in that list and
+    the operation, as an index into names, that maps the one to the other.
+    """
+    images = np.array([permutations[name] for name in names])
+    representative = images.min(axis=0)
+    n = images.shape[1]
+    unique = np.flatnonzero(representative == np.arange(n))
+    ordered = np.sort(images[:, unique], axis=0)
+    multiplicity = 1 + np.count_nonzero(np.diff(ordered, axis=0), axis=0)
+    index = np.searchsorted(unique, representative)
+    # The operations are their own inverses, so the operation taking the
+    # unique point to a point also takes the point to the unique one
+    operation = np.argmax(images == representative, axis=0)
+    return unique, multiplicity, index, operation
+
+
+def _explicit(reduced):
+    """The points and weights of a reduced grid, kept either way"""
+    if isinstance(reduced, tuple):
+        return reduced
+    return reduced.explicit()
+
+
+class SymmetryReduction(object):
+    """The symmetry-unique parts of the grids and how to expand them.
+
+    grids holds the unique points, keyed 'center' and 'atom_n' for the
+    first atom of each set of equivalent atoms, as grid.ProductGrids of the
+    radial shells and the unique angular points, or as (points, weights)
+    once they are made explicit, e.g. with partition weights or read from a
+    grid file. The unique points of every shell are the same, so the maps
+    are kept for the angular rule: blocks gives, for every grid of the full
+    set, the name of the reduced grid it comes from, the index of the unique
+    angular point for each of its angular points, and the operation, as an
+    index into signs, taking the unique point to it about the centers.
+    """
+
+    def __init__(self, group, names):
+        self.group = group
+        self.names = list(names)
+        self.signs = np.array([operations[name] for name in names], float)
+        self.grids = {}
+        self.multiplicity = {}
+        self.n_shells = {}
+        self.centers = {}
+        self.blocks = {}
+
+    def n_points(self, name=None):
+        """The number of unique points in a reduced grid, or in all"""
+        if name is None:
+            return sum(self.n_points(name) for name in self.multiplicity)
+        return self.n_shells[name] * len(self.multiplicity[name])
+
+    def n_full_points(self, name=None):
+        """The number of points in a full grid, or in all of them"""
+        if name is None:
+            return sum(self.n_full_points(name) for name in self.blocks)
+        unique, index, _ = self.blocks[name]
+        return self.n_shells[unique] * len(index)
+
+    def full_map(self, name):
+        """The unique point and operation for each point of a full grid.
+
+        Returns the name of the reduced grid, and for every point of the
+        full grid 'name' the index of its unique point and the operation.
+        """
+        unique, index, operation = self.blocks[name]
+        n_shells = self.n_shells[unique]
+        n = len(self.multiplicity[unique])
+        offsets = n * np.arange(n_shells)[:, np.newaxis]
+        return (
+            unique, (offsets + index).ravel(), np.tile(operation, n_shells)
+        )
+
+    def expand_points(self, name):
+        """The points of the full grid 'name'"""
+        unique, index, operation = self.full_map(name)
+        points, _ = _explicit(self.grids[unique])
+        offsets = points[index] - self.centers[unique]
+        return self.centers[name] + self.signs[operation] * offsets
+
+    def expand_weights(self, name):
+        """The weights of the full grid 'name'"""
+        unique, index, _ = self.full_map(name)
+        _, weights = _explicit(self.grids[unique])
+        multiplicity = np.tile(
+            self.multiplicity[unique], self.n_shells[unique]
+        )
+        return (weights / multiplicity)[index]
+
+    def expand_values(self, name, values):
+        """Values of a totally symmetric function on the full grid 'name'
+
+        given its values on the unique points.
+        """
+        _, index, _ = self.full_map(name)
+        return np.asarray(values)[index]
+
+    def expand(self):
+        """The full grids as a dictionary of (points, weights)"""
+        return {
+            name: (self.expand_points(name), self.expand_weights(name))
+            for name in self.blocks
+        }
+
+    def save(self, filename):
+        """Save the maps for expanding the grids to a NumPy .npz file.
+
+        The unique grids themselves are not saved; they are in the grid
+        file. load_reduction() reads the maps back.
+        """
+        arrays = {
+            'group': np.array(self.group),
+            'names': np.array(self.names),
+            'blocks': np.array(list(self.blocks)),
+        }
+        for name, (unique, index, operation) in self.blocks.items():
+            arrays[name + '/unique'] = np.array(unique)
+            arrays[name + '/index'] = index
+            arrays[name + '/operation'] = operation
+            arrays[name + '/center'] = self.centers[name]
+        for name, multiplicity in self.multiplicity.items():
+            arrays[name + '/multiplicity'] = multiplicity
+            arrays[name + '/n_shells'] = np.array(self.n_shells[name])
+        np.savez(filename, **arrays)
+
+
+def load_reduction(filename, grids):
+    """Read the maps saved by SymmetryReduction.save().
+
+    grids holds the unique points, either the GridFile of the grid file or
+    a dictionary of (points, weights).
+    """
+    with np.load(filename) as arrays:
+        reduction = SymmetryReduction(
+            str(arrays['group']), [str(x) for x in arrays['names']]
+        )
+        for name in arrays['blocks']:
+            name = str(name)
+            reduction.blocks[name] = (
+                str(arrays[name + '/unique']),
+                arrays[name + '/index'],
+                arrays[name + '/operation']
+            )
+            reduction.centers[name] = arrays[name + '/center']
+            if name + '/multiplicity' in arrays:
+                reduction.multiplicity[name] = arrays[name + '/multiplicity']
+                reduction.n_shells[name] = int(arrays[name + '/n_shells'])
+                if isinstance(grids, GridFile):
+                    reduction.grids[name] = (
+                        grids.points(name), grids.weights(name)
+                    )
+                else:
+                    reduction.grids[name] = grids[name]
+    return reduction
+
+
+def reduce_grids(P, coordinates, elements=None, tolerance=1.0e-4):
+    """Find the symmetry-unique parts of the central and atomic grids.
+
+    Returns a SymmetryReduction whose grids are grid.ProductGrids of the
+    unique points, which can be generated in blocks, so the full grids are
+    never built. The operations move only the angular points, so the unique
+    points of every shell are those of the angular rule. Operations that
+    the angular quadratures do not respect, e.g. reflecting x with an odd
+    number of phi points, are not used.
+    """
+    n_atoms = len(coordinates)
+    if elements is None:
+        elements = ['*'] * n_atoms
+        Ps = {'*': P}
+    else:
+        Ps = templates(P, elements)
+    xyz = grid.centered_coordinates(coordinates)
+    atom_images = find_operations(elements, coordinates, tolerance)
+
+    rules = {'center': grid.central_rules(P)}
+    for element, Pe in Ps.items():
+        rules[element] = grid.atomic_rules(Pe, element)
+    permutations = {
+        key: angular_permutations(angular, atom_images)
+        for key, (_, angular, _) in rules.items()
+    }
+    names = [
+        name for name in operations
+        if all(name in p for p in permutations.values())
+    ]
+    dropped = set(atom_images) - set(names)
+    if len(dropped) > 0:
+        logger.warning(
+            'The grids do not have the symmetry of the structure for '
+            '{}, so those operations are not used.'.format(
+                ', '.join(sorted(dropped))
+            )
+        )
+
+    reduction = SymmetryReduction(point_group(names), names)
+    position = {name: i for i, name in enumerate(names)}
+    signs = {name: operations[name] for name in names}
+
+    def add(block, key, origin, stabilizer):
+        """Add the unique part of a grid, returning its angular map.
+
+        The grid stands for len(names) / len(stabilizer) equivalent grids,
+        which the multiplicity includes.
+        """
+        regions, angular, wa = rules[key]
+        unique, multiplicity, index, operation = _wedge(
+            permutations[key], stabilizer
+        )
+        multiplicity *= len(names) // len(stabilizer)
+        reduced = grid.ProductGrid(
+            origin, regions, angular[unique], wa[unique] * multiplicity
+        )
+        reduction.grids[block] = reduced
+        reduction.multiplicity[block] = multiplicity
+        reduction.n_shells[block] = reduced.n_radial
+        reduction.centers[block] = origin
+        operation = np.array([position[h] for h in stabilizer])[operation]
+        reduction.blocks[block] = (block, index, operation)
+        return index, operation
+
+    # The central grid
+    add('center', 'center', np.zeros(3), names)
+
+    # The atoms, one grid for each set of equivalent atoms
+    done = set()
+    for i in range(n_atoms):
+        if i in done:
+            continue
+        name = 'atom_{}'.format(i + 1)
+        stabilizer = [h for h in names if atom_images[h][i] == i]
+        index, operation = add(name, elements[i], xyz[i], stabilizer)
+
+        # The equivalent atoms, and an operation taking this atom to each
+        for g in names:
+            j = int(atom_images[g][i])
+            if j in done or j == i:
+                continue
+            done.add(j)
+            reduction.centers['atom_{}'.format(j + 1)] = xyz[j]
+            k = permutations[elements[i]][g]
+            combined = [
+                position[_by_signs[tuple(
+                    a * b for a, b in zip(signs[g], signs[names[h]])
+                )]]
+                for h in range(len(names))
+            ]
+            reduction.blocks['atom_{}'.format(j + 1)] = (
+                name, index[k], np.array(combined)[operation[k]]
+            )
+
+    # Keep the full grids in the usual order
+    reduction.blocks = {
+        name: reduction.blocks[name]
+        for name in ['center'] + [
+            'atom_{}'.format(i + 1) for i in range(n_atoms)
+        ]
+    }
+    return reduction
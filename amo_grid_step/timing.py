@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""Timing the phases of the AMO Grid step and the resources of amo_grid.
+
+    timer = Timer()
+    with timer.phase('input'):
+        ...
+
+Each phase accumulates wall-clock time from time.perf_counter(), so a phase
+entered more than once is the total of its parts. ChildUsage works the same
+way for the CPU time and peak memory of the child processes, from
+getrusage(). results() gives the numbers as the step's properties, ready for
+store_results().
+"""
+
+import contextlib
+import logging
+import sys
+import time
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# The phases of the step and the property for the time of each. amo_grid
+# runs in the step's directory, so no files are staged in or out: the
+# execution includes starting the program and reading back its output, and
+# the cache phase covers looking up, restoring and storing cached results.
+phases = {
+    'input': 'Input time',
+    'execution': 'Execution time',
+    'cache': 'Cache time',
+    'analysis': 'Analysis time',
+}
+
+
+class Timer(object):
+    """Accumulate the wall-clock time spent in each phase"""
+
+    def __init__(self):
+        self.times = {}
+        self.start = time.perf_counter()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Time the body of a with statement as part of a phase"""
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            dt = time.perf_counter() - t0
+            self.times[name] = self.times.get(name, 0.0) + dt
+            logger.debug('{} took {:.6f} s'.format(name, dt))
+
+    def total(self):
+        """The wall-clock time since the timer was created"""
+        return time.perf_counter() - self.start
+
+    def results(self):
+        """The times as properties, 0.0 for phases that did not happen"""
+        result = {
+            key: self.times.get(name, 0.0) for name, key in phases.items()
+        }
+        result['Total time'] = self.total()
+        return result
+
+
+class ChildUsage(object):
+    """Measure the resources used by the child processes, e.g. amo_grid.
+
+    The CPU times are the difference in getrusage(RUSAGE_CHILDREN) over the
+    measurement, so they cover only the children that finished and were
+    waited for during it. The operating system only keeps the largest peak
+    memory of any child this process has had, so the peak is known only if
+    it grew during the measurement; in a step that runs amo_grid once it is
+    then the peak for amo_grid. Otherwise it is None and not reported.
+    """
+
+    def __init__(self):
+        self.measured = False
+        self.user = 0.0
+        self.system = 0.0
+        self.wall = 0.0
+        self.peak_memory = None
+
+    @contextlib.contextmanager
+    def measure(self):
+        """Measure the children run in the body of a with statement"""
+        self.measured = True
+        if resource is None:
+            before = None
+        else:
+            before = resource.getrusage(resource.RUSAGE_CHILDREN)
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.wall += time.perf_counter() - t0
+            if before is not None:
+                after = resource.getrusage(resource.RUSAGE_CHILDREN)
+                self.user += after.ru_utime - before.ru_utime
+                self.system += after.ru_stime - before.ru_stime
+                if after.ru_maxrss > before.ru_maxrss:
+                    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+                    if sys.platform == 'darwin':
+                        peak = after.ru_maxrss / (1024 * 1024)
+                    else:
+                        peak = after.ru_maxrss / 1024
+                    self.peak_memory = max(self.peak_memory or 0.0, peak)
+
+    def results(self):
+        """The resources used, as properties.
+
+        Nothing is reported if no children were measured, e.g. when the
+        results came from the cache, and only what is known otherwise.
+        """
+        if not self.measured:
+            return {}
+        result = {'amo_grid wall time': self.wall}
+        if resource is not None:
+            result['amo_grid user time'] = self.user
+            result['amo_grid system time'] = self.system
+        if self.peak_memory is not None:
+            result['amo_grid peak memory'] = self.peak_memory
+        return result
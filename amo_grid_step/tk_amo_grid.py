@@ -5,6 +5,7 @@ import molssi_workflow
 from molssi_workflow import ureg, Q_, units_class  # noqa F401
 import molssi_widgets as mw
 import amo_grid_step  # noqa F401
+from amo_grid_step import quadrature
 import Pmw
 import pprint  # noqa F401
 import tkinter as tk
@@ -72,15 +73,23 @@ class TkAMOGrid(molssi_workflow.TkNode):
         atomic_grids.columnconfigure(1, minsize=50)
         atomic_grids.columnconfigure(2, minsize=50)
         
+        options = []
         for key in P:
             if key[0:7] == 'central':
                 self[key] = P[key].widget(self['central_grid'])
-            if key[0:6] == 'atomic':
+            elif key[0:6] == 'atomic':
                 self[key] = P[key].widget(self['atomic_grids'])
+            elif key not in ('results', 'create tables',
+                             'element grid settings'):
+                self[key] = P[key].widget(self['frame'])
+                options.append(key)
 
         # Set up the callbacks to change the GUI
         for key in ('central grid angular quadrature',
-                    'atomic grid angular quadrature'):
+                    'atomic grid angular quadrature',
+                    'central grid angular pruning',
+                    'atomic grid angular pruning',
+                    'atomic grid radial quadrature'):
             self[key].combobox.bind(
                 "<<ComboboxSelected>>", self.reset_dialog
             )
@@ -88,6 +97,16 @@ class TkAMOGrid(molssi_workflow.TkNode):
         # and lay them out
         central_grid.grid(row=0, column=0, sticky=tk.NSEW)
         atomic_grids.grid(row=0, column=1, sticky=tk.NSEW)
+
+        # and the general options below them
+        row = 1
+        widgets = []
+        for key in options:
+            self[key].grid(row=row, column=0, columnspan=2, sticky=tk.W)
+            widgets.append(self[key])
+            row += 1
+        mw.align_labels(widgets)
+
         self.reset_dialog()
 
         # Second tab for results
@@ -192,11 +211,19 @@ class TkAMOGrid(molssi_workflow.TkNode):
 
         for key in ('central grid radial quadrature',
                     'central grid region n-points',
-                    'central grid region outer limit'):
+                    'central grid region outer limit',
+                    'central grid angular pruning'):
             self[key].grid(row=row, column=0, columnspan=3, sticky=tk.EW)
             widgets.append(self[key])
             row += 1
 
+        if self['central grid angular pruning'].get() == 'table':
+            for key in ('central grid pruning radii',
+                        'central grid pruning lmax'):
+                self[key].grid(row=row, column=1, columnspan=2, sticky=tk.EW)
+                widgets1.append(self[key])
+                row += 1
+
         # Align the labels
         mw.align_labels(widgets)
         mw.align_labels(widgets1)
@@ -245,12 +272,33 @@ class TkAMOGrid(molssi_workflow.TkNode):
                 widgets2.append(self[key])
                 row += 1
 
-        for key in ('atomic grid radial quadrature',
-                    'atomic grid region n-points',
-                    'atomic grid region outer limit'):
+        for key in ('atomic grid radial quadrature',):
+            self[key].grid(row=row, column=0, columnspan=3, sticky=tk.EW)
+            widgets.append(self[key])
+            row += 1
+
+        # Only the mapped radial quadratures have a length scale
+        method = self['atomic grid radial quadrature'].get()
+        if method in quadrature.mapped_radial:
+            for key in ('atomic grid radial scale',):
+                self[key].grid(row=row, column=1, columnspan=2, sticky=tk.EW)
+                widgets1.append(self[key])
+                row += 1
+
+        for key in ('atomic grid region n-points',
+                    'atomic grid region outer limit',
+                    'atomic grid element scaling',
+                    'atomic grid angular pruning'):
             self[key].grid(row=row, column=0, columnspan=3, sticky=tk.EW)
             widgets.append(self[key])
             row += 1
+
+        if self['atomic grid angular pruning'].get() == 'table':
+            for key in ('atomic grid pruning radii',
+                        'atomic grid pruning lmax'):
+                self[key].grid(row=row, column=1, columnspan=2, sticky=tk.EW)
+                widgets1.append(self[key])
+                row += 1
             
         # Align the labels
         mw.align_labels(widgets)
@@ -302,7 +350,8 @@ class TkAMOGrid(molssi_workflow.TkNode):
         # it is easy! You can sort out what it all means later, or
         # be a bit more selective.
         for key in P:
-            if key not in ('results', 'create tables'):
+            if key not in ('results', 'create tables',
+                           'element grid settings'):
                 P[key].set_from_widget()
 
         # and from the results tab...
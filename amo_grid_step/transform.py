@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""Spherical harmonic transforms on the central grid.
+
+With the product angular quadrature, Gauss-Legendre in cos(theta) times the
+trapezoidal rule in phi, a function on a shell of the grid can be projected
+onto the spherical harmonics Y_lm with an FFT in phi followed by a Legendre
+transform in theta, in O(N L) rather than the O(N L**2) of a direct sum. The
+inverse goes the other way. The harmonics are the orthonormal complex ones
+with the Condon-Shortley phase.
+
+Coefficients are stored in arrays of shape (..., lmax + 1, 2*lmax + 1) with
+a_lm at [..., l, lmax + m]; entries with |m| > l are zero.
+"""
+
+import functools
+import logging
+
+import numpy as np
+
+from amo_grid_step import grid, quadrature
+
+logger = logging.getLogger(__name__)
+
+
+@functools.lru_cache(maxsize=16)
+def legendre_table(n_theta, lmax):
+    """The normalized associated Legendre functions at the theta points.
+
+    Returns a read-only array of shape (lmax + 1, lmax + 1, n_theta) holding
+    the theta part of Y_lm, for m >= 0, at [l, m] for the Gauss-Legendre
+    points in cos(theta). Tables are cached, since a transform reuses them
+    for every shell.
+    """
+    x, _ = quadrature.gauss_legendre(n_theta)
+    s = np.sqrt(1 - x * x)
+    table = np.zeros((lmax + 1, lmax + 1, n_theta))
+
+    # The diagonal, m = l, then the standard recurrence upwards in l
+    pmm = np.full(n_theta, np.sqrt(1 / (4 * np.pi)))
+    for m in range(lmax + 1):
+        if m > 0:
+            pmm = -np.sqrt((2 * m + 1) / (2 * m)) * s * pmm
+        table[m, m] = pmm
+        if m < lmax:
+            table[m + 1, m] = np.sqrt(2 * m + 3) * x * pmm
+        for ell in range(m + 2, lmax + 1):
+            a = np.sqrt((4 * ell * ell - 1) / (ell * ell - m * m))
+            b = np.sqrt(((ell - 1)**2 - m * m) / (4 * (ell - 1)**2 - 1))
+            table[ell, m] = a * (x * table[ell - 1, m] - b * table[ell - 2, m])
+    table.flags.writeable = False
+    return table
+
+
+class SphericalHarmonicTransform(object):
+    """Forward and inverse spherical harmonic transforms, shell by shell.
+
+    Values on the grid are arrays whose last axis runs over the angular
+    points of a shell in the order of quadrature.product_angular(), theta
+    slowest and phi fastest, so (n_shells, n_theta * n_phi) transforms every
+    shell of a grid at once.
+    """
+
+    def __init__(self, n_theta, n_phi, lmax):
+        if n_theta < lmax + 1 or n_phi < 2 * lmax + 1:
+            raise ValueError(
+                'A {} x {} theta and phi grid is too small for l-max {}; '
+                'it needs at least {} x {}'.format(
+                    n_theta, n_phi, lmax, *quadrature.minimal_product(lmax)
+                )
+            )
+        self.n_theta = n_theta
+        self.n_phi = n_phi
+        self.lmax = lmax
+        _, self.theta_weights = quadrature.gauss_legendre(n_theta)
+        self.table = legendre_table(n_theta, lmax)
+
+        # The table for all m, using that -m is (-1)**m times m
+        self.m = np.arange(-lmax, lmax + 1)
+        sign = np.where((self.m < 0) & (self.m % 2 == 1), -1.0, 1.0)
+        self.full_table = (
+            self.table[:, np.abs(self.m), :] * sign[:, np.newaxis]
+        )
+        self.weighted_table = self.full_table * self.theta_weights
+
+    @classmethod
+    def from_parameters(cls, P):
+        """The transform for the central grid described by the parameters"""
+        P = grid.resolve_angular(P)
+        if P['central grid angular quadrature'] not in ('Gauss', 'mixed'):
+            raise ValueError(
+                'The spherical harmonic transform needs the Gauss-Legendre '
+                'by trapezoidal product grid, not {}'.format(
+                    P['central grid angular quadrature']
+                )
+            )
+        return cls(
+            int(P['central grid theta n-points']),
+            int(P['central grid phi n-points']),
+            int(P['central grid lmax'])
+        )
+
+    @property
+    def n_angular(self):
+        """The number of angular points in a shell"""
+        return self.n_theta * self.n_phi
+
+    def forward(self, values):
+        """The coefficients a_lm of the values on each shell"""
+        values = np.asarray(values)
+        shape = values.shape[:-1]
+        f = values.reshape(-1, self.n_theta, self.n_phi)
+
+        # FFT in phi, keeping m = -lmax ... lmax
+        F = np.fft.fft(f, axis=-1) * (2 * np.pi / self.n_phi)
+        F = F[:, :, self.m % self.n_phi]
+
+        # Legendre transform in theta
+        a = np.einsum('lmj,sjm->slm', self.weighted_table, F)
+        return a.reshape(shape + a.shape[1:])
+
+    def inverse(self, coefficients):
+        """The values on each shell of the coefficients a_lm"""
+        coefficients = np.asarray(coefficients)
+        shape = coefficients.shape[:-2]
+        a = coefficients.reshape((-1,) + coefficients.shape[-2:])
+
+        # Sum over l for each m, then an inverse FFT in phi
+        G = np.einsum('lmj,slm->sjm', self.full_table, a)
+        H = np.zeros(G.shape[:2] + (self.n_phi,), dtype=complex)
+        H[:, :, self.m % self.n_phi] = G
+        f = np.fft.ifft(H, axis=-1) * self.n_phi
+        return f.reshape(shape + (self.n_angular,))
+
+    def shells(self, values):
+        """Split values on the whole central grid into shells"""
+        return np.asarray(values).reshape(-1, self.n_angular)
@@ -0,0 +1,9 @@
+# -*- coding: utf-8 -*-
+"""Small helpers shared by the modules of the step."""
+
+
+def as_list(value):
+    """Region parameters may be a single value or a list"""
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    return [value]
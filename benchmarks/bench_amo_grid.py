@@ -0,0 +1,232 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Benchmarks for the hot paths of the AMO Grid step.
+
+Times get_input(), description_text(), analyze() on a synthetic output.dat
+and the in-process grid generation for synthetic structures of increasing
+size, with the MolSSI framework replaced by the stand-ins in stubs.py. The
+results are written as JSON, and can be compared with an earlier run:
+
+    python benchmarks/bench_amo_grid.py --output new.json
+    python benchmarks/bench_amo_grid.py --output new.json --compare old.json
+
+Comparing prints the ratio of the new to the old time for each benchmark
+and exits with status 1 if any is slower than the threshold.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(
+    0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+)
+
+import stubs  # noqa: E402
+
+workflow = stubs.install()
+
+import numpy as np  # noqa: E402
+
+import amo_grid_step  # noqa: E402
+from amo_grid_step import grid  # noqa: E402
+
+default_sizes = (10, 100, 1000, 10000, 100000)
+
+
+def structure(n_atoms, seed=12345):
+    """A random structure of C, H, N and O with roughly liquid density"""
+    rng = np.random.RandomState(seed)
+    side = 3.0 * n_atoms ** (1 / 3)
+    return {
+        'atoms': {
+            'elements': list(rng.choice(['C', 'H', 'N', 'O'], n_atoms)),
+            'coordinates': (rng.uniform(0, side, (n_atoms, 3))).tolist(),
+        }
+    }
+
+
+def write_output(filename, n_atoms):
+    """A synthetic output.dat with some lines of output per atom"""
+    with open(filename, 'w') as fd:
+        fd.write('  center grid points: 22500\n')
+        for i in range(n_atoms):
+            fd.write('  atom {} center: 0.0 0.0 0.0\n'.format(i + 1))
+            fd.write('  number of points per interval: 20\n')
+            fd.write('  total angular numbers of points: 30\n')
+        for i, error in enumerate((0.01, 0.02, 0.03)):
+            fd.write('  test {}\n'.format(i + 1))
+            fd.write('  percent diff: {}\n'.format(error))
+
+
+def best_time(function, repeat):
+    """The shortest of repeat timings of function()"""
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+
+def in_process_parameters(node):
+    """Parameters for grids that the in-process engine can build"""
+    P = node.parameters.current_values_to_dict()
+    for prefix in ('central grid', 'atomic grid'):
+        P[prefix + ' angular quadrature'] = 'Gauss'
+    return P
+
+
+def generate(P, coordinates, elements, block_size):
+    """Generate every block of every grid, returning the number of points"""
+    n = 0
+    for name, center, blocks in grid.iter_grids(
+        P, coordinates, block_size=block_size, elements=elements
+    ):
+        for points, weights in blocks:
+            n += len(weights)
+    return n
+
+
+def run(sizes, repeat, max_grid_atoms, block_size):
+    """Run the benchmarks, returning a dictionary of the timings"""
+    results = {}
+
+    def record(name, n_atoms, seconds):
+        results.setdefault(name, {})[str(n_atoms)] = seconds
+        print('{:>20s} {:>8d} atoms: {:12.6f} s'.format(
+            name, n_atoms, seconds
+        ))
+
+    with tempfile.TemporaryDirectory() as directory:
+        for n_atoms in sizes:
+            workflow.data.structure = structure(n_atoms)
+            node = amo_grid_step.AMOGrid()
+            node.directory = directory
+            P = node.parameters.current_values_to_dict()
+
+            record(
+                'get_input', n_atoms, best_time(node.get_input, repeat)
+            )
+            record(
+                'description_text', n_atoms,
+                best_time(lambda: node.description_text(P), repeat)
+            )
+
+            write_output(os.path.join(directory, 'output.dat'), n_atoms)
+            record('analyze', n_atoms, best_time(node.analyze, repeat))
+
+            if n_atoms <= max_grid_atoms:
+                Pg = in_process_parameters(node)
+                atoms = workflow.data.structure['atoms']
+                record(
+                    'grid generation', n_atoms,
+                    best_time(
+                        lambda: generate(
+                            Pg, atoms['coordinates'], atoms['elements'],
+                            block_size
+                        ),
+                        repeat
+                    )
+                )
+    return results
+
+
+def environment():
+    """Where the benchmarks were run"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=here,
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            universal_newlines=True
+        ).stdout.strip()
+    except OSError:
+        commit = ''
+    return {
+        'amo_grid_step': amo_grid_step.__version__,
+        'commit': commit,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+
+def compare(new, old, threshold):
+    """Print the ratios of the new to old times, returning the regressions"""
+    regressions = []
+    print('\n{:>20s} {:>8s} {:>12s} {:>12s} {:>8s}'.format(
+        'Benchmark', 'Atoms', 'Old (s)', 'New (s)', 'Ratio'
+    ))
+    for name, timings in new['results'].items():
+        for n_atoms, seconds in timings.items():
+            before = old['results'].get(name, {}).get(n_atoms)
+            if before is None or before <= 0:
+                continue
+            ratio = seconds / before
+            flag = ''
+            if ratio > threshold:
+                flag = '  slower'
+                regressions.append((name, n_atoms, ratio))
+            print('{:>20s} {:>8s} {:12.6f} {:12.6f} {:8.2f}{}'.format(
+                name, n_atoms, before, seconds, ratio, flag
+            ))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        '--sizes', type=int, nargs='+', default=default_sizes,
+        help='the numbers of atoms in the structures'
+    )
+    parser.add_argument(
+        '--repeat', type=int, default=3,
+        help='the number of times to run each benchmark, keeping the best'
+    )
+    parser.add_argument(
+        '--max-grid-atoms', type=int, default=10000,
+        help='the largest structure to generate the grids for'
+    )
+    parser.add_argument(
+        '--block-size', type=int, default=100000,
+        help='the block size for generating the grids'
+    )
+    parser.add_argument(
+        '--output', default='benchmarks.json',
+        help='the JSON file for the results'
+    )
+    parser.add_argument(
+        '--compare', default=None,
+        help='a JSON file of earlier results to compare with'
+    )
+    parser.add_argument(
+        '--threshold', type=float, default=1.2,
+        help='the ratio of new to old time counted as a regression'
+    )
+    args = parser.parse_args(argv)
+
+    report = environment()
+    report['results'] = run(
+        args.sizes, args.repeat, args.max_grid_atoms, args.block_size
+    )
+    with open(args.output, 'w') as fd:
+        json.dump(report, fd, indent=4, sort_keys=True)
+
+    if args.compare is not None:
+        with open(args.compare, 'r') as fd:
+            old = json.load(fd)
+        if len(compare(report, old, args.threshold)) > 0:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,250 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Accuracy against cost of the quadrature choices for the central grid.
+
+Builds the central grid with the in-process engine for every combination of
+angular quadrature, radial quadrature, l-max, number of radial points and
+radial extent, recording the number of points, the time to build and
+integrate it, and the errors in the three tests of the step and in a
+Gaussian displaced from the center. The three tests are spherically
+symmetric, so only the displaced Gaussian tells how good the angular
+quadrature is. The configurations on the
+Pareto front, those for which no other configuration is both cheaper and
+more accurate, are printed as a table and all of the results written as
+JSON:
+
+    python benchmarks/bench_pareto.py --output pareto.json
+
+The accuracy is the largest of the absolute test errors unless --test picks
+one test. The in-process engine treats 'Gauss' and 'mixed' angular
+quadratures the same, so only 'Gauss' is scanned, and has Lebedev rules only
+up to rule 65, so Lebedev is only scanned for the l-max they can handle.
+Each grid is built once before it is timed, so that the time does not
+include computing the quadrature rules the first time they are used.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(
+    0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+)
+
+import stubs  # noqa: E402
+
+workflow = stubs.install()
+
+import amo_grid_step  # noqa: E402
+from amo_grid_step import estimate, grid, quadrature  # noqa: E402
+from amo_grid_step.autotune import test_names  # noqa: E402
+
+angular_methods = ('Lebedev', 'Gauss')
+radial_methods = ('Legendre', 'Gauss')
+default_lmax = (5, 10, 20, 40)
+default_n_points_scales = (0.25, 0.5, 1.0, 2.0)
+default_limit_scales = (0.75, 1.0, 1.5)
+
+# A unit Gaussian away from the center, whose integral is pi**1.5
+displacement = np.array([0.8, 0.5, 0.3])
+bench_test_names = test_names + ('Displaced Gaussian test',)
+
+
+def displaced_gaussian(points):
+    d = points - displacement
+    return np.exp(-np.einsum('ij,ij->i', d, d))
+
+
+def configurations(P, lmaxes, n_points_scales, limit_scales):
+    """Yield (settings, parameters) for every combination to try"""
+    n_points = [int(n) for n in P['central grid region n-points']]
+    limits = [float(r) for r in P['central grid region outer limit']]
+    for angular, radial, lmax, n_scale, r_scale in itertools.product(
+        angular_methods, radial_methods, lmaxes, n_points_scales,
+        limit_scales
+    ):
+        Pi = dict(P)
+        Pi['central grid angular quadrature'] = angular
+        Pi['central grid radial quadrature'] = radial
+        Pi['central grid lmax'] = lmax
+        Pi['central grid Lebedev rule'] = 'auto'
+        Pi['central grid theta n-points'] = 'auto'
+        Pi['central grid phi n-points'] = 'auto'
+        Pi['central grid region n-points'] = [
+            max(2, int(round(n_scale * n))) for n in n_points
+        ]
+        Pi['central grid region outer limit'] = [
+            r_scale * r for r in limits
+        ]
+        Pi = grid.resolve_angular(Pi)
+        if angular == 'Lebedev':
+            try:
+                quadrature.lebedev(Pi['central grid Lebedev rule'])
+            except ValueError:
+                continue
+        settings = {
+            'angular quadrature': angular,
+            'radial quadrature': radial,
+            'lmax': lmax,
+            'region n-points': Pi['central grid region n-points'],
+            'region outer limit': Pi['central grid region outer limit'],
+        }
+        yield settings, Pi
+
+
+def integration_tests(P, block_size):
+    """The errors of the step's tests and the displaced Gaussian"""
+    total = 0.0
+
+    def blocks():
+        nonlocal total
+        for points, weights in grid.iter_central_grid(P, block_size):
+            total += np.dot(weights, displaced_gaussian(points))
+            yield points, weights
+
+    errors = grid.blocked_integration_tests(blocks())
+    exact = np.pi**1.5
+    errors['Displaced Gaussian test'] = float(100 * (total - exact) / exact)
+    return errors
+
+
+def measure(P, block_size):
+    """The points, time and test errors for the central grid.
+
+    The grid is built and integrated once untimed to warm the caches of
+    quadrature rules, and then timed.
+    """
+    integration_tests(P, block_size)
+    t0 = time.perf_counter()
+    errors = integration_tests(P, block_size)
+    seconds = time.perf_counter() - t0
+    result = {
+        'points': estimate.central_n_points(P),
+        'time': seconds,
+    }
+    result.update(errors)
+    return result
+
+
+def accuracy(result, test=None):
+    """The error used to rank a result: one test, or the worst of them"""
+    if test is not None:
+        return abs(result[test])
+    return max(abs(result[name]) for name in bench_test_names)
+
+
+def pareto_front(rows, test=None, rtol=1.0e-3):
+    """The rows not dominated in both points and accuracy, cheapest first.
+
+    A row must be more accurate than all cheaper rows by more than the
+    relative tolerance rtol, so that rounding differences between grids that
+    are equally accurate do not count.
+    """
+    front = []
+    best = None
+    for row in sorted(
+        rows, key=lambda row: (row['points'], accuracy(row, test))
+    ):
+        error = accuracy(row, test)
+        if best is None or error < (1 - rtol) * best:
+            front.append(row)
+            best = error
+    return front
+
+
+def format_table(rows):
+    """A text table of the settings and results"""
+    header = (
+        '{:>9s} {:>9s} {:>5s} {:>14s} {:>14s} {:>10s} {:>9s}'.format(
+            'Angular', 'Radial', 'lmax', 'n-points', 'limits', 'Points',
+            'Time (s)'
+        ) +
+        ''.join(
+            ' {:>{}s}'.format(name, max(14, len(name)))
+            for name in bench_test_names
+        )
+    )
+    lines = [header, '-' * len(header)]
+    for row in rows:
+        lines.append(
+            '{:>9s} {:>9s} {:5d} {:>14s} {:>14s} {:10d} {:9.4f}'.format(
+                row['angular quadrature'], row['radial quadrature'],
+                row['lmax'],
+                ','.join(str(n) for n in row['region n-points']),
+                ','.join('{:g}'.format(r) for r in row['region outer limit']),
+                row['points'], row['time']
+            ) +
+            ''.join(
+                ' {:{}.3e}'.format(row[name], max(14, len(name)))
+                for name in bench_test_names
+            )
+        )
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        '--lmax', type=int, nargs='+', default=default_lmax,
+        help='the values of l-max to scan'
+    )
+    parser.add_argument(
+        '--n-points-scales', type=float, nargs='+',
+        default=default_n_points_scales,
+        help='factors for the default numbers of radial points'
+    )
+    parser.add_argument(
+        '--limit-scales', type=float, nargs='+',
+        default=default_limit_scales,
+        help='factors for the default outer limits of the radial regions'
+    )
+    parser.add_argument(
+        '--test', choices=bench_test_names, default=None,
+        help='rank the accuracy by this test rather than the worst of all'
+    )
+    parser.add_argument(
+        '--block-size', type=int, default=100000,
+        help='the block size for generating the grids'
+    )
+    parser.add_argument(
+        '--output', default='pareto.json',
+        help='the JSON file for the results'
+    )
+    args = parser.parse_args(argv)
+
+    node = amo_grid_step.AMOGrid()
+    P = node.parameters.current_values_to_dict()
+
+    rows = []
+    for settings, Pi in configurations(
+        P, args.lmax, args.n_points_scales, args.limit_scales
+    ):
+        row = dict(settings)
+        row.update(measure(Pi, args.block_size))
+        rows.append(row)
+
+    front = pareto_front(rows, args.test)
+    print(
+        'Pareto-optimal central grids of {} tried, ranked by {}:\n'.format(
+            len(rows),
+            args.test if args.test is not None else 'the largest test error'
+        )
+    )
+    print(format_table(front))
+
+    with open(args.output, 'w') as fd:
+        json.dump(
+            {'test': args.test, 'results': rows, 'pareto': front},
+            fd, indent=4
+        )
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""Minimal stand-ins for the MolSSI workflow framework.
+
+The benchmarks time the AMO Grid step itself, so the framework is replaced
+by just enough to construct the step and call its methods: parameters that
+hold their default values, a Node that records what is stored, and printers
+that discard their output. install() must be called before amo_grid_step is
+imported.
+"""
+
+import sys
+import types
+
+
+class Parameter(object):
+    def __init__(self, definition):
+        self.definition = definition
+        self.value = definition['default']
+
+    def get(self, context=None):
+        return self.value
+
+
+class Parameters(dict):
+    def __init__(self, defaults={}, data=None):
+        super().__init__()
+        for key, definition in defaults.items():
+            self[key] = Parameter(definition)
+
+    def current_values_to_dict(self, context=None):
+        return {key: value.value for key, value in self.items()}
+
+
+class Node(object):
+    def __init__(self, workflow=None, title='', extension=None):
+        self.workflow = workflow
+        self.title = title
+        self.directory = '.'
+        self.stored = None
+
+    def run(self, printer=None):
+        return None
+
+    def store_results(self, **kwargs):
+        self.stored = kwargs
+
+
+class ExecLocal(object):
+    def run(self, cmd=None, files=None, return_files=None):
+        raise RuntimeError('The benchmarks do not run amo_grid')
+
+
+class Printer(object):
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+def get_printer(name=None):
+    return Printer()
+
+
+def install():
+    """Put the stand-ins in sys.modules in place of the real packages"""
+    workflow = types.ModuleType('molssi_workflow')
+    workflow.ureg = None
+    workflow.Q_ = None
+    workflow.units_class = None
+    workflow.data = types.SimpleNamespace(structure=None)
+    workflow.workflow_variables = types.SimpleNamespace(_data={})
+    workflow.Parameters = Parameters
+    workflow.Node = Node
+    workflow.TkNode = object
+    workflow.ExecLocal = ExecLocal
+
+    util = types.ModuleType('molssi_util')
+    printing = types.ModuleType('molssi_util.printing')
+    printing.getPrinter = get_printer
+    printing.FormattedText = str
+    util.printing = printing
+
+    sys.modules['molssi_workflow'] = workflow
+    sys.modules['molssi_util'] = util
+    sys.modules['molssi_util.printing'] = printing
+    sys.modules['molssi_widgets'] = types.ModuleType('molssi_widgets')
+    sys.modules['Pmw'] = types.ModuleType('Pmw')
+    return workflow
@@ -13,7 +13,8 @@ with open('HISTORY.rst') as history_file:
 
 requirements = [
     'molssi_workflow>=0.1',
-    'molssi_util>=0.1'
+    'molssi_util>=0.1',
+    'numpy'
     # TODO: put any other package requirements here
 ]
 
@@ -38,6 +39,7 @@ setup(
     packages=find_packages(include=['amo_grid_step']),
     include_package_data=True,
     install_requires=requirements,
+    python_requires='>=3.7',
     license="BSD license",
     zip_safe=False,
     keywords='amo_grid_step',
@@ -52,10 +54,8 @@ setup(
         'License :: OSI Approved :: BSD License',
         'Natural Language :: English',
         'Programming Language :: Python :: 3  :: Only',
-        'Programming Language :: Python :: 3.3',
-        'Programming Language :: Python :: 3.4',
-        'Programming Language :: Python :: 3.5',
-        'Programming Language :: Python :: 3.6',
+        'Programming Language :: Python :: 3.7',
+        'Programming Language :: Python :: 3.8',
     ],
     test_suite='tests',
     tests_require=test_requirements,
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for running amo_grid asynchronously."""
+
+import asyncio
+import sys
+
+import pytest  # nopep8
+
+from amo_grid_step import async_exec  # nopep8
+
+# A stand-in for amo_grid, printing what it has done to standard output and
+# output.dat
+fake_amo_grid = '''
+import time
+print('  center grid points: 22500', flush=True)
+with open('output.dat', 'w') as fd:
+    fd.write('  number of points per interval: 20\\n')
+    fd.write('  total angular numbers of points: 30\\n')
+for i in range(3):
+    time.sleep(0.05)
+    print('  percent diff: 0.0{}'.format(i + 1), flush=True)
+with open('output.dat', 'a') as fd:
+    for i in range(3):
+        fd.write('  percent diff: 0.0{}\\n'.format(i + 1))
+'''
+
+
+def test_progress():
+    """Each milestone is reported once, whichever output it comes from"""
+    reported = []
+    progress = async_exec.Progress(report=reported.append)
+    for source in ('stdout', 'output.dat'):
+        progress.line('  center grid points: 22500', source)
+        progress.line('  number of points per interval: 20', source)
+        progress.line('  total angular numbers of points: 30', source)
+        for i in range(3):
+            progress.line('  percent diff: 0.0{}'.format(i + 1), source)
+    assert reported == [
+        'Central grid generated: 22500 points',
+        'Atomic grid generated: 600 points',
+        'Test 1 of 3 completed: 0.01 percent error',
+        'Test 2 of 3 completed: 0.02 percent error',
+        'Test 3 of 3 completed: 0.03 percent error',
+    ]
+
+
+def test_execute(tmpdir):
+    """The program's progress is reported and its files returned"""
+    reported = []
+    result = async_exec.run_coroutine(async_exec.execute(
+        [sys.executable, '-c', fake_amo_grid], str(tmpdir),
+        return_files=['output.dat'],
+        progress=async_exec.Progress(report=reported.append),
+        interval=0.01
+    ))
+    assert result['returncode'] == 0
+    assert result['output.dat']['data'].count('percent diff') == 3
+    assert reported[0] == 'Central grid generated: 22500 points'
+    assert reported[-1] == 'Test 3 of 3 completed: 0.03 percent error'
+    assert len(reported) == 5
+
+
+def test_timeout(tmpdir):
+    """A program that runs too long is killed"""
+    cmd = [sys.executable, '-c', 'import time; time.sleep(30)']
+    with pytest.raises(RuntimeError):
+        async_exec.run_coroutine(
+            async_exec.execute(cmd, str(tmpdir), timeout=0.2)
+        )
+    with pytest.raises(RuntimeError):
+        async_exec.run(cmd, str(tmpdir), timeout=0.2)
+
+
+def test_running_loop(tmpdir):
+    """run_coroutine() works from within a running event loop"""
+    async def driver():
+        return async_exec.run_coroutine(async_exec.execute(
+            [sys.executable, '-c', fake_amo_grid], str(tmpdir),
+            return_files=['output.dat'], interval=0.01
+        ))
+
+    result = asyncio.run(driver())
+    assert result['returncode'] == 0
+    assert result['output.dat']['exception'] is None
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the automatic tuning of the central grid."""
+
+from amo_grid_step import autotune, estimate, quadrature  # nopep8
+
+
+def parameters(angular='Lebedev'):
+    return {
+        'central grid lmax': 5,
+        'central grid region n-points': [20, 10],
+        'central grid region outer limit': [4.0, 12.0],
+        'central grid radial quadrature': 'Legendre',
+        'central grid angular quadrature': angular,
+        'central grid Lebedev rule': 'auto',
+        'central grid theta n-points': 'auto',
+        'central grid phi n-points': 'auto',
+    }
+
+
+class Stub(object):
+    """Errors that fall as the radial regions get more points"""
+
+    def __init__(self):
+        self.n_evaluations = 0
+
+    def __call__(self, P):
+        self.n_evaluations += 1
+        n = sum(P['central grid region n-points'])
+        return {name: 100.0 / n for name in autotune.test_names}
+
+
+def test_dimensions():
+    """Each region, the outer limits and the angular rule are searched"""
+    first, second, limits, rules = autotune.dimensions(parameters())
+    assert [d.name for d in (first, second, limits, rules)] == [
+        'central grid region n-points[0]',
+        'central grid region n-points[1]',
+        'central grid region outer limit scale',
+        'central grid Lebedev rule',
+    ]
+    assert first.values == [5, 7, 10, 14, 20, 28, 40, 56, 80]
+    assert first.values[first.start] == 5
+    assert second.values[second.start] == 2
+    assert limits.values[limits.start] == 1.0
+    assert rules.values[rules.start] == quadrature.minimal_lebedev_rule(5)
+
+    names = [d.name for d in autotune.dimensions(parameters('Gauss'))]
+    assert names[-2:] == [
+        'central grid theta n-points', 'central grid phi n-points'
+    ]
+
+
+def test_run():
+    """The cheapest grid meeting the targets is found"""
+    evaluate = Stub()
+    tuner = autotune.AutoTuner(
+        parameters(), {'Sphere test': 5.0}, evaluate=evaluate
+    )
+    P, errors, n_points = tuner.run()
+    assert errors['Sphere test'] <= 5.0
+    assert sum(P['central grid region n-points']) == 20
+    assert P['central grid Lebedev rule'] == (
+        quadrature.minimal_lebedev_rule(5)
+    )
+    assert n_points == estimate.central_n_points(P)
+    assert evaluate.n_evaluations == len(tuner.evaluated)
+
+
+def test_run_budget():
+    """No grid over the point budget is tried"""
+    tuner = autotune.AutoTuner(
+        parameters(), {'Sphere test': 5.0}, evaluate=Stub(), max_points=700
+    )
+    P, errors, n_points = tuner.run()
+    assert n_points <= 700
+    assert errors['Sphere test'] > 5.0
+    assert all(tuner.cost(config) <= 700 for config in tuner.evaluated)
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the on-disk cache of amo_grid results."""
+
+import os
+
+import pytest  # nopep8
+
+from amo_grid_step.cache import ResultCache  # nopep8
+
+
+@pytest.fixture
+def cache(tmpdir):
+    return ResultCache(str(tmpdir.join('cache')), max_size=1)
+
+
+def test_key():
+    """The key changes with the input and with the engine version"""
+    key = ResultCache.key('input', 'amo_grid:1')
+    assert key == ResultCache.key('input', 'amo_grid:1')
+    assert key != ResultCache.key('input ', 'amo_grid:1')
+    assert key != ResultCache.key('input', 'amo_grid:2')
+
+
+def test_miss_and_hit(cache, tmpdir):
+    """A miss restores nothing; after storing, a hit restores the files"""
+    key = ResultCache.key('input', 'amo_grid:1')
+    work = tmpdir.mkdir('work')
+    assert not cache.restore(key, str(work))
+    assert os.listdir(str(work)) == []
+
+    cache.store(key, {'output.dat': 'results\n', 'grid.bin': b'\0\1'})
+    assert cache.restore(key, str(work))
+    assert work.join('output.dat').read() == 'results\n'
+    assert work.join('grid.bin').read_binary() == b'\0\1'
+
+    other = ResultCache.key('other input', 'amo_grid:1')
+    assert not cache.restore(other, str(work))
+
+
+def test_stats(cache, tmpdir):
+    """The hits and misses are counted and persist across instances"""
+    key = ResultCache.key('input', 'amo_grid:1')
+    work = str(tmpdir.mkdir('work'))
+    cache.restore(key, work)
+    cache.store(key, {'output.dat': 'results\n'})
+    cache.restore(key, work)
+    cache.restore(key, work)
+    assert cache.stats['hits'] == 2 and cache.stats['misses'] == 1
+
+    reopened = ResultCache(cache.directory)
+    assert reopened.stats == cache.stats
+
+
+def test_eviction(cache):
+    """The least recently used entries go when the cache is too large"""
+    data = 'x' * (600 * 1024)
+    cache.store('old', {'output.dat': data})
+    os.utime(os.path.join(cache.directory, 'old'), (0, 0))
+    cache.store('new', {'output.dat': data})
+    assert [key for _, _, key in cache.entries()] == ['new']
+    assert cache.stats['evictions'] == 1
+
+
+def test_file_key(tmpdir):
+    """The key of an input file is that of its text"""
+    text = 'input\n' * 1000
+    filename = tmpdir.join('input.in')
+    filename.write(text)
+    assert ResultCache.file_key(str(filename), 'v', chunk_size=7) == (
+        ResultCache.key(text, 'v')
+    )
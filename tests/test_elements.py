@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the per-element atomic grids."""
+
+import pytest  # nopep8
+
+from amo_grid_step import elements  # nopep8
+
+P = {
+    'atomic grid region n-points': [20, 10],
+    'atomic grid region outer limit': [3.5, 7.0],
+    'atomic grid Lebedev rule': 17,
+    'atomic grid theta n-points': 20,
+}
+
+
+def test_no_scaling():
+    """Without scaling every element gets the grid as given"""
+    for element in ('H', 'C', 'Na'):
+        assert elements.atomic_parameters(P, element) == P
+
+
+def test_bragg_slater_scaling():
+    """Bragg-Slater scaling sizes the grid by the radius and row"""
+    C = elements.atomic_parameters(P, 'C', 'Bragg-Slater')
+    assert C['atomic grid region outer limit'] == pytest.approx([3.5, 7.0])
+    assert C['atomic grid region n-points'] == [20, 10]
+
+    H = elements.atomic_parameters(P, 'H', 'Bragg-Slater')
+    assert H['atomic grid region outer limit'] == pytest.approx([1.75, 3.5])
+    assert H['atomic grid region n-points'] == [15, 8]
+    assert H['atomic grid Lebedev rule'] == 12
+    assert H['atomic grid theta n-points'] == 15
+
+    Na = elements.atomic_parameters(P, 'Na', 'Bragg-Slater')
+    assert Na['atomic grid region outer limit'] == pytest.approx([9.0, 18.0])
+    assert Na['atomic grid region n-points'] == [25, 13]
+    assert Na['atomic grid Lebedev rule'] == 17
+
+    # Elements without a radius keep the grid as given
+    assert elements.atomic_parameters(P, 'Xx', 'Bragg-Slater') == P
+
+
+def test_overrides():
+    """Overrides for an element replace its parameters after scaling"""
+    overrides = {'H': {'region n-points': [30], 'Lebedev rule': 5}}
+    H = elements.atomic_parameters(P, 'H', 'Bragg-Slater', overrides)
+    assert H['atomic grid region n-points'] == [30]
+    assert H['atomic grid Lebedev rule'] == 5
+    assert H['atomic grid region outer limit'] == pytest.approx([1.75, 3.5])
+    with pytest.raises(ValueError):
+        elements.atomic_parameters(P, 'H', overrides={'H': {'lmx': 3}})
+
+
+def test_templates():
+    """Each distinct element gets one set of parameters"""
+    Pt = dict(P, **{'atomic grid element scaling': 'Bragg-Slater'})
+    result = elements.templates(Pt, ['O', 'H', 'H'])
+    assert sorted(result) == ['H', 'O']
+    assert result['H']['atomic grid region n-points'] == [15, 8]
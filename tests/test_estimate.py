@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the estimates of the cost of the grids."""
+
+import pytest  # nopep8
+
+from amo_grid_step import estimate, grid  # nopep8
+
+
+def parameters(angular):
+    P = {'grid engine': 'in-process NumPy'}
+    for prefix in ('central grid', 'atomic grid'):
+        P.update({
+            prefix + ' lmax': 10,
+            prefix + ' region n-points': [10, 5],
+            prefix + ' region outer limit': [5.0, 10.0],
+            prefix + ' radial quadrature': 'Legendre',
+            prefix + ' angular quadrature': angular,
+            prefix + ' Lebedev rule': 17,
+            prefix + ' theta n-points': 6,
+            prefix + ' phi n-points': 8,
+        })
+    return P
+
+
+@pytest.mark.parametrize(
+    'angular, n_angular', [('Lebedev', 434), ('Gauss', 48)]
+)
+def test_central_n_points(angular, n_angular):
+    """The number of points is exact for Lebedev and product rules"""
+    P = parameters(angular)
+    assert estimate.central_n_points(P) == 15 * n_angular
+    assert estimate.central_n_points(P) == len(grid.central_grid(P)[1])
+
+
+def test_estimate():
+    """The cost adds up the central and atomic grids"""
+    P = parameters('Lebedev')
+    cost = estimate.estimate(P, 3)
+    assert cost['central points'] == 15 * 434
+    assert cost['atomic points'] == 15 * 434
+    assert cost['all atomic points'] == 3 * 15 * 434
+    assert cost['total points'] == 4 * 15 * 434
+    assert cost['memory'] == cost['total points'] * estimate.bytes_per_point
+    assert cost['time'] == pytest.approx(
+        cost['total points'] / estimate.rates['in-process NumPy']
+    )
+
+    slow = estimate.estimate(P, 3, engine='amo_grid executable')
+    assert slow['time'] > cost['time']
+
+
+def test_check_budget():
+    """A cost over any limit is rejected, and zero means no limit"""
+    cost = estimate.estimate(parameters('Gauss'), 3)
+    estimate.check_budget(cost)
+    estimate.check_budget(
+        cost, max_points=cost['total points'], max_memory=1, max_time=1
+    )
+    with pytest.raises(RuntimeError, match='points'):
+        estimate.check_budget(cost, max_points=cost['total points'] - 1)
+    with pytest.raises(RuntimeError, match='memory'):
+        estimate.check_budget(cost, max_memory=1.0e-3)
+    with pytest.raises(RuntimeError, match=' s '):
+        estimate.check_budget(cost, max_time=1.0e-9)
@@ -0,0 +1,447 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the in-process grid engine."""
+
+import numpy as np
+import pytest  # nopep8
+
+from amo_grid_step import grid, quadrature  # nopep8
+
+
+@pytest.mark.parametrize('rule', [1, 2, 3, 4, 5, 17, 35, 65])
+def test_lebedev_weights(rule):
+    """The weights of a Lebedev rule add up to the area of the sphere"""
+    xyz, w = quadrature.lebedev(rule)
+    assert len(w) == quadrature.lebedev_n_points[rule]
+    assert np.allclose(np.linalg.norm(xyz, axis=1), 1.0)
+    assert np.isclose(w.sum(), 4 * np.pi)
+
+    # Rule n is exact to degree 2n + 1
+    k = 2 * rule
+    assert np.isclose(np.dot(w, xyz[:, 2]**k), 4 * np.pi / (k + 1))
+    if k >= 6:
+        assert np.isclose(
+            np.dot(w, xyz[:, 0]**2 * xyz[:, 1]**2 * xyz[:, 2]**2),
+            4 * np.pi / 105
+        )
+
+
+def test_lebedev_cached():
+    """Lebedev rules are expanded once and shared read-only"""
+    xyz, w = quadrature.lebedev(35)
+    assert quadrature.lebedev(35)[0] is xyz
+    assert not xyz.flags.writeable and not w.flags.writeable
+
+
+def test_one_dimensional_cached():
+    """Repeated one-dimensional rules come from the cache, read-only"""
+    x, w = quadrature.gauss_legendre(17)
+    hits = quadrature.one_dimensional.cache_info().hits
+    quadrature.radial_quadrature([17, 17], [1.0, 2.0])
+    assert quadrature.one_dimensional.cache_info().hits == hits + 2
+    assert quadrature.gauss_legendre(17)[0] is x
+    assert not x.flags.writeable and not w.flags.writeable
+    with pytest.raises(ValueError):
+        quadrature.one_dimensional('Simpson', 3)
+
+
+def test_radial_regions():
+    """The radial quadrature integrates polynomials over all the regions"""
+    for method in ('Legendre', 'Gauss'):
+        r, w = quadrature.radial_quadrature([10, 5], [2.0, 3.0], method)
+        assert len(r) == 15
+        assert np.isclose(np.dot(w, r**2), 9.0)
+
+
+@pytest.mark.parametrize(
+    'method', ['Becke', 'Mura-Knowles', 'Treutler-Ahlrichs']
+)
+def test_mapped_radial(method):
+    """Mapped radial rules end at the outer limit and resolve a cusp"""
+    r, w = quadrature.radial_quadrature([20], [25.0], method, scale=0.5)
+    assert np.all(np.diff(r) > 0) and r[-1] < 25.0
+    exact = 2 / 10**3
+    assert np.isclose(np.dot(w, r**2 * np.exp(-10 * r)), exact, rtol=1.0e-3)
+
+    r, w = quadrature.radial_quadrature([20], [25.0], 'Legendre')
+    assert not np.isclose(
+        np.dot(w, r**2 * np.exp(-10 * r)), exact, rtol=1.0e-2
+    )
+
+    # The volume of the region, and of two regions with Fejer's rule outside
+    scale = grid.radial_scale({'atomic grid radial quadrature': method},
+                              'atomic grid')
+    r, w = quadrature.radial_quadrature([41], [5.0], method, scale)
+    assert np.isclose(np.dot(w, r**2), 5.0**3 / 3, rtol=1.0e-4)
+    r, w = quadrature.radial_quadrature([41, 11], [3.0, 8.0], method, scale)
+    assert np.all(np.diff(r) > 0) and r[-1] < 8.0
+    assert np.isclose(np.dot(w, r**2), 8.0**3 / 3, rtol=1.0e-4)
+
+    # The rules nest
+    coarse, _ = quadrature.radial_quadrature([20, 5], [3.0, 8.0], method,
+                                             scale)
+    assert np.allclose(r[1:41:2], coarse[:20])
+    assert np.allclose(r[42::2], coarse[20:])
+
+    with pytest.raises(ValueError):
+        grid.radial_scale({'central grid radial quadrature': method},
+                          'central grid')
+
+
+def test_central_grid():
+    """The default central grid integrates a Gaussian accurately"""
+    P = {
+        'central grid region n-points': [100, 50],
+        'central grid region outer limit': [20.0, 30.0],
+        'central grid radial quadrature': 'Legendre',
+        'central grid angular quadrature': 'mixed',
+        'central grid Lebedev rule': 35,
+        'central grid theta n-points': 50,
+        'central grid phi n-points': 3,
+    }
+    points, weights = grid.central_grid(P)
+    assert points.shape == (150 * 50 * 3, 3)
+    errors = grid.integration_tests(points, weights)
+    assert abs(errors['Gaussian test']) < 1.0e-8
+
+
+def test_grid_file(tmpdir):
+    """Grids written to a binary file read back the same"""
+    from amo_grid_step import grid_file
+
+    xyz, w = quadrature.lebedev(3)
+    grids = {'center': (xyz, w), 'atom_1': (2 * xyz + 1.0, 8 * w)}
+    filename = str(tmpdir.join('grid.bin'))
+    grid_file.write_grids(filename, grids)
+
+    grids_in = grid_file.load_grid(filename)
+    assert list(grids_in) == ['center', 'atom_1']
+    assert grids_in.n_points() == 2 * len(w)
+    assert np.array_equal(grids_in.points('atom_1'), 2 * xyz + 1.0)
+    assert np.array_equal(grids_in.weights('atom_1'), 8 * w)
+
+
+@pytest.mark.parametrize('block_size', [7, 100, 1000])
+def test_grid_blocks(block_size):
+    """The blocks of a grid are bounded in size and make up the whole grid"""
+    regions = quadrature.radial_regions([5, 3], [1.0, 2.0], 'Legendre')
+    xyz, wa = quadrature.product_angular(6, 4)
+    r, wr = quadrature.radial_quadrature([5, 3], [1.0, 2.0], 'Legendre')
+    points, weights = grid.spherical_grid((1.0, 0.0, 0.0), r, wr, xyz, wa)
+
+    blocks = list(grid.iter_spherical_grid(
+        (1.0, 0.0, 0.0), regions, xyz, wa, block_size=block_size
+    ))
+    assert max(len(w) for _, w in blocks) <= block_size
+    assert np.array_equal(np.concatenate([p for p, _ in blocks]), points)
+    assert np.array_equal(np.concatenate([w for _, w in blocks]), weights)
+
+
+def test_minimal_angular():
+    """'auto' picks the smallest quadratures exact for 2*lmax"""
+    assert quadrature.minimal_lebedev_rule(3) == 3
+    assert quadrature.minimal_lebedev_rule(16) == 17
+    assert quadrature.minimal_lebedev_rule(40) == 41
+    assert quadrature.minimal_product(40) == (41, 81)
+
+
+def test_symmetry_reduction(tmpdir):
+    """The unique points of a C2v molecule expand back to the full grids"""
+    from amo_grid_step import grid_file, symmetry
+
+    P = {}
+    for prefix in ('central grid', 'atomic grid'):
+        P.update({
+            prefix + ' region n-points': [10, 5],
+            prefix + ' region outer limit': [5.0, 10.0],
+            prefix + ' radial quadrature': 'Legendre',
+            prefix + ' angular quadrature': 'Gauss',
+            prefix + ' Lebedev rule': 5,
+            prefix + ' theta n-points': 6,
+            prefix + ' phi n-points': 8,
+        })
+    elements = ['O', 'H', 'H']
+    coordinates = [[0.0, 0.0, 0.1], [0.75, 0.0, -0.5], [-0.75, 0.0, -0.5]]
+
+    reduction = symmetry.reduce_grids(P, coordinates, elements)
+    assert reduction.group == 'C2v'
+    assert sorted(reduction.grids) == ['atom_1', 'atom_2', 'center']
+    assert 4 * reduction.n_points() <= 2 * reduction.n_full_points()
+
+    full = grid.build_grids(P, coordinates, elements)
+    expanded = reduction.expand()
+    total = 0.0
+    for name, (points, weights) in full.items():
+        assert np.allclose(expanded[name][0], points)
+        assert np.allclose(expanded[name][1], weights)
+        total += np.dot(weights, np.exp(-np.sum(points**2, axis=1)))
+    reduced = sum(
+        reduced.integrate(lambda xyz: np.exp(-np.sum(xyz**2, axis=1)))
+        for reduced in reduction.grids.values()
+    )
+    assert np.isclose(reduced, total)
+    assert reduction.n_points() == sum(
+        len(reduced) for reduced in reduction.grids.values()
+    )
+
+    # The unique points written to a grid file expand the same way
+    filename = str(tmpdir.join('grid.bin'))
+    with grid_file.GridWriter(filename) as writer:
+        for name, reduced in reduction.grids.items():
+            writer.begin_block(name, reduced.center)
+            for points, weights in reduced.blocks(7):
+                writer.write(points, weights)
+    reduction.save(str(tmpdir.join('symmetry.npz')))
+    loaded = symmetry.load_reduction(
+        str(tmpdir.join('symmetry.npz')), grid_file.load_grid(filename)
+    )
+    assert loaded.group == 'C2v'
+    for name, (points, weights) in full.items():
+        assert np.allclose(loaded.expand_points(name), points)
+        assert np.allclose(loaded.expand_weights(name), weights)
+
+
+def test_spherical_harmonic_transform():
+    """The transform finds Y_1,1 and inverts random coefficients"""
+    from amo_grid_step import transform
+
+    lmax = 6
+    sht = transform.SphericalHarmonicTransform(lmax + 1, 2 * lmax + 1, lmax)
+    xyz, _ = quadrature.product_angular(lmax + 1, 2 * lmax + 1)
+    theta = np.arccos(xyz[:, 2])
+    phi = np.arctan2(xyz[:, 1], xyz[:, 0])
+    Y11 = -np.sqrt(3 / (8 * np.pi)) * np.sin(theta) * np.exp(1j * phi)
+
+    a = sht.forward(Y11)
+    expected = np.zeros((lmax + 1, 2 * lmax + 1))
+    expected[1, lmax + 1] = 1.0
+    assert np.allclose(a, expected)
+
+    rng = np.random.RandomState(1)
+    ell = np.arange(lmax + 1)[:, np.newaxis]
+    m = np.arange(-lmax, lmax + 1)[np.newaxis, :]
+    a = (
+        rng.normal(size=(3, lmax + 1, 2 * lmax + 1)) +
+        1j * rng.normal(size=(3, lmax + 1, 2 * lmax + 1))
+    ) * (np.abs(m) <= ell)
+    values = sht.inverse(a)
+    assert values.shape == (3, len(xyz))
+    assert np.allclose(sht.forward(values), a)
+
+
+def test_product_grid():
+    """A ProductGrid matches the explicit grid and integrates by parts"""
+    regions = quadrature.radial_regions([10, 5], [3.0, 6.0], 'Legendre')
+    xyz, wa = quadrature.product_angular(5, 7)
+    product = grid.ProductGrid((0.0, 0.0, 0.0), regions, xyz, wa)
+    r, wr = quadrature.radial_quadrature([10, 5], [3.0, 6.0], 'Legendre')
+    points, weights = grid.spherical_grid((0.0, 0.0, 0.0), r, wr, xyz, wa)
+
+    assert len(product) == len(weights)
+    assert np.array_equal(product.points(), points)
+    assert np.allclose(product.weights(), weights)
+
+    def gaussian(r):
+        return np.exp(-r * r)
+
+    values = gaussian(np.linalg.norm(points, axis=1)) * points[:, 2]**2
+    expected = np.dot(weights, values)
+    assert np.isclose(product.integrate_values(values), expected)
+    assert np.isclose(
+        product.integrate_separable(
+            lambda r: gaussian(r) * r * r, lambda xyz: xyz[:, 2]**2
+        ),
+        expected
+    )
+    assert np.isclose(
+        product.integrate_radial(gaussian),
+        np.dot(weights, gaussian(np.linalg.norm(points, axis=1)))
+    )
+
+
+@pytest.mark.parametrize('method', ['Becke', 'Stratmann'])
+def test_partition(method):
+    """The partition weights add to one and integrate over all the grids"""
+    from amo_grid_step import partition
+
+    atoms = np.array([[0.7, 0.0, 0.0], [-0.7, 0.0, 0.0], [0.0, 1.2, 0.3]])
+    centers = np.concatenate([np.zeros((1, 3)), atoms])
+    cells = partition.Partition(centers, [8.0, 3.0, 3.0, 3.0], method)
+
+    points = np.random.RandomState(0).normal(size=(1000, 3))
+    total = sum(cells.weights(points, i) for i in range(len(centers)))
+    assert np.allclose(total, 1.0)
+
+    xyz, wa = quadrature.product_angular(20, 41)
+    integral = 0.0
+    for i, center in enumerate(centers):
+        reach = cells.reach[i]
+        r, wr = quadrature.radial_quadrature([40], [reach], 'Legendre')
+        points, weights = grid.spherical_grid(center, r, wr, xyz, wa)
+        weights = weights * cells.weights(points, i)
+        for atom in atoms:
+            integral += np.dot(
+                weights, np.exp(-4 * np.sum((points - atom)**2, axis=1))
+            )
+    assert np.isclose(integral, 3 * (np.pi / 4)**1.5, rtol=1.0e-4)
+
+
+@pytest.mark.parametrize('method', ['Becke', 'Stratmann'])
+@pytest.mark.parametrize('atoms', [
+    [[0.0, 0.0, 0.0]],
+    [[0.0, 0.0, 0.0], [0.0, 0.0, 1.16], [0.0, 0.0, -1.16]],
+])
+def test_partition_coincident(method, atoms):
+    """An atom at the center of the molecule takes the central grid's share"""
+    from amo_grid_step import partition
+
+    atoms = np.array(atoms)
+    centers = np.concatenate([np.zeros((1, 3)), atoms])
+    reach = [8.0] + [3.0] * len(atoms)
+    cells = partition.Partition(centers, reach, method)
+
+    points = np.random.RandomState(0).normal(size=(1000, 3))
+    weights = [cells.weights(points, i) for i in range(len(centers))]
+    assert np.all(np.isfinite(weights))
+    assert np.allclose(sum(weights), 1.0)
+    near = np.linalg.norm(points, axis=1) < 3.0
+    assert np.all(weights[0][near] == 0.0)
+
+    xyz, wa = quadrature.product_angular(20, 41)
+    integral = 0.0
+    for i, center in enumerate(centers):
+        r, wr = quadrature.radial_quadrature([40], [reach[i]], 'Legendre')
+        points, weights = grid.spherical_grid(center, r, wr, xyz, wa)
+        weights = weights * cells.weights(points, i)
+        for atom in atoms:
+            integral += np.dot(
+                weights, np.exp(-4 * np.sum((points - atom)**2, axis=1))
+            )
+    assert np.isclose(integral, len(atoms) * (np.pi / 4)**1.5, rtol=1.0e-4)
+
+
+def test_pruning():
+    """Points with negligible partition weight are dropped and counted"""
+    from amo_grid_step import partition
+
+    cells = partition.Partition([[0.0, 0.0, 0.0], [1.0, 0.0, 0.0]], [3, 3])
+    points = np.array([[-1.0, 0.0, 0.0], [0.5, 0.0, 0.0], [2.0, 0.0, 0.0]])
+    weights = np.ones(3)
+    (kept, w), = cells.weighted_blocks([(points, weights)], 0, 1.0e-6)
+    assert np.array_equal(kept, points[:2])
+    assert np.isclose(w[1], 0.5)
+    assert cells.pruned == {0: 1}
+
+
+def test_angular_pruning():
+    """Pruned grids are smaller and still integrate a Gaussian"""
+    P = {
+        'atomic grid lmax': 15,
+        'atomic grid region n-points': [75],
+        'atomic grid region outer limit': [5.0],
+        'atomic grid radial quadrature': 'Legendre',
+        'atomic grid angular quadrature': 'Gauss',
+        'atomic grid Lebedev rule': 'auto',
+        'atomic grid theta n-points': 'auto',
+        'atomic grid phi n-points': 'auto',
+        'atomic grid angular pruning': 'none',
+    }
+    full = grid.atomic_product_grid(P, (0.0, 0.0, 0.0))
+    P['atomic grid angular pruning'] = 'SG-1'
+    pruned = grid.atomic_product_grid(P, (0.0, 0.0, 0.0), 'C')
+    assert isinstance(pruned, grid.PrunedGrid)
+    assert pruned.n_radial == full.n_radial
+    assert len(pruned) < 0.7 * len(full)
+
+    def function(xyz):
+        return np.exp(-np.sum(xyz * xyz, axis=1)) * xyz[:, 2]**2
+
+    assert np.isclose(pruned.integrate(function), full.integrate(function))
+    points, weights = pruned.explicit()
+    values = function(points)
+    assert np.isclose(
+        pruned.integrate_values(values), np.dot(weights, values)
+    )
+
+
+def test_sg1_zones():
+    """The SG-1 zones depend on the row and reach the full l-max"""
+    P = {'atomic grid lmax': 23, 'atomic grid angular pruning': 'SG-1'}
+    radii, lmax = grid.angular_zones(P, 'atomic grid', 'H')
+    assert np.allclose(radii, [0.0875, 0.175, 0.35, 1.575])
+    assert lmax == [3, 9, 15, 23, 15]
+    radii, _ = grid.angular_zones(P, 'atomic grid', 'O')
+    assert np.allclose(radii, [0.6 * x for x in (0.1667, 0.5, 0.9, 3.5)])
+    radii, _ = grid.angular_zones(P, 'atomic grid', 'Na')
+    assert np.allclose(radii, [1.8 * x for x in (0.1, 0.4, 0.8, 2.5)])
+    radii, _ = grid.angular_zones(P, 'atomic grid', 'Fe')
+    assert np.allclose(radii, [1.4 * x for x in (0.1, 0.4, 0.8, 2.5)])
+
+
+def test_element_scaled_grids():
+    """Bragg-Slater scaling sizes the grid on each atom by its element"""
+    from amo_grid_step import estimate
+
+    P = {'grid engine': 'in-process NumPy'}
+    for prefix in ('central grid', 'atomic grid'):
+        P.update({
+            prefix + ' region n-points': [20],
+            prefix + ' region outer limit': [5.0],
+            prefix + ' radial quadrature': 'Legendre',
+            prefix + ' angular quadrature': 'Lebedev',
+            prefix + ' Lebedev rule': 17,
+            prefix + ' theta n-points': 6,
+            prefix + ' phi n-points': 8,
+        })
+    P['atomic grid element scaling'] = 'Bragg-Slater'
+    elements = ['O', 'H', 'Na']
+    coordinates = [[0.0, 0.0, 0.0], [0.9, 0.0, 0.3], [0.0, 2.5, 0.0]]
+    grids = grid.build_grids(P, coordinates, elements)
+
+    xyz = grid.centered_coordinates(coordinates)
+    for i, element in enumerate(elements):
+        points, weights = grids['atom_{}'.format(i + 1)]
+        r = np.linalg.norm(points - xyz[i], axis=1)
+        outer = 5.0 * grid.bragg_slater_radii[element] / 0.70
+        assert r.max() < outer
+        assert r.max() > 0.9 * outer
+    assert len(grids['atom_2'][1]) < len(grids['atom_1'][1])
+    assert len(grids['atom_3'][1]) > len(grids['atom_1'][1])
+
+    cost = estimate.estimate(P, 3, elements=elements)
+    assert cost['total points'] == sum(len(w) for _, w in grids.values())
+
+
+def test_nested_grid():
+    """Nested grids reuse the coarser points and estimate the error"""
+    from amo_grid_step import nested
+
+    family = nested.NestedGrid([0.0, 0.0, 0.0], [2.0, 10.0], [3, 7], 5, 4)
+    coarse, fine = family.grid(0), family.grid(1)
+    old = family.embedded(1)
+    assert np.allclose(fine.points()[old], coarse.points())
+
+    def function(points):
+        r2 = np.einsum('ij,ij->i', points, points)
+        return np.exp(-r2) * (1 + points[:, 0] * points[:, 2])
+
+    integral = family.integral(function)
+    n = coarse.n_points
+    value, error = integral.refine()
+    assert integral.n_evaluations == fine.n_points
+    assert np.count_nonzero(~old) == fine.n_points - n
+    value, error = integral.refine()
+    assert abs(value - np.pi**1.5) < error
+    assert error < 1.0e-2
+
+    P = {
+        'central grid region n-points': [31, 15],
+        'central grid region outer limit': [2.0, 10.0],
+        'central grid radial quadrature': 'Fejer',
+    }
+    estimates = nested.test_estimates(P)
+    assert 0 < estimates['Gaussian error estimate'] < 1.0
+    P['central grid region n-points'] = [30, 15]
+    with pytest.raises(ValueError):
+        nested.test_estimates(P)
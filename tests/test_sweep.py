@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the parameter sweeps."""
+
+import pytest  # nopep8
+
+from amo_grid_step import sweep  # nopep8
+
+
+@pytest.mark.parametrize('text, values', [
+    ('1, 2, 3', [1, 2, 3]),
+    ('17', [17]),
+    ('range(20, 61, 20)', [20, 40, 60]),
+    ('Legendre, Gauss', ['Legendre', 'Gauss']),
+    ("'Legendre', Gauss", ['Legendre', 'Gauss']),
+    ('auto, 17', ['auto', 17]),
+    ('[100, 50], [200, 100]', [[100, 50], [200, 100]]),
+    ('in-process NumPy', ['in-process NumPy']),
+])
+def test_parse_values(text, values):
+    """Literals are parsed and anything else is kept as a string"""
+    assert sweep.parse_values(text) == values
+
+
+def test_parse_sweep():
+    """A sweep gives the values of each parameter"""
+    values = sweep.parse_sweep(
+        'central grid lmax = range(20, 41, 10); '
+        'central grid radial quadrature = Legendre, Gauss;'
+    )
+    assert values == {
+        'central grid lmax': [20, 30, 40],
+        'central grid radial quadrature': ['Legendre', 'Gauss'],
+    }
+    with pytest.raises(ValueError):
+        sweep.parse_sweep('no such parameter = 1, 2')
+    with pytest.raises(ValueError):
+        sweep.parse_sweep('central grid lmax')
+
+
+def test_combinations():
+    """Every combination of the values is run once"""
+    todo = sweep.combinations({'a': [1, 2], 'b': ['x', 'y', 'z']})
+    assert len(todo) == 6
+    assert todo[0] == {'a': 1, 'b': 'x'}
+    assert todo[-1] == {'a': 2, 'b': 'z'}
+    assert len({tuple(sorted(c.items())) for c in todo}) == 6
+
+
+def test_run_in_process(tmpdir):
+    """In-process runs in a sweep use the symmetry like the step does"""
+    from amo_grid_step import AMOGridParameters
+
+    P = AMOGridParameters().current_values_to_dict()
+    P.update({
+        'use symmetry': 'yes',
+        'central grid region n-points': [10, 5],
+        'atomic grid region n-points': [10],
+        'central grid angular quadrature': 'Lebedev',
+        'atomic grid angular quadrature': 'Lebedev',
+    })
+    elements = ['O', 'H', 'H']
+    coordinates = [[0.0, 0.0, 0.1], [0.75, 0.0, -0.5], [-0.75, 0.0, -0.5]]
+    results = sweep.run_in_process(str(tmpdir), P, coordinates, elements)
+    assert results['Point group'] == 'C2v'
+    assert results['Unique grid points'] < (
+        results['Central grid size'] + 3 * results['Atomic grid size']
+    )
+    assert tmpdir.join('results.json').check()
+
+
+@pytest.mark.parametrize('options', [
+    {},
+    {'partition weights': 'Becke'},
+    {'write grid file': 'yes'},
+    {'use symmetry': 'yes'},
+])
+def test_run_in_process_no_atoms(tmpdir, options):
+    """A structure without atoms has an empty atomic grid"""
+    from amo_grid_step import AMOGridParameters
+
+    P = AMOGridParameters().current_values_to_dict()
+    P.update({'central grid region n-points': [10, 5]})
+    P.update(options)
+    results = sweep.run_in_process(str(tmpdir), P, [], [])
+    assert results['Central grid size'] == 15 * 50 * 3
+    assert results['Atomic grid size'] == 0
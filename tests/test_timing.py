@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the timing of the step and the resources of amo_grid."""
+
+import subprocess  # nopep8
+import sys  # nopep8
+import time  # nopep8
+
+import pytest  # nopep8
+
+from amo_grid_step import timing  # nopep8
+
+
+def test_phase_names():
+    """Every phase is reported, 0.0 if it did not happen"""
+    timer = timing.Timer()
+    with timer.phase('input'):
+        pass
+    results = timer.results()
+    assert sorted(results) == sorted(
+        list(timing.phases.values()) + ['Total time']
+    )
+    assert list(timer.times) == ['input']
+    assert results['Input time'] == timer.times['input']
+    assert results['Execution time'] == 0.0
+    assert results['Cache time'] == 0.0
+    assert results['Analysis time'] == 0.0
+
+
+def test_phase_times_add_up():
+    """Nested phases fit in their parent and repeated phases accumulate"""
+    timer = timing.Timer()
+    with timer.phase('execution'):
+        with timer.phase('cache'):
+            time.sleep(0.01)
+        with timer.phase('analysis'):
+            time.sleep(0.01)
+    inner = dict(timer.times)
+    assert inner['cache'] >= 0.01
+    assert inner['analysis'] >= 0.01
+    assert inner['execution'] >= inner['cache'] + inner['analysis']
+
+    with timer.phase('cache'):
+        time.sleep(0.01)
+    results = timer.results()
+    second = results['Cache time'] - inner['cache']
+    assert second >= 0.01
+    assert results['Execution time'] == inner['execution']
+    assert results['Total time'] >= results['Execution time'] + second
+
+
+def test_child_usage_unmeasured():
+    """Nothing is reported when no children ran, e.g. for a cache hit"""
+    assert timing.ChildUsage().results() == {}
+
+
+@pytest.mark.skipif(timing.resource is None, reason='needs getrusage()')
+def test_child_usage_peak():
+    """The peak memory is reported only when this child set it"""
+    big = timing.ChildUsage()
+    with big.measure():
+        subprocess.run([
+            sys.executable, '-c', 'b = bytearray(256 * 1024 * 1024)'
+        ])
+    results = big.results()
+    assert results['amo_grid peak memory'] >= 256
+    assert results['amo_grid wall time'] > 0.0
+    assert results['amo_grid user time'] >= 0.0
+
+    small = timing.ChildUsage()
+    with small.measure():
+        subprocess.run([sys.executable, '-c', 'pass'])
+    results = small.results()
+    assert 'amo_grid peak memory' not in results
+    assert sorted(results) == [
+        'amo_grid system time', 'amo_grid user time', 'amo_grid wall time'
+    ]
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Write the table of Lebedev rules shipped with the in-process engine.
+
+The rules come from scipy.integrate.lebedev_rule, which needs SciPy 1.15 or
+later. Only this script needs SciPy; the step reads the table it writes:
+
+    python tools/make_lebedev_table.py
+
+Each rule is reduced to one generator for each of its octahedral orbits,
+with the weight of the points in the orbit normalized to 1 over the sphere,
+and the generators of all the rules are saved as one NumPy .npy file of
+records (rule, x, y, z, weight), ordered by rule.
+"""
+
+import argparse
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(
+    0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+)
+
+from amo_grid_step import quadrature  # noqa: E402
+
+
+def generators(rule):
+    """The orbit generators of a rule as a list of (x, y, z, weight)"""
+    from scipy.integrate import lebedev_rule
+
+    xyz, w = lebedev_rule(2 * rule + 1)
+    xyz = xyz.T
+    if len(w) != quadrature.lebedev_n_points[rule]:
+        raise RuntimeError(
+            'Lebedev rule {} from SciPy has {} points, not {}'.format(
+                rule, len(w), quadrature.lebedev_n_points[rule]
+            )
+        )
+
+    # Points of an orbit have the same absolute coordinates, up to order
+    canonical = np.round(-np.sort(-np.abs(xyz), axis=1), 12) + 0.0
+    _, first = np.unique(canonical, axis=0, return_index=True)
+    result = []
+    for i in np.sort(first):
+        x, y, z = canonical[i]
+        result.append((x, y, z, w[i] / (4 * np.pi)))
+
+    # Check that the orbits make up the rule
+    x, y, z = np.array([g[:3] for g in result]).T
+    n = len(quadrature._expand_orbits(x, y, z)[0])
+    if n != len(w):
+        raise RuntimeError(
+            'The orbits of Lebedev rule {} have {} points, not {}'.format(
+                rule, n, len(w)
+            )
+        )
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        '--output', default=quadrature.lebedev_table_path,
+        help='the .npy file to write'
+    )
+    args = parser.parse_args(argv)
+
+    records = []
+    for rule in sorted(quadrature.lebedev_n_points):
+        records.extend((rule,) + g for g in generators(rule))
+    table = np.array(records, dtype=quadrature.lebedev_dtype)
+    np.save(args.output, table)
+    print(
+        'Wrote {} generators for {} Lebedev rules, {} bytes, to {}'.format(
+            len(table), len(quadrature.lebedev_n_points), table.nbytes,
+            args.output
+        )
+    )
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())